@@ -0,0 +1,128 @@
+"""
+Benchmarks for the hot paths of the Database classes and the ``Param`` cycle.  Each benchmark
+is ran for every backend and for table sizes from 10 rows up to ``--bench_max_rows`` rows.
+"""
+
+import csv
+import os
+import shutil
+import tempfile
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import dapt
+from dapt import testing
+
+SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+BACKENDS = ['delimited_file', 'sheet']
+FIELDS = ['id', 'start-time', 'end-time', 'status', 'a', 'b', 'c']
+
+def table_rows(size):
+    """
+    Make a table where every parameter set has finished except the last one.  This makes
+    ``Param`` look through the whole table to find the next parameter set.
+
+    Args:
+        size (int): the number of rows in the table
+
+    Returns:
+        A list of rows, with the fields as the first row.
+    """
+
+    rows = [FIELDS]
+    for i in range(size):
+        status = '' if i == size - 1 else 'successful'
+        rows.append(['t%d' % i, '', '', status, str(i), str(2*i), ''])
+    return rows
+
+class Backend:
+    """
+    Creates a database for a backend and resets it between benchmark rounds.
+
+    Args:
+        name (str): the backend to use (``delimited_file`` or ``sheet``)
+        size (int): the number of rows in the table
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.rows = table_rows(size)
+        self.tmp = tempfile.mkdtemp()
+
+        if name == 'delimited_file':
+            self.path = os.path.join(self.tmp, 'bench.csv')
+            self.db = dapt.db.Delimited_file(self.path, ',')
+        else:
+            self.client = testing.Fake_sheets_client()
+            self.db = dapt.db.Sheet(spreedsheet_id='bench', client=self.client)
+
+        self.reset()
+        self.db.connect()
+
+    def reset(self):
+        """
+        Put the table back to its starting state.
+        """
+
+        if self.name == 'delimited_file':
+            with open(self.path, 'w', newline='') as f:
+                csv.writer(f).writerows(self.rows)
+        elif 'bench' in self.client.spreadsheets:
+            # Replace the worksheet so a connected ``Sheet`` sees the new table
+            spreadsheet = self.client.spreadsheets['bench']
+            spreadsheet.worksheets = []
+            spreadsheet.add_worksheet('Sheet1', self.rows)
+        else:
+            self.client.create('bench', self.rows)
+
+    def close(self):
+        shutil.rmtree(self.tmp)
+
+@pytest.fixture(params=SIZES, ids=lambda size: '%d-rows' % size)
+def size(request):
+    if request.param > request.config.getoption('bench_max_rows'):
+        pytest.skip('Larger than --bench_max_rows')
+    return request.param
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, size):
+    backend = Backend(request.param, size)
+    yield backend
+    backend.close()
+
+def rounds(size):
+    """
+    The number of rounds to run so large tables don't take too long.
+    """
+
+    return max(3, min(50, 100000 // size))
+
+def test_get_table(benchmark, backend):
+    benchmark.pedantic(backend.db.get_table, rounds=rounds(backend.size))
+
+def test_update_row(benchmark, backend):
+    row = dict(zip(FIELDS, backend.rows[-1]))
+    row['status'] = 'in progress'
+
+    benchmark.pedantic(backend.db.update_row, args=(backend.size - 1, row),
+                       setup=backend.reset, rounds=rounds(backend.size))
+
+def test_update_cell(benchmark, backend):
+    benchmark.pedantic(backend.db.update_cell, args=(backend.size - 1, 'status', 'in progress'),
+                       setup=backend.reset, rounds=rounds(backend.size))
+
+def test_get_row_index(benchmark, backend):
+    benchmark.pedantic(backend.db.get_row_index, args=('id', 't%d' % (backend.size - 1)),
+                       rounds=rounds(backend.size))
+
+def test_param_cycle(benchmark, backend):
+    param = dapt.Param(backend.db)
+
+    def cycle():
+        parameters = param.next_parameters()
+        param.successful(parameters['id'])
+
+    benchmark.pedantic(cycle, setup=backend.reset, rounds=rounds(backend.size))
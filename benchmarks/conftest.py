@@ -0,0 +1,9 @@
+"""
+Settings for the benchmarks
+"""
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench_max_rows", action="store", type=int, default=10000,
+        help="The largest table size, in rows, to benchmark.  Up to 1000000."
+    )
@@ -1,10 +1,15 @@
 
 __name__ = "dapt"
 __version__ = "0.9.3a1"
-__all__ = ['db', 'storage', 'config', 'param', 'tools']
+__all__ = ['db', 'storage', 'config', 'param', 'tools', 'instrument', 'scheduler', 'space', 'workspace', 'pipeline']
 
 import logging
 
+from . import instrument
+from . import scheduler
+from . import space
+from . import workspace
+from . import pipeline
 from .config import Config
 from .db import *
 from .storage import *
@@ -68,14 +68,35 @@ below.
 | (int)                     | parameter set will only be run if this value is greater than   |
 |                           | or equal that of the parameter sets ``computer-strength``.     |
 +---------------------------+----------------------------------------------------------------+
+| ``record-usage`` (bool)   | Record the time and resources used by each parameter set.  See |
+|                           | :ref:`param-usage-fields`.                                     |
++---------------------------+----------------------------------------------------------------+
+| ``usage-fields`` (dict)   | The database fields the resource usage is written to.          |
++---------------------------+----------------------------------------------------------------+
+| ``scheduler`` (dict)      | The policy used to choose the next parameter set.  See         |
+|                           | :ref:`scheduler`.                                              |
++---------------------------+----------------------------------------------------------------+
 | ``google-sheets`` (str)   | Values used by the :ref:`google-sheets` storage API.           |
 +---------------------------+----------------------------------------------------------------+
 | ``delimited-file`` (str)  | Values used by the :ref:`delimited-file` database class.       |
 +---------------------------+----------------------------------------------------------------+
 | ``box`` (str)             | Values used by the :ref:`box` storage API.                     |
 +---------------------------+----------------------------------------------------------------+
+| ``local`` (str)           | Values used by the :ref:`local-storage` storage class.         |
++---------------------------+----------------------------------------------------------------+
 | ``pretty-save`` (bool)    | Output the config in a ~pretty~ way. True by default.          |
 +---------------------------+----------------------------------------------------------------+
+| ``instrumentation``       | Sinks used by :ref:`instrument`.                               |
+| (dict)                    |                                                                |
++---------------------------+----------------------------------------------------------------+
+| ``archive`` (dict)        | The files archived by ``tools.create_zip()``.  See             |
+|                           | :ref:`tools-archive`.                                          |
++---------------------------+----------------------------------------------------------------+
+| ``cleanup`` (dict)        | The files removed by ``tools.data_cleanup()``.  See            |
+|                           | :ref:`tools-cleanup`.                                          |
++---------------------------+----------------------------------------------------------------+
+| ``workspace`` (dict)      | Values used by :ref:`workspace`.                               |
++---------------------------+----------------------------------------------------------------+
 
 Some of these fields are used by other DAPT classes to store values.  For example, the
 ``google-sheets`` field has many sub-fields that set parameters in the class automatically.
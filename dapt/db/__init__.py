@@ -117,6 +117,13 @@ row index (starting from 0) and the updated row (given as a dictionary).
     'status':'finished', 'a':'10', 'b':'10', 'c':'20'},
 	{'id':'t3', 'start-time':'', 'end-time':'', 'status':'', 'a':'10', 'b':'-10', 'c':''}]
 
+New rows can be added to the end of the table with the ``append_rows()`` method.  The rows are
+added in one request, which is much faster than adding them one at a time.  Fields that are
+missing from a row are left empty.
+
+    >>> db.append_rows([{'id':'t4', 'a':'5', 'b':'5'}, {'id':'t5', 'a':'6', 'b':'6'}])
+    2
+
 """
 
 
@@ -15,16 +15,29 @@ Databases should give key-value pairs, where the keys are the "ids" of the table
 are the values in that given row.  When getting the table, the result should be an array of
 dictionaries that contain the contents of the row.
 
+The methods of classes that inherit ``Database`` are timed automatically when
+:ref:`instrumentation <instrument>` is enabled.
+
 """
 
 import logging
 
+from .. import instrument
+
 _log = logging.getLogger(__name__)
 
 class Database(object):
     """
     An interface for accessing and setting parameter set data.  
     """
+
+    #: The methods that are timed when instrumentation is enabled
+    INSTRUMENTED_METHODS = ['connect', 'connected', 'get_table', 'fields', 'update_row',
+                            'update_cell', 'get_row_index', 'append_rows']
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument.instrument_methods(cls, Database.INSTRUMENTED_METHODS, 'db')
         
     def __init__(self):
 
@@ -116,3 +129,26 @@ class Database(object):
         """
 
         pass
+
+    def append_rows(self, rows):
+        """
+        Add rows to the end of the table.  Fields missing from a row are left empty.  Databases
+        should override this method so the rows are added in one request.  By default, each row
+        is added with ``update_row()`` using an index past the end of the table.
+
+        Args:
+            rows (iterable): the rows to add, each a dictionary of key-value pairs
+        
+        Returns:
+            The number of rows added.
+        """
+
+        fields = self.fields()
+        index = len(self.get_table())
+
+        count = 0
+        for row in rows:
+            self.update_row(index + count, {field:row.get(field, '') for field in fields})
+            count += 1
+
+        return count
@@ -244,6 +244,52 @@ class Delimited_file(base.Database):
 
             return True 
             
+    def append_rows(self, rows):
+        """
+        Add rows to the end of the file with a single append.  The rows are written as they are
+        read, so ``rows`` can be a generator of any length.  If the file does not exist or is
+        empty, it is created and the keys of the first row are used as the header.  Fields
+        missing from a row are left empty and fields not in the header are ignored.
+
+        Args:
+            rows (iterable): the rows to add, each a dictionary of key-value pairs
+        
+        Returns:
+            The number of rows added.
+        """
+
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return 0
+
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        header = list(first) if new else self.fields()
+
+        # The last row may not end with a new line if the file was written by another program
+        ended = True
+        if not new:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                ended = f.read(1) in (b'\n', b'\r')
+
+        count = 0
+        with open(self.path, 'a', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=header, delimiter=self.delimiter,
+                                    restval='', extrasaction='ignore')
+            if new:
+                writer.writeheader()
+            elif not ended:
+                csvfile.write(writer.writer.dialect.lineterminator)
+
+            writer.writerow(first)
+            count += 1
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+
+        return count
+
     def get_row_index(self, column_key, row_value):
         """
         Get the row index given the column to look through and row value to match to.
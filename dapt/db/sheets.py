@@ -90,6 +90,8 @@ class Sheet(base.Database):
         sheet_id (int): the the sheet id to use.  0 is used if no value is givin for
          sheet_title, sheet_id or in the Config
         sheet_title (str): the title of the sheet to use
+        client (gspread.Client): an already authorized client to use instead of the
+         credentials.  This allows the fakes in :ref:`testing` to be used.
     """
     
     def __init__(self, *args, **kwargs):
@@ -171,6 +173,8 @@ class Sheet(base.Database):
             self.sheet_title = kwargs['sheet_title']
         if 'sheet_id' in kwargs:
             self.sheet_id = kwargs['sheet_id']
+        if 'client' in kwargs:
+            self.client = kwargs['client']
         
         if not self.spreedsheetID:
             raise ValueError("Must specify the spreedsheet id in the arguments or config.")
@@ -336,6 +340,42 @@ class Sheet(base.Database):
 
         return True
 
+    def append_rows(self, rows):
+        """
+        Add rows to the end of the worksheet in a single request.  If the worksheet is empty,
+        the keys of the first row are used as the header.  Fields missing from a row are left
+        empty and fields not in the header are ignored.
+
+        Args:
+            rows (iterable): the rows to add, each a dictionary of key-value pairs
+        
+        Returns:
+            The number of rows added.
+        """
+
+        rows = list(rows)
+        if not rows:
+            return 0
+
+        self.connect()
+
+        worksheet = self.worksheet()
+        header = worksheet.row_values(1)
+
+        values = []
+        if not header:
+            header = list(rows[0])
+            values.append(header)
+
+        values.extend([row.get(field, '') for field in header] for row in rows)
+
+        self.sheet.values_append('%s!A1' % worksheet.title,
+                                 params={'valueInputOption': 'RAW',
+                                         'insertDataOption': 'INSERT_ROWS'},
+                                 body={'values': values})
+
+        return len(rows)
+
     def get_key_index(self, column_key):
         """
         Get the column index given the key.
@@ -0,0 +1,331 @@
+"""
+.. _instrument:
+
+Instrumentation
+===============
+
+The instrument module measures where a worker spends its time.  When instrumentation is enabled,
+every call to the :ref:`param` methods, the :ref:`database <base-database>` methods and the
+:ref:`storage <base-storage>` methods is timed, and the number of bytes moved by each storage
+transfer is recorded.  The measurements are given to one or more sinks which save or display
+them.  When instrumentation is disabled (the default), the only cost is checking a flag on each
+call.
+
+Database and storage classes are instrumented automatically when they inherit from ``Database``
+or ``Storage``, so new backends don't need to do anything.
+
+.. _instrument-events:
+
+Events
+------
+
+Each measurement is an event, given to the sinks as a ``dict``.  Events have the keys below.
+
++---------------------------+----------------------------------------------------------------+
+| Key                       | Description                                                    |
++===========================+================================================================+
+| ``name`` (str)            | What was measured, e.g. ``db.Sheet.get_table``.                |
++---------------------------+----------------------------------------------------------------+
+| ``kind`` (str)            | ``call`` for a timed method call and ``transfer`` for the      |
+|                           | bytes moved by a storage transfer.                             |
++---------------------------+----------------------------------------------------------------+
+| ``time`` (float)          | The time the event finished (seconds since the epoch).         |
++---------------------------+----------------------------------------------------------------+
+| ``seconds`` (float)       | How long the call or transfer took.                            |
++---------------------------+----------------------------------------------------------------+
+| ``bytes`` (int)           | The number of bytes transferred.  0 for calls.                 |
++---------------------------+----------------------------------------------------------------+
+| ``requests`` (int)        | The number of API requests made.  Each database and storage    |
+|                           | call counts as one request and transfers count each chunk.     |
++---------------------------+----------------------------------------------------------------+
+| ``error`` (str)           | The name of the exception raised, or None.                     |
++---------------------------+----------------------------------------------------------------+
+
+.. _instrument-sinks:
+
+Sinks
+-----
+
+There are three sinks.  ``Logging_sink`` logs each event with Python's logging module.
+``JSON_lines_sink`` appends each event to a file as a line of JSON.  ``Prometheus_sink`` keeps
+totals for each ``name`` and writes them in the Prometheus text format, so they can be collected
+by the node exporter's textfile collector.  A sink is any object with an ``emit(event)`` method
+and, optionally, a ``flush()`` method.
+
+    >>> dapt.instrument.enable(dapt.instrument.JSON_lines_sink('dapt_events.jsonl'))
+    >>> param.next_parameters()
+    >>> dapt.instrument.disable()
+
+.. _instrument-config:
+
+Config
+------
+
+Instrumentation can be enabled using the ``instrumentation`` field of the :ref:`config`.  The
+``Param`` class calls ``configure()`` with its config, so nothing else needs to be done.
+
+.. code-block:: JSON
+
+    {
+        "instrumentation" : {
+            "sinks" : [
+                {"type" : "logging"},
+                {"type" : "json-lines", "path" : "dapt_events.jsonl"},
+                {"type" : "prometheus", "path" : "dapt.prom", "interval" : 10}
+            ]
+        }
+    }
+
+"""
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+_log = logging.getLogger(__name__)
+
+_enabled = False
+_sinks = []
+_lock = threading.Lock()
+
+def enable(*sinks):
+    """
+    Turn instrumentation on and add the given sinks.
+
+    Args:
+        sinks: the sinks that events are given to
+    """
+
+    global _enabled
+
+    with _lock:
+        _sinks.extend(sinks)
+        _enabled = True
+
+def disable():
+    """
+    Turn instrumentation off, flush the sinks, and remove them.
+    """
+
+    global _enabled
+
+    with _lock:
+        _enabled = False
+        sinks = list(_sinks)
+        del _sinks[:]
+
+    for sink in sinks:
+        if hasattr(sink, 'flush'):
+            sink.flush()
+
+def enabled():
+    """
+    Returns:
+        True if instrumentation is enabled and False otherwise.
+    """
+
+    return _enabled
+
+def configure(config):
+    """
+    Enable instrumentation using the ``instrumentation`` field of a Config.  Nothing is done if
+    the field is missing or instrumentation is already enabled.
+
+    Args:
+        config (Config): the config to use
+    """
+
+    conf = config.get_value('instrumentation')
+    if not conf or _enabled:
+        return
+
+    sinks = []
+    for sink in conf.get('sinks', []):
+        if sink.get('type') == 'logging':
+            sinks.append(Logging_sink())
+        elif sink.get('type') == 'json-lines':
+            sinks.append(JSON_lines_sink(sink['path']))
+        elif sink.get('type') == 'prometheus':
+            sinks.append(Prometheus_sink(sink['path'], interval=sink.get('interval', 10)))
+        else:
+            _log.warning('Unknown instrumentation sink: %s' % str(sink.get('type')))
+
+    if sinks:
+        enable(*sinks)
+
+def record(name, kind='call', seconds=0.0, num_bytes=0, requests=1, error=None):
+    """
+    Give an event to the sinks.  Nothing is done if instrumentation is disabled.
+
+    Args:
+        name (str): what was measured
+        kind (str): ``call`` or ``transfer``
+        seconds (float): how long it took
+        num_bytes (int): the number of bytes transferred
+        requests (int): the number of API requests made
+        error (str): the name of the exception raised, if any
+    """
+
+    if not _enabled:
+        return
+
+    event = {'name':name, 'kind':kind, 'time':time.time(), 'seconds':seconds,
+             'bytes':num_bytes, 'requests':requests, 'error':error}
+
+    for sink in list(_sinks):
+        try:
+            sink.emit(event)
+        except Exception as e:
+            _log.warning('Instrumentation sink %s failed: %s' % (type(sink).__name__, str(e)))
+
+def timed(name):
+    """
+    Decorator that records how long each call to the function takes.
+
+    Args:
+        name (str): the name of the event
+
+    Returns:
+        The decorator
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            error = None
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                record(name, seconds=time.perf_counter() - start, error=error)
+
+        wrapper._dapt_instrumented = True
+        return wrapper
+
+    return decorator
+
+def instrument_methods(cls, methods, prefix):
+    """
+    Wrap the methods a class defines so they are timed.  Methods that the class inherits are
+    not wrapped again.  This is used by ``Database`` and ``Storage`` to instrument the classes
+    that inherit them.
+
+    Args:
+        cls (class): the class to instrument
+        methods (list): the names of the methods to time
+        prefix (str): the start of the event names, e.g. ``db``
+    """
+
+    for method in methods:
+        function = cls.__dict__.get(method)
+        if function is None or getattr(function, '_dapt_instrumented', False):
+            continue
+        setattr(cls, method, timed('%s.%s.%s' % (prefix, cls.__name__, method))(function))
+
+class Logging_sink:
+    """
+    Log each event.
+
+    Args:
+        level (int): the logging level to use.  ``logging.INFO`` by default.
+    """
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def emit(self, event):
+        _log.log(self.level, '%s %s: %.4f seconds, %d bytes%s' % (event['kind'], event['name'],
+                 event['seconds'], event['bytes'],
+                 ', error %s' % event['error'] if event['error'] else ''))
+
+class JSON_lines_sink:
+    """
+    Append each event to a file as a line of JSON.
+
+    Args:
+        path (str): the path of the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a')
+
+    def emit(self, event):
+        line = json.dumps(event) + '\n'
+        with self._lock:
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class Prometheus_sink:
+    """
+    Keep totals for each event name and write them to a file in the Prometheus text format.
+    The file is written at most every ``interval`` seconds and when ``flush()`` is called.  It
+    is written to a temporary file first and then moved so readers never see a partial file.
+
+    Args:
+        path (str): the path of the file
+        interval (float): the minimum number of seconds between writes.  10 by default.
+    """
+
+    METRICS = [('calls', 'counter', 'Number of calls or transfers'),
+               ('seconds', 'counter', 'Total seconds spent'),
+               ('bytes', 'counter', 'Total bytes transferred'),
+               ('requests', 'counter', 'Total API requests'),
+               ('errors', 'counter', 'Number of calls that raised an exception')]
+
+    def __init__(self, path, interval=10):
+        self.path = path
+        self.interval = interval
+        self.totals = {}
+        self._last_write = 0
+        self._lock = threading.Lock()
+
+    def emit(self, event):
+        key = (event['name'], event['kind'])
+
+        with self._lock:
+            totals = self.totals.setdefault(key, {'calls':0, 'seconds':0.0, 'bytes':0,
+                                                  'requests':0, 'errors':0})
+            totals['calls'] += 1
+            totals['seconds'] += event['seconds']
+            totals['bytes'] += event['bytes']
+            totals['requests'] += event['requests']
+            if event['error']:
+                totals['errors'] += 1
+
+        if time.time() - self._last_write >= self.interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            lines = []
+            for metric, metric_type, description in self.METRICS:
+                lines.append('# HELP dapt_%s_total %s' % (metric, description))
+                lines.append('# TYPE dapt_%s_total %s' % (metric, metric_type))
+                for (name, kind), totals in sorted(self.totals.items()):
+                    lines.append('dapt_%s_total{name="%s",kind="%s"} %s' %
+                                 (metric, name, kind, totals[metric]))
+
+            tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            os.replace(tmp_path, self.path)
+
+            self._last_write = time.time()
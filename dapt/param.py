@@ -60,6 +60,19 @@ Required parameters are marked with an astrict(*).
 | (int)                     | have. The ``computer-strength`` in the Config must be greather |
 |                           | than or equal to this value for the test to be ran             |
 +---------------------------+----------------------------------------------------------------+
+| ``priority`` (float)      | Parameter sets with a larger priority are run first.  Blank is |
+|                           | 0.  See :ref:`scheduler-priority`.                             |
++---------------------------+----------------------------------------------------------------+
+| ``wall-time`` (float)     | The number of seconds between the parameter set being claimed  |
+|                           | and being marked successful or failed.  See                    |
+|                           | :ref:`param-usage-fields`.                                     |
++---------------------------+----------------------------------------------------------------+
+| ``cpu-time`` (float)      | The CPU seconds used by DAPT's process and its child processes |
+|                           | while the parameter set ran.                                   |
++---------------------------+----------------------------------------------------------------+
+| ``max-rss`` (int)         | The peak memory (resident set size) in kilobytes of DAPT's     |
+|                           | process or its largest finished child process.                 |
++---------------------------+----------------------------------------------------------------+
 
 The ``id`` field is a unique identifier for that test.  This attribute is used to identify the
 parameter set and must be given to most of the methods in the ``Param`` class.  The ``status``
@@ -91,12 +104,39 @@ are excluded, then the the fields will not be added.
 | ``performed-by`` (str)    | The name of the person that ran the parameter set.             |
 +---------------------------+----------------------------------------------------------------+
 | ``last-test`` (str)       | The last test id that was run.  If a test exits before         |
-|                           | completeing, it will be re-ran.                                |
+|                           | completeing, it will be re-ran.  It is only re-ran once by a   |
+|                           | ``Param``, even if it is still running when the next parameter |
+|                           | set is requested.                                              |
 +---------------------------+----------------------------------------------------------------+
 | ``computer-strength``     | Only run tests on computers with sufficient power.  The        |
 | (int)                     | parameter set will only be run if this value is greater than   |
 |                           | or equal that of the parameter sets ``computer-strength``.     |
 +---------------------------+----------------------------------------------------------------+
+| ``record-usage`` (bool)   | Record the time and resources used by each parameter set.      |
++---------------------------+----------------------------------------------------------------+
+| ``usage-fields`` (dict)   | The database fields that the resource usage is written to.     |
++---------------------------+----------------------------------------------------------------+
+| ``scheduler`` (dict)      | The policy used to choose the next parameter set.  See         |
+|                           | :ref:`scheduler`.                                              |
++---------------------------+----------------------------------------------------------------+
+
+.. _param-usage-fields:
+
+Resource usage
+^^^^^^^^^^^^^^
+
+When ``record-usage`` is ``True``, ``Param`` measures the resources each parameter set uses
+from the time it is returned by ``next_parameters()`` until it is marked ``successful()`` or
+``failed()``.  The wall time, CPU time and peak memory are written to the ``wall-time``,
+``cpu-time`` and ``max-rss`` fields, if the database has them.  The fields can be renamed with
+the ``usage-fields`` config option, e.g. ``{"wall-time":"runtime"}``.  Recording the cost of
+each parameter set lets future sweeps be scheduled using how long similar parameter sets took.
+
+The CPU time includes child processes, such as a simulation started with ``subprocess``, once
+they have finished.  The peak memory is reported by the operating system for the whole process
+(or its largest finished child), so it is the largest value seen so far and not only the memory
+used by the current parameter set.  On systems without the ``resource`` module (e.g. Windows),
+only the CPU time of DAPT's process is recorded and ``max-rss`` is left blank.
 
 .. _param-usage:
 
@@ -135,14 +175,34 @@ the ``id`` of the parameter set to be specified.
    {'id': 't2', 'start-time': '2020-12-28 21:11:10', 'end-time': '2020-12-28 21:24:50',
     'status': 'successful', 'a': '10', 'b': '10', 'c': ''}
 
+The results of the parameter set can be saved in the database by giving them to ``successful()``.
+Each result is written to the field with the same name.  Results without a field are not saved.
+The results can be used by an :ref:`adaptive sampler <space-adaptive>` to choose new parameter
+sets.
+
+   >>> param.successful(p['id'], results={'c':20})
+
 If you mark the test as failed, the reason can optionally be provied.
 
 """
 
 import datetime, logging
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from . import instrument
+from . import scheduler
 
 _log = logging.getLogger(__name__)
 
+# The default database fields that resource usage is written to
+USAGE_FIELDS = {'wall-time':'wall-time', 'cpu-time':'cpu-time', 'max-rss':'max-rss'}
+
 class Param:
     """
     Create a Param instance with a database and optional config file.
@@ -151,15 +211,25 @@ class Param:
         database (Database): a Database instance (such as :ref:`google-sheets`,
          :ref:`delimited-file`)
         config (Config): a config object which allows for more features.  This is optional.
+        record_usage (bool): record the time and resources used by each parameter set.  False
+         by default, unless ``record-usage`` is set in the config.
+        policy: the :ref:`scheduling policy <scheduler>` used to choose the next parameter set.
+         If None (default), the ``scheduler`` field of the config is used, or parameter sets are
+         run in table order.
     """
     
 
-    def __init__(self, database, config=None):
+    def __init__(self, database, config=None, record_usage=None, policy=None):
         self.db = database
         self.performed_by = ''
         self.number_of_runs = -1
         self.runs_performed = 0
         self.computer_strength = float('inf')
+        self.record_usage = False
+        self.usage_fields = dict(USAGE_FIELDS)
+        self._usage_start = {}
+        # The ids returned by next_parameters(), so last-test is not returned while it runs
+        self._claimed = set()
 
         self.config = config
         if self.config:
@@ -169,10 +239,25 @@ class Param:
                 self.performed_by = self.config.config['performed-by']
             if self.config.has_value('computer-strength'):
                 self.computer_strength = self.config.config['computer-strength']
+            if self.config.has_value('record-usage'):
+                self.record_usage = bool(self.config.config['record-usage'])
+            if self.config.has_value('usage-fields'):
+                self.usage_fields.update(self.config.config['usage-fields'])
+            instrument.configure(self.config)
+
+        if record_usage is not None:
+            self.record_usage = record_usage
+
+        if policy is None:
+            policy = scheduler.from_config(self.config) if self.config \
+                     else scheduler.First_available()
+        self.policy = policy
 
+    @instrument.timed('param.next_parameters')
     def next_parameters(self):
         """
-        Get the next parameter set if one exists
+        Get the next parameter set if one exists.  The ``last-test`` in the config is returned
+        first, unless this ``Param`` has already returned it.
         
         Returns:
             An OrderedDict containing the key-value pairs from that parameter set or None if there
@@ -196,7 +281,8 @@ class Param:
             for i in range(0, len(records)):
                 if (
                         str(self.config.config["last-test"]) == str(records[i]["id"]) and
-                        records[i]["status"] != "successful"
+                        records[i]["status"] != "successful" and
+                        str(records[i]["id"]) not in self._claimed
                    ):
                     records[i]["status"] = "in progress"
                     if "start-time" in records[i]:
@@ -206,33 +292,32 @@ class Param:
                         records[i]["performed-by"] = self.performed_by
 
                     self.db.update_row(i, records[i])
+                    self._claimed.add(str(records[i]["id"]))
+                    self._start_usage(records[i]["id"])
 
                     return records[i]
 
-        for i in range(0, len(records)):
-            if not len(records[i]["status"]):
-                if (
-                        'computer-strength' in records[i] and 
-                        self.computer_strength < int(records[i]["computer-strength"])
-                ):
-                    continue
-                
-                records[i]["status"] = "in progress"
-                if "start-time" in records[i]:
-                    records[i]["start-time"] = \
-                    datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                if "performed-by" in records[i]:
-                    records[i]["performed-by"] = self.performed_by
-                self.db.update_row(i, records[i])
+        i = self.policy.select(records, self.computer_strength)
+        if i is None:
+            return None
 
-                # Save id to local cache
-                if self.config:
-                    self.config.update(key='last-test', value=str(records[i]["id"]))
+        records[i]["status"] = "in progress"
+        if "start-time" in records[i]:
+            records[i]["start-time"] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if "performed-by" in records[i]:
+            records[i]["performed-by"] = self.performed_by
+        self.db.update_row(i, records[i])
 
-                return records[i]
+        # Save id to local cache
+        if self.config:
+            self.config.update(key='last-test', value=str(records[i]["id"]))
 
-        return None
+        self._claimed.add(str(records[i]["id"]))
+        self._start_usage(records[i]["id"])
 
+        return records[i]
+
+    @instrument.timed('param.update_status')
     def update_status(self, id, status):
         """
         Update the status of the selected parameter.  If status is not included in the parameter
@@ -260,12 +345,43 @@ class Param:
 
         return records[index]
 
-    def successful(self, id):
+    @instrument.timed('param.update_statuses')
+    def update_statuses(self, statuses):
+        """
+        Update the status of many parameter sets, downloading the database once.  This is used
+        by :ref:`pipeline` to send the statuses of several stages together.
+
+        Args:
+            statuses (dict): the new status of each parameter set id
+
+        Returns:
+            The number of parameter sets that were updated
+        """
+
+        if not statuses:
+            return 0
+
+        records = self.db.get_table()
+        statuses = {str(id):status for id, status in statuses.items()}
+        updated = 0
+
+        for i in range(0, len(records)):
+            id = str(records[i]["id"])
+            if id in statuses and records[i]["status"] != statuses[id]:
+                self.db.update_cell(i, 'status', statuses[id])
+                updated += 1
+
+        return updated
+
+    @instrument.timed('param.successful')
+    def successful(self, id, results=None):
         """
         Mark a parameter set as successfully completed.
 
         Args:
             id (str): the id of the parameter set to use
+            results (dict): the results of the parameter set.  Each value is written to the
+             field with the same name.  None by default.
         
         Returns:
             The new parameter set that has been updated or False if not able to update.
@@ -274,8 +390,8 @@ class Param:
         records = self.db.get_table()
         index = -1
 
-        # Remove id from local cache
-        if self.config:
+        # Remove id from local cache.  Another parameter set may have been started since.
+        if self.config and str(self.config.config.get("last-test")) == str(id):
             self.config.update(key='last-test', value=None)
 
         for i in range(0, len(records)):
@@ -288,6 +404,14 @@ class Param:
         records[index]["status"] = "successful"
         if 'end-time' in records[index]:
             records[index]["end-time"] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._write_usage(id, records[index])
+
+        for key, value in (results or {}).items():
+            if key in records[index]:
+                records[index][key] = value
+            else:
+                _log.warning('The result %s is not a field in the database so it was not saved.'
+                             % str(key))
 
         self.db.update_row(index, records[index])
 
@@ -295,6 +419,7 @@ class Param:
         
         return records[index]
 
+    @instrument.timed('param.failed')
     def failed(self, id, err=''):
         """
         Mark a parameter set as failed to completed.
@@ -322,9 +447,88 @@ class Param:
             records[index]["end-time"] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         if 'comments' in records[index]:
             records[index]["comments"] += " failed{ " + err + " };"
+        self._write_usage(id, records[index])
 
         self.db.update_row(index, records[index])
 
         _log.info('Test %s marked as failed with message %s.' % (str(id), str(err)))
         
         return records[index]
+
+    def usage(self, id):
+        """
+        Get the resources used so far by a parameter set that was returned by
+        ``next_parameters()``.  ``record_usage`` must be enabled.
+
+        Args:
+            id (str): the id of the parameter set
+        
+        Returns:
+            A ``dict`` with the ``wall-time`` and ``cpu-time`` in seconds and the ``max-rss`` in
+            kilobytes, or None if the parameter set is not being measured.
+        """
+
+        start = self._usage_start.get(str(id))
+        if start is None:
+            return None
+
+        end = _usage_snapshot()
+
+        return {'wall-time':round(end['wall-time'] - start['wall-time'], 3),
+                'cpu-time':round(end['cpu-time'] - start['cpu-time'], 3),
+                'max-rss':end['max-rss']}
+
+    def _start_usage(self, id):
+        """
+        Start measuring the resources used by a parameter set.
+
+        Args:
+            id (str): the id of the parameter set
+        """
+
+        if self.record_usage:
+            self._usage_start[str(id)] = _usage_snapshot()
+
+    def _write_usage(self, id, record):
+        """
+        Add the resources used by a parameter set to the fields in the record and stop
+        measuring it.  Fields that are not in the record are skipped.
+
+        Args:
+            id (str): the id of the parameter set
+            record (dict): the parameter set that will be saved to the database
+        """
+
+        usage = self.usage(id)
+        self._usage_start.pop(str(id), None)
+
+        if usage is None:
+            return
+
+        for key, field in self.usage_fields.items():
+            if field in record and usage.get(key) is not None:
+                record[field] = usage[key]
+
+def _usage_snapshot():
+    """
+    Get the current wall time, CPU time, and peak memory of this process and its children.
+
+    Returns:
+        A ``dict`` with the ``wall-time`` and ``cpu-time`` in seconds and the ``max-rss`` in
+        kilobytes (None if it cannot be measured).
+    """
+
+    if resource is None:
+        return {'wall-time':time.time(), 'cpu-time':time.process_time(), 'max-rss':None}
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    max_rss = max(own.ru_maxrss, children.ru_maxrss)
+
+    # macOS reports bytes instead of kilobytes
+    if sys.platform == 'darwin':
+        max_rss //= 1024
+
+    return {'wall-time':time.time(),
+            'cpu-time':own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+            'max-rss':max_rss}
@@ -0,0 +1,508 @@
+"""
+.. _pipeline:
+
+Pipeline
+========
+
+The pipeline module runs the steps of a workflow, such as the PhysiCell workflow of cleaning the
+folder, making the settings file, running the simulation, zipping the output and uploading it.
+Each step is a ``Stage`` with a name, a function, and the names of the stages it requires.  A
+``Pipeline`` gets parameter sets from :ref:`param` and runs their stages in an order that
+respects the requirements.
+
+    >>> stages = [
+    ...     dapt.pipeline.Stage('xml', make_xml),
+    ...     dapt.pipeline.Stage('sim', run_simulation, requires=['xml']),
+    ...     dapt.pipeline.Stage('zip', zip_output, requires=['sim'], io_bound=True),
+    ...     dapt.pipeline.Stage('upload', upload_zip, requires=['zip'], io_bound=True)]
+    >>> dapt.pipeline.Pipeline(param, stages, workspaces=manager).run()
+
+Stage functions are called with the parameter set and a context ``dict``.  The context has the
+``path`` of the directory to work in (see :ref:`workspace`) and the value returned by each
+stage that has already run, by stage name.  For example, ``upload_zip`` can get the name of the
+zip with ``context['zip']``.  If the last stage returns a ``dict``, it is saved as the results
+of the parameter set (see ``Param.successful()``).
+
+.. _pipeline-tasks:
+
+Tasks
+-----
+
+If the parameter set has a ``tasks`` field that isn't blank, only the stages named in it are
+run.  The names are separated by commas, semicolons or spaces (e.g. ``xml,sim,zip``).  Stages
+that a named stage requires but that are not named are assumed to have been done before.
+
+.. _pipeline-overlap:
+
+Overlapping stages
+------------------
+
+Stages that mostly wait on the disk or network (``io_bound=True``) and the stages that require
+them are run by background threads.  While they run, the next parameter set is started, so
+zipping and uploading one parameter set overlaps with the simulation of the next.  The
+background stages must not use files that the next parameter set changes, so stages only
+overlap when the pipeline has a ``Workspace_manager``, unless ``overlap`` is set.  At most
+``max_pending`` parameter sets wait for their background stages.  When there are more, the
+pipeline waits before starting the next parameter set.
+
+.. _pipeline-status:
+
+Status updates
+--------------
+
+The status of a parameter set is set to the name of each stage when it finishes.  Instead of
+updating the database after every stage, the statuses are collected and sent together with
+``Param.update_statuses()`` at most every ``status_interval`` seconds.  Only the newest status
+of each parameter set is sent.  Statuses waiting to be sent are dropped when the parameter set
+is marked successful or failed.
+
+.. _pipeline-uploads:
+
+Uploads
+-------
+
+Uploading the output of a parameter set can take as long as a short simulation.  An
+``Upload_queue`` uploads files to a :ref:`storage <base-storage>` with background threads so the
+next simulation starts right away.  ``upload_stage()`` makes a stage that adds the file made by
+another stage (e.g. the zip from ``tools.create_zip()``) to the queue.  The queue holds at most
+``capacity`` files.  When it is full, adding a file waits until an upload finishes, so a slow
+network can't fill the disk with zips.
+
+A stage can return a ``concurrent.futures.Future``, which is what ``Upload_queue.put()``
+returns.  The pipeline marks the parameter set successful, and releases its workspace, only
+after every future of its stages is done.  If a future raises an exception, such as a failed
+upload, the parameter set is marked failed.
+
+    >>> uploads = dapt.pipeline.Upload_queue(box, capacity=4)
+    >>> stages = [
+    ...     dapt.pipeline.Stage('sim', run_simulation),
+    ...     dapt.pipeline.Stage('zip', lambda p, c: dapt.tools.create_zip(p['id'],
+    ...         folder=c['path']), requires=['sim']),
+    ...     dapt.pipeline.upload_stage(uploads, file_id=folder_id)]
+    >>> dapt.pipeline.Pipeline(param, stages, workspaces=manager).run()
+    >>> uploads.close()
+
+"""
+
+import concurrent.futures
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+_log = logging.getLogger(__name__)
+
+class Stage:
+    """
+    A step of the pipeline.
+
+    Args:
+        name (str): the name of the stage, used in the ``tasks`` field and as the status
+        function (function): called with the parameter set and the context ``dict``.  The value
+         returned is saved in the context with the stage name.
+        requires (list): the names of the stages that must run before this one
+        io_bound (bool): the stage mostly waits on the disk or network, so it can run in the
+         background.  False by default.
+    """
+
+    def __init__(self, name, function, requires=(), io_bound=False):
+        self.name = name
+        self.function = function
+        self.requires = list(requires)
+        self.io_bound = io_bound
+
+    def __repr__(self):
+        return 'Stage(%r)' % self.name
+
+class Pipeline:
+    """
+    Run the stages of each parameter set until there are none left.
+
+    Args:
+        param (Param): the Param object used to get and update parameter sets
+        stages (list): the ``Stage`` objects
+        workspaces (Workspace_manager): gives each parameter set its own directory.  If None
+         (default), every parameter set uses the current directory.
+        overlap (bool): run io bound stages in the background.  True if ``workspaces`` is given.
+        io_workers (int): the number of threads running background stages.  2 by default.
+        max_pending (int): the most parameter sets that can wait for background stages.
+         ``io_workers`` by default.
+        status_interval (float): the most seconds a status waits before it is sent.  5 by
+         default.
+        tasks_field (str): the field with the stages to run.  ``tasks`` by default.
+    """
+
+    def __init__(self, param, stages, workspaces=None, overlap=None, io_workers=2,
+                 max_pending=None, status_interval=5, tasks_field='tasks'):
+        self.param = param
+        self.stages = _sort(stages)
+        self.workspaces = workspaces
+        self.overlap = overlap if overlap is not None else workspaces is not None
+        self.io_workers = io_workers
+        self.max_pending = max_pending or io_workers
+        self.status_interval = status_interval
+        self.tasks_field = tasks_field
+
+        self._param_lock = threading.Lock()
+        self._statuses = {}
+        self._last_flush = time.time()
+
+        # The number of parameter sets waiting for futures returned by their stages
+        self._deferred = 0
+        self._deferred_done = threading.Condition()
+
+    def run(self):
+        """
+        Run parameter sets until there are none left.
+
+        Returns:
+            The number of parameter sets that were run
+        """
+
+        count = 0
+        slots = threading.BoundedSemaphore(self.max_pending)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.io_workers) as executor:
+            while True:
+                with self._param_lock:
+                    parameters = self.param.next_parameters()
+                if parameters is None:
+                    break
+
+                count += 1
+                stages = self.select(parameters)
+                foreground, background = self._split(stages)
+                last = stages[-1].name if stages else None
+
+                context = {'path':'.'}
+                if self.workspaces is not None:
+                    context['path'] = self.workspaces.acquire(parameters['id'])
+
+                if not self._run_stages(parameters, foreground, context):
+                    self._release(context)
+                    continue
+
+                if not background:
+                    self._finish(parameters, context, last)
+                    continue
+
+                slots.acquire()
+                future = executor.submit(self._run_background, parameters, background, context,
+                                         last)
+                future.add_done_callback(lambda f: slots.release())
+
+        with self._deferred_done:
+            self._deferred_done.wait_for(lambda: self._deferred == 0)
+
+        self.flush()
+
+        return count
+
+    def select(self, parameters):
+        """
+        Get the stages to run for a parameter set using its ``tasks`` field.
+
+        Args:
+            parameters (dict): the parameter set
+
+        Returns:
+            The stages to run, in order
+        """
+
+        tasks = parameters.get(self.tasks_field)
+        if not tasks or not str(tasks).strip():
+            return list(self.stages)
+
+        names = set(re.split(r'[\s,;]+', str(tasks).strip()))
+        unknown = names - {stage.name for stage in self.stages}
+        if unknown:
+            _log.warning('Parameter set %s has unknown tasks: %s' %
+                         (str(parameters['id']), ', '.join(sorted(unknown))))
+
+        return [stage for stage in self.stages if stage.name in names]
+
+    def flush(self):
+        """
+        Send the statuses waiting to be sent.
+        """
+
+        with self._param_lock:
+            statuses, self._statuses = self._statuses, {}
+            self._last_flush = time.time()
+            if statuses:
+                self.param.update_statuses(statuses)
+
+    def _split(self, stages):
+        """
+        Split the stages into those run now and those run in the background.
+        """
+
+        if not self.overlap:
+            return stages, []
+
+        names = {stage.name for stage in stages}
+        background = set()
+        for stage in stages:
+            if stage.io_bound or any(r in background for r in stage.requires if r in names):
+                background.add(stage.name)
+
+        return ([s for s in stages if s.name not in background],
+                [s for s in stages if s.name in background])
+
+    def _run_stages(self, parameters, stages, context):
+        """
+        Run stages in order.  The parameter set is marked failed if one raises an exception.
+
+        Returns:
+            True if every stage finished
+        """
+
+        for stage in stages:
+            try:
+                context[stage.name] = stage.function(parameters, context)
+            except Exception as e:
+                _log.exception('Stage %s of parameter set %s failed' %
+                               (stage.name, str(parameters['id'])))
+                with self._param_lock:
+                    self._statuses.pop(str(parameters['id']), None)
+                    self.param.failed(parameters['id'], '%s: %s' % (stage.name, str(e)))
+                return False
+
+            self._set_status(parameters['id'], stage.name)
+
+        return True
+
+    def _run_background(self, parameters, stages, context, last):
+        try:
+            if self._run_stages(parameters, stages, context):
+                self._finish(parameters, context, last)
+            else:
+                self._release(context)
+        except Exception:
+            _log.exception('Background stages of parameter set %s failed' %
+                           str(parameters['id']))
+
+    def _finish(self, parameters, context, last):
+        futures = [v for v in context.values() if isinstance(v, concurrent.futures.Future)]
+        if futures:
+            self._defer(parameters, context, last, futures)
+            return
+
+        results = context.get(last)
+
+        with self._param_lock:
+            self._statuses.pop(str(parameters['id']), None)
+            self.param.successful(parameters['id'], results if isinstance(results, dict) else None)
+
+        self._release(context)
+
+    def _defer(self, parameters, context, last, futures):
+        """
+        Finish the parameter set when every future returned by its stages is done.
+        """
+
+        with self._deferred_done:
+            self._deferred += 1
+        remaining = [len(futures)]
+        lock = threading.Lock()
+
+        def done(future):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+
+            try:
+                errors = [(k, v.exception()) for k, v in context.items()
+                          if isinstance(v, concurrent.futures.Future) and v.exception()]
+                if errors:
+                    with self._param_lock:
+                        self._statuses.pop(str(parameters['id']), None)
+                        self.param.failed(parameters['id'], '%s: %s' % (errors[0][0],
+                                                                        str(errors[0][1])))
+                    self._release(context)
+                else:
+                    for key in list(context):
+                        if isinstance(context[key], concurrent.futures.Future):
+                            context[key] = context[key].result()
+                    self._finish(parameters, context, last)
+            except Exception:
+                _log.exception('Could not finish parameter set %s' % str(parameters['id']))
+            finally:
+                with self._deferred_done:
+                    self._deferred -= 1
+                    self._deferred_done.notify_all()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _release(self, context):
+        if self.workspaces is not None:
+            self.workspaces.release(context['path'])
+
+    def _set_status(self, id, status):
+        with self._param_lock:
+            self._statuses[str(id)] = status
+            due = time.time() - self._last_flush >= self.status_interval
+
+        if due:
+            self.flush()
+
+class Upload_queue:
+    """
+    Upload files to a storage with background threads.  At most ``capacity`` files wait to be
+    uploaded; ``put()`` waits when the queue is full.
+
+    Args:
+        storage (Storage): the storage to upload to
+        capacity (int): the most files that can wait to be uploaded.  4 by default.
+        workers (int): the number of uploads at once.  1 by default.
+        remove (bool): remove each file after it is uploaded.  False by default.
+    """
+
+    def __init__(self, storage, capacity=4, workers=1, remove=False):
+        self.storage = storage
+        self.remove = remove
+        self._queue = queue.Queue(maxsize=capacity)
+        self._threads = []
+
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, daemon=True,
+                                      name='dapt-upload-%d' % i)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, file_id, name, folder='.', overwrite=True):
+        """
+        Add a file to the queue, waiting if the queue is full.  The arguments are given to
+        ``Storage.upload_file()``.
+
+        Args:
+            file_id (str): the folder in the storage to upload the file to
+            name (str): the name of the file
+            folder (str): the local folder the file is in.  The current directory by default.
+            overwrite (bool): overwrite a file with the same name.  True by default.
+
+        Returns:
+            A ``concurrent.futures.Future`` which is done when the file is uploaded.  It raises
+            an ``IOError`` if the upload failed.
+        """
+
+        if not self._threads:
+            raise RuntimeError('The upload queue is closed.')
+
+        future = concurrent.futures.Future()
+        self._queue.put((future, file_id, name, folder, overwrite))
+
+        return future
+
+    def join(self):
+        """
+        Wait until every file in the queue is uploaded.
+        """
+
+        self._queue.join()
+
+    def close(self):
+        """
+        Upload the files in the queue and stop the background threads.
+        """
+
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+
+            try:
+                if item is None:
+                    return
+
+                future, file_id, name, folder, overwrite = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                try:
+                    if not self.storage.upload_file(file_id, name, folder=folder,
+                                                    overwrite=overwrite):
+                        raise IOError('Could not upload %s' % name)
+                    if self.remove:
+                        os.remove(os.path.join(folder, name))
+                except Exception as e:
+                    _log.warning('Upload of %s failed: %s' % (name, str(e)))
+                    future.set_exception(e)
+                else:
+                    future.set_result(True)
+            finally:
+                self._queue.task_done()
+
+def upload_stage(uploads, file_id, name='upload', source='zip', requires=None):
+    """
+    Make a stage that adds the file made by another stage to an ``Upload_queue``.  The other
+    stage returns the name of the file in the parameter set's directory, like
+    ``tools.create_zip()``.
+
+    Args:
+        uploads (Upload_queue): the queue to add the file to
+        file_id (str): the folder in the storage to upload the file to
+        name (str): the name of the stage.  ``upload`` by default.
+        source (str): the stage that makes the file.  ``zip`` by default.
+        requires (list): the stages this stage requires.  ``[source]`` by default.
+
+    Returns:
+        The ``Stage``
+    """
+
+    def upload(parameters, context):
+        return uploads.put(file_id, context[source], folder=context['path'])
+
+    return Stage(name, upload, requires=[source] if requires is None else requires)
+
+def _sort(stages):
+    """
+    Sort the stages so each stage is after the stages it requires.  Stages are kept in the
+    given order when possible.
+
+    Args:
+        stages (list): the stages
+
+    Returns:
+        The sorted stages
+    """
+
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError('There are two stages named "%s".' % stage.name)
+        by_name[stage.name] = stage
+
+    for stage in stages:
+        for name in stage.requires:
+            if name not in by_name:
+                raise ValueError('Stage "%s" requires "%s", which is not a stage.' %
+                                 (stage.name, name))
+
+    done = []
+    visiting = set()
+
+    def visit(stage):
+        if stage in done:
+            return
+        if stage.name in visiting:
+            raise ValueError('The stages have a cycle that includes "%s".' % stage.name)
+        visiting.add(stage.name)
+        for name in stage.requires:
+            visit(by_name[name])
+        visiting.discard(stage.name)
+        done.append(stage)
+
+    for stage in stages:
+        visit(stage)
+
+    return done
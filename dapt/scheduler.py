@@ -0,0 +1,349 @@
+"""
+.. _scheduler:
+
+Scheduler
+=========
+
+The scheduler module decides which parameter set :ref:`param` runs next.  By default, the first
+parameter set that hasn't been run, and that the computer is strong enough for, is chosen.  On
+clusters where computers have different sizes, this means large computers often take cheap
+parameter sets while small computers are left with expensive ones that they run slowly.  A
+scheduling policy can be given to ``Param`` to choose parameter sets in a different order.
+
+There are three policies.  ``First_available`` takes parameter sets in table order.
+``Largest_job_first`` takes the most expensive parameter set first, using a ``cost`` field such as
+the expected runtime in seconds.  Running the longest parameter sets first means the sweep is not
+waiting on one long parameter set at the end.  ``Cost_bucket`` splits the parameter sets into
+buckets by their ``cost`` and each computer takes parameter sets from the bucket that matches its
+``computer-strength``.  When its bucket is empty, it takes parameter sets from the closest bucket,
+preferring cheaper ones.
+
+Every policy only chooses parameter sets that have not been run and whose ``computer-strength``
+is less than or equal to the computer's ``computer-strength``.  Parameter sets with a blank or
+invalid ``cost`` have a cost of 0.  The ``wall-time`` recorded by ``Param`` (see
+:ref:`param-usage-fields`) from previous sweeps is a good estimate of the ``cost``.
+
+    >>> policy = dapt.scheduler.Largest_job_first(field='cost')
+    >>> param = dapt.Param(db, policy=policy)
+
+A policy is any object with a ``select(records, computer_strength)`` method that returns the
+index of the parameter set to run, or None if there are none.
+
+.. _scheduler-priority:
+
+Priority
+--------
+
+If the database has a ``priority`` field, parameter sets with a larger priority are run first by
+every policy.  A blank priority is 0 and ties are broken by the policy (table order for
+``First_available``).  Urgent parameter sets can be given a priority of 1 so they run before the
+rest of the sweep.  The parameter sets are put in a heap instead of being sorted, so only the
+parameter sets that are looked at are ordered.  This keeps choosing a parameter set fast in
+tables with millions of rows.
+
+.. _scheduler-config:
+
+Config
+------
+
+The policy can be set with the ``scheduler`` field of the :ref:`config`.
+
++---------------------------+----------------------------------------------------------------+
+| Fields                    | Description                                                    |
++===========================+================================================================+
+| ``policy`` (str)          | ``first-available`` (default), ``largest-job-first`` or        |
+|                           | ``cost-bucket``.                                               |
++---------------------------+----------------------------------------------------------------+
+| ``field`` (str)           | The field with the cost of each parameter set.  ``cost`` by    |
+|                           | default.                                                       |
++---------------------------+----------------------------------------------------------------+
+| ``boundaries`` (list)     | The costs that separate the buckets used by ``cost-bucket``.   |
++---------------------------+----------------------------------------------------------------+
+| ``bucket`` (int)          | The bucket this computer prefers.  The ``computer-strength``   |
+|                           | is used by default.                                            |
++---------------------------+----------------------------------------------------------------+
+| ``priority`` (str)        | The field with the priority of each parameter set.             |
+|                           | ``priority`` by default.                                       |
++---------------------------+----------------------------------------------------------------+
+
+.. code-block:: JSON
+
+    {
+        "computer-strength" : 2,
+        "scheduler" : {
+            "policy" : "cost-bucket",
+            "field" : "cost",
+            "boundaries" : [60, 3600]
+        }
+    }
+
+With this config, parameter sets that cost less than 60 are in bucket 0, parameter sets that cost
+less than 3600 are in bucket 1, and the rest are in bucket 2.  This computer has a
+``computer-strength`` of 2 so it takes the most expensive parameter sets first.
+
+"""
+
+import heapq
+import logging
+
+_log = logging.getLogger(__name__)
+
+def eligible(records, computer_strength=float('inf')):
+    """
+    Get the parameter sets that can be run by this computer.  A parameter set can be run if its
+    ``status`` is blank and its ``computer-strength`` is less than or equal to the computer's.
+
+    Args:
+        records (list): the parameter sets from the database
+        computer_strength (float): the strength of this computer
+
+    Returns:
+        A generator of ``(index, record)`` tuples in table order
+    """
+
+    for i, record in enumerate(records):
+        if len(record["status"]):
+            continue
+        if (
+                'computer-strength' in record and
+                computer_strength < int(record["computer-strength"])
+        ):
+            continue
+        yield i, record
+
+def prioritized(records, computer_strength=float('inf'), field='priority'):
+    """
+    Get the parameter sets that can be run by this computer, largest priority first.  Parameter
+    sets with the same priority are in table order.  If the records don't have the priority
+    field, this is the same as ``eligible()``.
+
+    Args:
+        records (list): the parameter sets from the database
+        computer_strength (float): the strength of this computer
+        field (str): the field with the priority.  ``priority`` by default.
+
+    Returns:
+        A generator of ``(index, record)`` tuples
+    """
+
+    if not records or field not in records[0]:
+        yield from eligible(records, computer_strength)
+        return
+
+    heap = [(-number(record, field), i) for i, record in eligible(records, computer_strength)]
+    heapq.heapify(heap)
+
+    while heap:
+        _, i = heapq.heappop(heap)
+        yield i, records[i]
+
+def number(record, field):
+    """
+    Get a numeric field of a parameter set, such as the ``cost`` or ``priority``.
+
+    Args:
+        record (dict): the parameter set
+        field (str): the field to get
+
+    Returns:
+        The value as a ``float``, or 0 if it is blank or not a number
+    """
+
+    try:
+        return float(record.get(field) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def cost(record, field='cost'):
+    """
+    Get the cost of a parameter set.
+
+    Args:
+        record (dict): the parameter set
+        field (str): the field with the cost
+
+    Returns:
+        The cost as a ``float``, or 0 if it is blank or not a number
+    """
+
+    return number(record, field)
+
+class First_available:
+    """
+    Choose the first parameter set that can be run, in table order.  This is the default policy.
+
+    Args:
+        priority (str): the field with the priority of each parameter set.  ``priority`` by
+         default.
+    """
+
+    def __init__(self, priority='priority'):
+        self.priority = priority
+
+    def select(self, records, computer_strength=float('inf')):
+        """
+        Choose the next parameter set.
+
+        Args:
+            records (list): the parameter sets from the database
+            computer_strength (float): the strength of this computer
+
+        Returns:
+            The index of the parameter set to run, or None if there are none
+        """
+
+        for i, record in prioritized(records, computer_strength, self.priority):
+            return i
+
+        return None
+
+class Largest_job_first:
+    """
+    Choose the parameter set with the largest cost.  Ties are broken by table order.
+
+    Args:
+        field (str): the field with the cost of each parameter set.  ``cost`` by default.
+        priority (str): the field with the priority of each parameter set.  ``priority`` by
+         default.
+    """
+
+    def __init__(self, field='cost', priority='priority'):
+        self.field = field
+        self.priority = priority
+
+    def select(self, records, computer_strength=float('inf')):
+        """
+        Choose the next parameter set.
+
+        Args:
+            records (list): the parameter sets from the database
+            computer_strength (float): the strength of this computer
+
+        Returns:
+            The index of the parameter set to run, or None if there are none
+        """
+
+        best, best_key = None, None
+
+        for i, record in eligible(records, computer_strength):
+            key = (number(record, self.priority), cost(record, self.field))
+            if best is None or key > best_key:
+                best, best_key = i, key
+
+        return best
+
+class Cost_bucket:
+    """
+    Split the parameter sets into buckets by their cost and choose from the bucket that
+    matches this computer.  If the bucket is empty, the closest bucket is used, preferring
+    cheaper buckets.  Within a bucket, parameter sets are chosen by priority and then table
+    order.  A parameter set with a larger priority than every parameter set in this computer's
+    bucket is chosen first.
+
+    Args:
+        boundaries (list): the costs that separate the buckets, in increasing order.  A
+         parameter set is in bucket ``i`` if its cost is less than ``boundaries[i]`` and
+         greater than or equal to ``boundaries[i-1]``.
+        field (str): the field with the cost of each parameter set.  ``cost`` by default.
+        bucket (int): the bucket this computer prefers.  If None (default), the computer's
+         ``computer-strength`` is used, limited to the number of buckets.
+        priority (str): the field with the priority of each parameter set.  ``priority`` by
+         default.
+    """
+
+    def __init__(self, boundaries, field='cost', bucket=None, priority='priority'):
+        self.boundaries = sorted(boundaries)
+        self.field = field
+        self.bucket = bucket
+        self.priority = priority
+
+    def bucket_of(self, record):
+        """
+        Get the bucket of a parameter set.
+
+        Args:
+            record (dict): the parameter set
+
+        Returns:
+            The bucket number
+        """
+
+        c = cost(record, self.field)
+
+        for i, boundary in enumerate(self.boundaries):
+            if c < boundary:
+                return i
+
+        return len(self.boundaries)
+
+    def select(self, records, computer_strength=float('inf')):
+        """
+        Choose the next parameter set.
+
+        Args:
+            records (list): the parameter sets from the database
+            computer_strength (float): the strength of this computer
+
+        Returns:
+            The index of the parameter set to run, or None if there are none
+        """
+
+        preferred = self.bucket
+        if preferred is None:
+            preferred = computer_strength
+        preferred = max(0, min(preferred, len(self.boundaries)))
+
+        # The first parameter set in each bucket with the largest priority
+        firsts = {}
+        top = None
+        for i, record in prioritized(records, computer_strength, self.priority):
+            p = number(record, self.priority)
+            if top is None:
+                top = p
+            elif p < top:
+                break
+
+            bucket = self.bucket_of(record)
+            if bucket == preferred:
+                return i
+            firsts.setdefault(bucket, i)
+
+        if not firsts:
+            return None
+
+        # Closest bucket, cheaper buckets first
+        closest = min(firsts, key=lambda b: (abs(b - preferred), b > preferred))
+
+        return firsts[closest]
+
+POLICIES = {'first-available':First_available, 'largest-job-first':Largest_job_first,
+            'cost-bucket':Cost_bucket}
+
+def from_config(config):
+    """
+    Create a policy using the ``scheduler`` field of a Config.
+
+    Args:
+        config (Config): the config to use
+
+    Returns:
+        The policy, or ``First_available`` if the field is missing
+    """
+
+    conf = config.get_value('scheduler')
+    if not conf:
+        return First_available()
+
+    name = conf.get('policy', 'first-available')
+    if name not in POLICIES:
+        raise ValueError('Unknown scheduling policy "%s".  Use one of: %s' %
+                         (name, ', '.join(POLICIES)))
+    priority = conf.get('priority', 'priority')
+
+    if name == 'largest-job-first':
+        return Largest_job_first(field=conf.get('field', 'cost'), priority=priority)
+    if name == 'cost-bucket':
+        return Cost_bucket(conf.get('boundaries', []), field=conf.get('field', 'cost'),
+                           bucket=conf.get('bucket'), priority=priority)
+
+    return First_available(priority=priority)
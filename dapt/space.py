@@ -0,0 +1,455 @@
+"""
+.. _space:
+
+Parameter space
+===============
+
+The space module creates parameter sets from the ranges of each parameter and writes them to a
+:ref:`database`.  This replaces filling the table by hand or calling ``update_cell()`` for every
+cell.  There are four designs:
+
++---------------------------+----------------------------------------------------------------+
+| Design                    | Description                                                    |
++===========================+================================================================+
+| ``grid()``                | Every combination of the given values of each parameter.       |
++---------------------------+----------------------------------------------------------------+
+| ``random()``              | Points chosen uniformly at random from the ranges.             |
++---------------------------+----------------------------------------------------------------+
+| ``latin_hypercube()``     | Each range is split into ``n`` equal parts and every part of   |
+|                           | every parameter is used exactly once.  This covers the space   |
+|                           | more evenly than ``random()`` with the same number of points.  |
++---------------------------+----------------------------------------------------------------+
+| ``sobol()``               | A low-discrepancy Sobol sequence.  Requires ``scipy``.         |
++---------------------------+----------------------------------------------------------------+
+
+Parameters are given as a ``dict``.  For ``grid()`` the values are lists of the values to use
+(``linspace()`` makes evenly spaced values).  For the other designs the values are
+``(low, high)`` tuples, or lists of choices which are picked from evenly.  Only tuples are ranges,
+so ``[0, 1]`` is the two choices 0 and 1.  Ranges loaded from a JSON file are lists and must be
+changed to tuples first.
+
+    >>> parameters = {name:tuple(value) for name, value in json.load(f).items()}
+
+Every design is a generator, so the parameter sets are made one at a time as they are written.
+Spaces with millions of points never need to fit in memory.
+
+    >>> points = dapt.space.latin_hypercube({'a':(0, 1), 'b':(10, 20)}, 1000, seed=1)
+    >>> dapt.space.write(db, points)
+    1000
+
+``write()`` gives every parameter set an ``id`` and an empty ``status`` and adds the rows to the
+end of the database with ``append_rows()``, ``BATCH_SIZE`` rows at a time.  Each batch is one
+request to the database (one append for a ``Delimited_file``).
+
+.. _space-adaptive:
+
+Adaptive sampling
+-----------------
+
+Instead of running a dense grid, an ``Adaptive_sampler`` adds parameter sets while the workers
+are running, using the results of the parameter sets that have finished.  This concentrates
+expensive simulations in the interesting parts of the space.  Workers save their results with
+``Param.successful(id, results={...})``, which writes each result to the field with the same
+name, so the database needs a field for each result (e.g. ``score``).
+
+The sampler asks a strategy for new parameter sets.  A strategy is any object with a
+``propose(completed, pending)`` method, where ``completed`` is the list of successful parameter
+sets and ``pending`` is the list of parameter sets that have not finished.  It returns an
+iterable of new parameter sets.  ``Refine_best`` is a simple strategy that samples randomly
+until enough results exist and then samples near the best parameter sets found so far.
+
+    >>> strategy = dapt.space.Refine_best({'a':(0, 1), 'b':(10, 20)}, objective='score')
+    >>> sampler = dapt.space.Adaptive_sampler(db, strategy, min_pending=4, max_points=200)
+    >>> sampler.start()
+    >>> # ... workers run parameter sets with Param ...
+    >>> sampler.stop()
+
+New parameter sets are only proposed when fewer than ``min_pending`` parameter sets are waiting
+to be run, so each proposal uses as many results as possible.  ``step()`` can be called instead
+of ``start()`` to run the sampler in the worker's own loop.  This should be used with a
+``Delimited_file``, because a background thread appending to the file can race with ``Param``
+rewriting it.
+
+"""
+
+import itertools
+import logging
+import os
+import random as _random
+import threading
+
+from .db.delimited_file import Delimited_file
+
+_log = logging.getLogger(__name__)
+
+# The number of rows written, and Sobol points drawn, at a time
+BATCH_SIZE = 10000
+
+def linspace(low, high, num):
+    """
+    Get ``num`` evenly spaced values from ``low`` to ``high``, including both.
+
+    Args:
+        low (float): the first value
+        high (float): the last value
+        num (int): the number of values
+
+    Returns:
+        A list of the values
+    """
+
+    if num == 1:
+        return [low]
+
+    step = (high - low) / (num - 1)
+
+    return [low + i * step for i in range(num)]
+
+def grid(parameters):
+    """
+    Make every combination of the given parameter values.
+
+    Args:
+        parameters (dict): the parameter names and a list of values for each one.  Tuples are
+         also lists of values; use ``linspace()`` for a range.
+
+    Returns:
+        A generator of parameter sets (``dict``)
+    """
+
+    names = list(parameters)
+
+    for values in itertools.product(*(parameters[name] for name in names)):
+        yield dict(zip(names, values))
+
+def random(parameters, n, seed=None):
+    """
+    Choose points uniformly at random.
+
+    Args:
+        parameters (dict): the parameter names and a ``(low, high)`` tuple or list of choices for
+         each one.  Lists are always choices, even if they have two numbers.
+        n (int): the number of points
+        seed (int): the random seed.  None (default) uses a different seed each time.
+
+    Returns:
+        A generator of parameter sets (``dict``)
+    """
+
+    rng = _random.Random(seed)
+    names = list(parameters)
+
+    for i in range(n):
+        yield {name:_scale(parameters[name], rng.random()) for name in names}
+
+def latin_hypercube(parameters, n, seed=None):
+    """
+    Make a Latin hypercube design.  Each range is split into ``n`` equal strata and every
+    stratum of every parameter is used once.  The strata of each parameter are shuffled
+    independently, so the order of the strata is stored (``n`` integers per parameter) but the
+    points are made one at a time.
+
+    Args:
+        parameters (dict): the parameter names and a ``(low, high)`` tuple or list of choices for
+         each one.  Lists are always choices, even if they have two numbers.
+        n (int): the number of points
+        seed (int): the random seed.  None (default) uses a different seed each time.
+
+    Returns:
+        A generator of parameter sets (``dict``)
+    """
+
+    rng = _random.Random(seed)
+    names = list(parameters)
+    permutations = []
+    for name in names:
+        strata = list(range(n))
+        rng.shuffle(strata)
+        permutations.append(strata)
+
+    for i in range(n):
+        point = {}
+        for name, strata in zip(names, permutations):
+            point[name] = _scale(parameters[name], (strata[i] + rng.random()) / n)
+        yield point
+
+def sobol(parameters, n, seed=None, scramble=True):
+    """
+    Make a scrambled Sobol sequence.  ``scipy`` must be installed.  The points are drawn in
+    batches so the whole sequence is not stored.  Using a power of 2 for ``n`` gives the most
+    even coverage.
+
+    Args:
+        parameters (dict): the parameter names and a ``(low, high)`` tuple or list of choices for
+         each one.  Lists are always choices, even if they have two numbers.
+        n (int): the number of points
+        seed (int): the random seed used to scramble the sequence
+        scramble (bool): scramble the sequence.  True by default.
+
+    Returns:
+        A generator of parameter sets (``dict``)
+    """
+
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        raise ImportError('scipy is required to make Sobol sequences.  Install it with ' \
+                          '`pip install scipy`.')
+
+    names = list(parameters)
+    sampler = qmc.Sobol(d=len(names), scramble=scramble, seed=seed)
+
+    remaining = n
+    while remaining > 0:
+        batch = min(remaining, BATCH_SIZE)
+        for row in sampler.random(batch):
+            yield {name:_scale(parameters[name], float(u)) for name, u in zip(names, row)}
+        remaining -= batch
+
+def write(db, points, start=None, prefix='t', batch_size=BATCH_SIZE):
+    """
+    Add parameter sets to the end of a database.  Each parameter set is given an ``id`` and
+    an empty ``status``.  Other fields in the database are left empty.  If a
+    ``Delimited_file`` does not exist or is empty, it is created with a header of ``id``,
+    ``status`` and the parameter names.
+
+    Args:
+        db (Database): the database to add the parameter sets to
+        points (iterable): the parameter sets, e.g. from ``grid()``
+        start (int): the number used for the first id.  If None (default), one more than the
+         largest number of the ids with ``prefix`` is used, so ids are never reused.
+        prefix (str): the start of each id.  ``t`` by default, so ids are ``t1``, ``t2``, ...
+        batch_size (int): the number of rows given to ``append_rows()`` at a time.
+
+    Returns:
+        The number of parameter sets written
+    """
+
+    points = iter(points)
+    first = next(points, None)
+    if first is None:
+        return 0
+
+    fields = _fields(db)
+
+    if start is None:
+        start = _next_number(db.get_table(), prefix) if fields else 1
+    if not fields:
+        fields = ['id', 'status'] + list(first)
+
+    missing = [name for name in first if name not in fields]
+    if missing:
+        _log.warning('The database does not have the fields %s.  They will not be saved.' %
+                     ', '.join(missing))
+
+    rows = _rows(itertools.chain([first], points), fields, start, prefix)
+
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return count
+        count += db.append_rows(batch)
+
+class Adaptive_sampler:
+    """
+    Add parameter sets proposed by a strategy to a database while workers run the parameter
+    space.
+
+    Args:
+        db (Database): the database with the parameter space
+        strategy: an object with a ``propose(completed, pending)`` method that returns new
+         parameter sets
+        interval (float): the seconds between steps when running in the background.  60 by
+         default.
+        min_pending (int): only propose parameter sets when fewer than this many are waiting to
+         be run.  1 by default.
+        max_points (int): the most parameter sets the sampler will add.  No limit by default.
+        prefix (str): the start of each id.  ``t`` by default.  New ids continue from the largest
+         id with this prefix.  Samplers in different processes adding to the same database
+         should use different prefixes.
+    """
+
+    def __init__(self, db, strategy, interval=60, min_pending=1, max_points=None, prefix='t'):
+        self.db = db
+        self.strategy = strategy
+        self.interval = interval
+        self.min_pending = min_pending
+        self.max_points = max_points
+        self.prefix = prefix
+        self.proposed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def step(self):
+        """
+        Ask the strategy for new parameter sets and add them to the database if fewer than
+        ``min_pending`` parameter sets are waiting to be run.
+
+        Returns:
+            The number of parameter sets added
+        """
+
+        if self.max_points is not None and self.proposed >= self.max_points:
+            return 0
+
+        table = self.db.get_table()
+        completed = [r for r in table if r['status'] == 'successful']
+        pending = [r for r in table if r['status'] not in ('successful', 'failed')]
+
+        if len([r for r in pending if not len(r['status'])]) >= self.min_pending:
+            return 0
+
+        points = self.strategy.propose(completed, pending)
+        if self.max_points is not None:
+            points = itertools.islice(points, self.max_points - self.proposed)
+
+        count = write(self.db, points, start=_next_number(table, self.prefix),
+                      prefix=self.prefix)
+        self.proposed += count
+
+        if count:
+            _log.info('Added %d adaptive parameter sets (%d total)' % (count, self.proposed))
+
+        return count
+
+    def start(self):
+        """
+        Run ``step()`` every ``interval`` seconds in a background thread.
+        """
+
+        self.stop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread and wait for the current step to finish.
+        """
+
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                _log.warning('Adaptive sampler step failed: %s' % str(e))
+            self._stop.wait(self.interval)
+
+class Refine_best:
+    """
+    A strategy for ``Adaptive_sampler`` that samples randomly until ``top`` parameter sets have
+    results, and then samples near the ``top`` best parameter sets.  Ranges are perturbed with
+    normally distributed noise whose standard deviation is ``scale`` times the width of the range.
+    Choices are changed to a random choice with probability ``scale``.
+
+    Args:
+        parameters (dict): the parameter names and a ``(low, high)`` tuple or list of choices for
+         each one.  Lists are always choices, even if they have two numbers.
+        objective (str): the field with the result to optimize
+        n (int): the number of parameter sets to propose each time.  4 by default.
+        top (int): the number of best parameter sets to sample near.  5 by default.
+        scale (float): how far from the best parameter sets to sample.  0.1 by default.
+        maximize (bool): larger objective values are better.  False by default.
+        seed (int): the random seed.  None (default) uses a different seed each time.
+    """
+
+    def __init__(self, parameters, objective, n=4, top=5, scale=0.1, maximize=False, seed=None):
+        self.parameters = parameters
+        self.objective = objective
+        self.n = n
+        self.top = top
+        self.scale = scale
+        self.maximize = maximize
+        self.rng = _random.Random(seed)
+
+    def propose(self, completed, pending):
+        """
+        Propose new parameter sets.
+
+        Args:
+            completed (list): the successful parameter sets
+            pending (list): the parameter sets that have not finished
+
+        Returns:
+            A list of new parameter sets
+        """
+
+        scored = []
+        for record in completed:
+            try:
+                scored.append((float(record[self.objective]), record))
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        if len(scored) < self.top:
+            return list(random(self.parameters, self.n, seed=self.rng.random()))
+
+        scored.sort(key=lambda s: s[0], reverse=self.maximize)
+        best = [record for score, record in scored[:self.top]]
+
+        return [self._perturb(self.rng.choice(best)) for i in range(self.n)]
+
+    def _perturb(self, record):
+        point = {}
+
+        for name, parameter in self.parameters.items():
+            if isinstance(parameter, tuple):
+                low, high = parameter
+                value = float(record[name]) + self.rng.gauss(0, self.scale * (high - low))
+                point[name] = min(max(value, low), high)
+            elif self.rng.random() < self.scale:
+                point[name] = self.rng.choice(parameter)
+            else:
+                point[name] = record[name]
+
+        return point
+
+def _fields(db):
+    """
+    Get the fields of the database, or None if it is empty.
+    """
+
+    if isinstance(db, Delimited_file) and \
+       (not os.path.exists(db.path) or os.path.getsize(db.path) == 0):
+        return None
+
+    return db.fields() or None
+
+def _next_number(table, prefix):
+    """
+    Get one more than the largest number of the ids that are ``prefix`` followed by a number.
+    """
+
+    numbers = [int(str(row['id'])[len(prefix):]) for row in table
+               if str(row['id']).startswith(prefix) and str(row['id'])[len(prefix):].isdigit()]
+
+    return max(numbers, default=0) + 1
+
+def _rows(points, fields, start, prefix):
+    """
+    Turn parameter sets into database rows with an id, status and every field.
+    """
+
+    for i, point in enumerate(points, start):
+        row = dict.fromkeys(fields, '')
+        row.update({key:value for key, value in point.items() if key in row})
+        row['id'] = '%s%d' % (prefix, i)
+        row['status'] = ''
+        yield row
+
+def _scale(parameter, u):
+    """
+    Map a number from [0, 1) onto a parameter's range or choices.
+    """
+
+    if isinstance(parameter, tuple):
+        low, high = parameter
+        return low + u * (high - low)
+
+    return parameter[min(int(u * len(parameter)), len(parameter) - 1)]
@@ -28,3 +28,4 @@ used.
 from .base import Storage
 from .box import Box
 from .google_drive import Google_Drive
+from .local import Local
@@ -28,19 +28,79 @@ There are four required methods that all Storage objects must implement.  The re
 methods are download, delete, rename, and upload.  These methods are based off REST APIs,
 although the underlying implimentation do not need to use REST.
 
+.. _base-storage-transfers:
+
+Transfers
+---------
+
+Uploads and downloads are run through a ``Transfer``.  A transfer retries requests that fail
+because of network problems using an exponential backoff, keeps track of how many bytes have
+been sent and how long each request took, calls a progress callback, and can be cancelled from
+another thread.  Storage classes create transfers with the ``transfer()`` method so the retry
+and callback settings are shared by every backend.  The settings can be placed in the
+backend's section of the ``Config``.
+
++---------------------------+----------------------------------------------------------------+
+| Fields                    | Description                                                    |
++===========================+================================================================+
+| ``transfer-retries``      | How many times a failed request is retried.  3 by default.     |
+| (int)                     |                                                                |
++---------------------------+----------------------------------------------------------------+
+| ``transfer-backoff``      | Seconds to wait before the first retry.  The wait doubles      |
+| (float)                   | after each retry.  1 by default.                               |
++---------------------------+----------------------------------------------------------------+
+
+The callback is given the ``Transfer`` object, so the progress and throughput can be read from
+it.
+
+    >>> def progress(transfer):
+    ...     print('%s: %d of %d bytes at %.0f B/s' % (transfer.name, transfer.transferred,
+    ...           transfer.total, transfer.rate()))
+    >>> storage.transfer_callback = progress
+
+Calling ``cancel()`` on the storage object stops all of its running transfers by raising
+``Transfer_cancelled`` in the thread doing the transfer.
+
+When :ref:`instrumentation <instrument>` is enabled, the methods of classes inheriting
+``Storage`` are timed and each finished transfer records the bytes and requests it made.
+
 """
 
 import logging
 import mimetypes
 from pathlib import Path
 import shutil
+import tempfile
+import threading
+import time
+
+from .. import instrument
 
 _log = logging.getLogger(__name__)
 
 class Storage(object):
     """
+    The interface that storage APIs implement.
     """
 
+    #: How many times a failed request is retried
+    transfer_retries = 3
+    #: Seconds to wait before the first retry
+    transfer_backoff = 1
+    #: Function called with the ``Transfer`` object when progress is made
+    transfer_callback = None
+    #: The most recent ``Transfer`` that was started
+    last_transfer = None
+
+    #: The methods that are timed when instrumentation is enabled
+    INSTRUMENTED_METHODS = ['connect', 'download_file', 'download_folder', 'delete_file',
+                            'delete_folder', 'rename_file', 'rename_folder', 'upload_file',
+                            'upload_folder', 'upload_stream']
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        instrument.instrument_methods(cls, Storage.INSTRUMENTED_METHODS, 'storage')
+
     def connect(self):
         """
         The method used to connect to the database and log the user in.  Some databases won't
@@ -174,6 +234,277 @@ class Storage(object):
         """
         pass
 
+    def upload_stream(self, file_id, stream, name, overwrite=True):
+        """
+        Upload the data read from a stream (e.g. a pipe) as a file in the given folder.  The
+        stream is read until it ends.  Storage classes that can upload data of an unknown size
+        should override this method.  By default, the stream is saved to a temporary file which
+        is uploaded with ``upload_file()`` and then removed.
+
+        Args:
+            file_id (str): The folder where the file should be saved.
+            stream (file): A binary file-like object with a ``read()`` method.
+            name (str): The name that the file should be uploaded as.
+            overwrite (bool): Should the data in the storage be overwritten.  True by default.
+
+        Returns:
+            True if the upload was successful and False otherwise.
+        """
+
+        folder = tempfile.mkdtemp(prefix='dapt-')
+
+        try:
+            with open(Path(folder) / name, 'wb') as f:
+                shutil.copyfileobj(stream, f)
+
+            return self.upload_file(file_id, name, folder=folder, overwrite=overwrite)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def transfer(self, name, direction, total=None):
+        """
+        Create a ``Transfer`` that uses the retry and callback settings of this storage object.
+
+        Args:
+            name (str): The name of the file being transferred
+            direction (str): ``upload`` or ``download``
+            total (int): The number of bytes that will be transferred, if known
+
+        Returns:
+            A new ``Transfer``
+        """
+
+        if '_cancel_event' not in self.__dict__:
+            self._cancel_event = threading.Event()
+
+        transfer = Transfer(name, direction, total=total, callback=self.transfer_callback,
+                            retries=self.transfer_retries, backoff=self.transfer_backoff,
+                            retryable=self._retryable, cancel_event=self._cancel_event,
+                            label='storage.%s.%s' % (type(self).__name__, direction))
+        self.last_transfer = transfer
+
+        return transfer
+
+    def cancel(self):
+        """
+        Cancel every transfer that is running.  Transfers started after this is called will run
+        normally.
+        """
+
+        if '_cancel_event' in self.__dict__:
+            self._cancel_event.set()
+            self._cancel_event = threading.Event()
+
+    def _retryable(self, error):
+        """
+        Check if a request that raised the given error should be retried.  Storage classes
+        should override this to include the errors raised by their API.
+
+        Args:
+            error (Exception): The error raised by the request
+
+        Returns:
+            True if the request should be retried and False otherwise.
+        """
+
+        return isinstance(error, (ConnectionError, TimeoutError))
+
+    def _configure_transfers(self, conf):
+        """
+        Load the transfer settings from a backend's section of the Config.
+
+        Args:
+            conf (dict): the backend's section of the Config
+        """
+
+        if conf.get('transfer-retries') is not None:
+            self.transfer_retries = int(conf['transfer-retries'])
+        if conf.get('transfer-backoff') is not None:
+            self.transfer_backoff = float(conf['transfer-backoff'])
+
+class Transfer_cancelled(Exception):
+    """
+    Raised in the thread running a transfer when it has been cancelled.
+    """
+
+    pass
+
+class Transfer:
+    """
+    Run and measure a single upload or download.  Requests are run with ``run()``, which retries
+    them when they fail, and the number of bytes moved is reported with ``progress()``.
+
+    Args:
+        name (str): The name of the file being transferred
+        direction (str): ``upload`` or ``download``
+        total (int): The number of bytes that will be transferred, if known
+        callback (function): Called with this object every time progress is made
+        retries (int): How many times a failed request is retried
+        backoff (float): Seconds to wait before the first retry.  The wait doubles after each
+         retry.
+        retryable (function): Given the error raised by a request and returns True if it
+         should be retried.  By default only connection errors and timeouts are retried.
+        cancel_event (threading.Event): When set, the transfer is cancelled
+        label (str): The name used when the transfer is recorded by :ref:`instrument`.
+         ``storage.<direction>`` by default.
+    """
+
+    def __init__(self, name, direction, total=None, callback=None, retries=3, backoff=1,
+                 retryable=None, cancel_event=None, label=None):
+        self.name = name
+        self.label = label or 'storage.%s' % direction
+        self.direction = direction
+        self.total = total
+        self.callback = callback
+        self.retries = retries
+        self.backoff = backoff
+        self.retryable = retryable
+        self.cancel_event = cancel_event or threading.Event()
+
+        self.transferred = 0
+        self.requests = 0
+        self.attempts = 0
+        self.latencies = []
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def run(self, function, *args, **kwargs):
+        """
+        Run a request, retrying it if it fails with a retryable error.
+
+        Args:
+            function (function): the request to run
+            args: the arguments given to ``function``
+            kwargs: the keyword arguments given to ``function``
+
+        Returns:
+            The value returned by ``function``
+        """
+
+        delay = self.backoff
+
+        for attempt in range(self.retries + 1):
+            self.check_cancelled()
+
+            start = time.time()
+            try:
+                result = function(*args, **kwargs)
+            except Transfer_cancelled:
+                raise
+            except Exception as e:
+                with self._lock:
+                    self.attempts += 1
+                retryable = self.retryable(e) if self.retryable else \
+                            isinstance(e, (ConnectionError, TimeoutError))
+                if not retryable or attempt == self.retries:
+                    raise
+
+                _log.warning('Transfer of "%s" failed (%s), retrying in %.1f seconds' %
+                             (self.name, str(e), delay))
+                # Wake up early if the transfer is cancelled
+                self.cancel_event.wait(delay)
+                delay *= 2
+                continue
+
+            with self._lock:
+                self.attempts += 1
+                self.requests += 1
+                self.latencies.append(time.time() - start)
+
+            return result
+
+    def progress(self, num_bytes):
+        """
+        Record that more bytes have been transferred and call the callback.
+
+        Args:
+            num_bytes (int): the number of bytes transferred since the last call
+        """
+
+        with self._lock:
+            self.transferred += num_bytes
+
+        if self.callback:
+            self.callback(self)
+
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        """
+        Raise ``Transfer_cancelled`` if the transfer has been cancelled.
+        """
+
+        if self.cancel_event.is_set():
+            raise Transfer_cancelled('The transfer of "%s" was cancelled' % self.name)
+
+    def cancel(self):
+        """
+        Cancel the transfer.
+        """
+
+        self.cancel_event.set()
+
+    def done(self):
+        """
+        Mark the transfer as finished and log its metrics.
+
+        Returns:
+            The metrics of the transfer.  See ``metrics()``.
+        """
+
+        self.finished = time.time()
+        metrics = self.metrics()
+
+        _log.info('Finished %s of "%s": %d bytes in %.2f seconds (%.0f B/s, %d requests, '
+                  '%d attempts)' % (self.direction, self.name, self.transferred,
+                  metrics['seconds'], metrics['bytes-per-second'], self.requests,
+                  self.attempts))
+
+        instrument.record(self.label, kind='transfer', seconds=metrics['seconds'],
+                          num_bytes=self.transferred, requests=self.requests)
+
+        return metrics
+
+    def elapsed(self):
+        """
+        Returns:
+            The number of seconds since the transfer started, or the length of the transfer if it
+            has finished.
+        """
+
+        return (self.finished or time.time()) - self.started
+
+    def rate(self):
+        """
+        Returns:
+            The average number of bytes transferred per second.
+        """
+
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return 0.0
+        return self.transferred / elapsed
+
+    def metrics(self):
+        """
+        Get the metrics of the transfer.
+
+        Returns:
+            A ``dict`` with the ``name``, ``direction``, ``bytes``, ``total``, ``seconds``,
+            ``bytes-per-second``, ``requests``, ``attempts``, ``mean-latency`` and
+            ``max-latency`` (in seconds) of the transfer.
+        """
+
+        with self._lock:
+            latencies = list(self.latencies)
+
+        return {'name':self.name, 'direction':self.direction, 'bytes':self.transferred,
+                'total':self.total, 'seconds':self.elapsed(), 'bytes-per-second':self.rate(),
+                'requests':self.requests, 'attempts':self.attempts,
+                'mean-latency':sum(latencies) / len(latencies) if latencies else 0.0,
+                'max-latency':max(latencies) if latencies else 0.0}
+
 def check_overwrite_file(folder, name, overwrite, remove_existing):
     """
     This method checks to see if the file at the path specified should be overwritten.
@@ -193,7 +524,7 @@ def check_overwrite_file(folder, name, overwrite, remove_existing):
     if file_path.exists():
         if overwrite:
             if remove_existing:
-                file_path.unlink
+                file_path.unlink()
                 _log.info('Removing file %s' % file_path)
             return True
         else:
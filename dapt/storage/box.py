@@ -27,6 +27,13 @@ On a server, where you have no access to a web browser, you will need to get the
 a computer which has a web browser.  You can then place those tokens in the config file or
 directly pass them to the ``connect()`` method.
 
+Once connected, a ``Token_manager`` keeps the tokens valid.  It refreshes the tokens on a
+background timer a few minutes before they expire, so long uploads and downloads don't fail
+part way through.  Every Box method also checks the tokens before it runs and refreshes them
+if they are about to expire.  Refreshing is done under a lock so only one refresh happens when
+many transfers run at the same time.  The new tokens are saved to the ``Config`` on a
+background thread so transfers are not blocked while the config file is written.
+
 .. _box-config:
 
 Config
@@ -44,23 +51,75 @@ file for box is shown bellow.
             "client_secret" : "xxx",
             "access_token" : "xxx",
             "refresh_token" : "xxx",
-            "refresh_time" : "xxx"
+            "refresh_time" : "xxx",
+            "chunked-upload-threshold" : 52428800,
+            "upload-workers" : 4
         }
     }
 
+.. _box-chunked-upload:
+
+Large files
+-----------
+
+Files larger than ``chunked-upload-threshold`` bytes (50 MB by default) are uploaded using a Box
+upload session.  The file is split into the part size chosen by Box and ``upload-workers`` parts
+are sent at the same time.  While the upload is running, the upload session is saved in a small
+file next to the file being uploaded (``.<name>.box-upload``).  If the upload is interrupted,
+calling ``upload_file()`` again will resume the session and only send the parts that Box has
+not received yet.  Box only allows upload sessions for files larger than 20 MB, so the threshold
+cannot be set below that.
+
+.. _box-folder-cache:
+
+Folder cache
+------------
+
+Before a file or folder is uploaded, Box checks if an item with the same name already exists in
+the destination folder.  Listing a folder with many items is slow, so the contents of each
+folder are only listed the first time they are needed.  The names and ids are then kept in a
+cache that is updated when items are uploaded, deleted, or renamed through the ``Box`` object.
+If another program changes the folder, the cache may be wrong.  Box will refuse uploads that
+conflict with an existing item and the conflict is resolved using the item Box returns.  You
+can empty the cache with ``clear_cache()``.
+
 """
 
 import os, time, shutil
+import hashlib
+import http.client
+import json
 import logging as lg
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from boxsdk import *
 from flask import *
+import requests
+import urllib3
 
 from . import base
 
 _log = lg.getLogger(__name__)
 
+# Access tokens are valid for one hour
+TOKEN_LIFETIME = 60*60
+# Refresh the tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = 5*60
+# Wait this many seconds before trying again when a background refresh fails
+TOKEN_RETRY_DELAY = 15
+
+# Box will not create upload sessions for files smaller than 20 MB
+MIN_CHUNKED_UPLOAD_SIZE = 20 * 1024 * 1024
+CHUNKED_UPLOAD_THRESHOLD = 50 * 1024 * 1024
+UPLOAD_WORKERS = 4
+
+# Errors raised by requests and urllib3 when a connection drops while a response is streamed
+_NETWORK_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                   requests.exceptions.ChunkedEncodingError, urllib3.exceptions.ProtocolError,
+                   urllib3.exceptions.TimeoutError, http.client.IncompleteRead)
+
 class Box(base.Storage):
     """
     Class which allows for connection to box API.  You must either provide a Config object
@@ -70,6 +129,10 @@ class Box(base.Storage):
         config (Config): A Config object which contains the client_id and client_secret. 
         client_id (str): The Box client ID.
         client_secret (str): The Box client secret.
+        chunked_upload_threshold (int): Files larger than this many bytes are uploaded in
+         chunks using an upload session.  50 MB by default and never less than 20 MB.
+        upload_workers (int): The number of chunks that are uploaded at the same time.  4 by
+         default.
     """
 
     def __init__(self, *args, **kwargs):
@@ -82,6 +145,11 @@ class Box(base.Storage):
         self.refresh_time = None
         self.client = None
         self.app = None
+        self.chunked_upload_threshold = CHUNKED_UPLOAD_THRESHOLD
+        self.upload_workers = UPLOAD_WORKERS
+        self._folder_items = {}
+        self._item_parents = {}
+        self._cache_lock = threading.RLock()
 
         if 'config' in kwargs:
             self.config = kwargs['config']
@@ -91,16 +159,30 @@ class Box(base.Storage):
                     self.client_id = box_conf['client-id']
                 if 'client-secret' in box_conf:
                     self.client_secret = box_conf['client-secret']
+                if box_conf.get('chunked-upload-threshold') is not None:
+                    self.chunked_upload_threshold = int(box_conf['chunked-upload-threshold'])
+                if box_conf.get('upload-workers') is not None:
+                    self.upload_workers = int(box_conf['upload-workers'])
+                self._configure_transfers(box_conf)
         if 'client-id' in kwargs:
             self.client_id = kwargs['client-id']
         if 'client-secrent' in kwargs:
             self.client_secret = kwargs['client-secret']
+        if 'chunked_upload_threshold' in kwargs:
+            self.chunked_upload_threshold = int(kwargs['chunked_upload_threshold'])
+        if 'upload_workers' in kwargs:
+            self.upload_workers = int(kwargs['upload_workers'])
+
+        self.chunked_upload_threshold = max(self.chunked_upload_threshold,
+                                            MIN_CHUNKED_UPLOAD_SIZE)
+        self.upload_workers = max(self.upload_workers, 1)
         
         if self.client_id is None or self.client_secret is None:
             raise AttributeError('The client-id and client-secret must be provided.  They can ' \
             'be provided directly or using a Config.')
 
         self.oauth = OAuth2(client_id=self.client_id, client_secret=self.client_secret)
+        self.tokens = Token_manager(self)
 
     def connect(self, access_token = None, refresh_token = None):
         """
@@ -122,7 +204,8 @@ class Box(base.Storage):
             self.oauth._refresh_token = refresh_token
             self._access_token, self._refresh_token = self.oauth._refresh(access_token)
             self.client = Client(self.oauth)
-            self.refresh_time = time.time() + 60*60
+            self.refresh_time = time.time() + TOKEN_LIFETIME
+            self.tokens.start()
 
             self._update_config()
 
@@ -137,7 +220,8 @@ class Box(base.Storage):
                 self._access_token, self._refresh_token = \
                     self.oauth._refresh(self.config['box']['access-token'])
                 self.client = Client(self.oauth)
-                self.refresh_time = time.time() + 60*60
+                self.refresh_time = time.time() + TOKEN_LIFETIME
+                self.tokens.start()
 
                 print('Got new access and refresh token from existing')
                 return
@@ -201,7 +285,8 @@ class Box(base.Storage):
 
         self.client = Client(self.oauth)
 
-        self.refresh_time = time.time() + 60*60
+        self.refresh_time = time.time() + TOKEN_LIFETIME
+        self.tokens.start()
 
         func = request.environ.get('werkzeug.server.shutdown')
         if func is None:
@@ -265,15 +350,12 @@ class Box(base.Storage):
             True if the token was refreshed and False otherwise.
         """
 
-        if self.refresh_time < time.time() + 5:
-            self.update_tokens(self._access_token)
-            self._update_config()
-            return True
-        return False
+        return self.tokens.ensure_valid()
 
     def update_tokens(self, access_token):
         """
-        Refresh the access and refresh token given a valid access token
+        Refresh the access and refresh token given a valid access token.  The new tokens are
+        saved to the Config in the background.
 
         Args:
             access_token (string): box access token to be refreshed
@@ -282,22 +364,24 @@ class Box(base.Storage):
             Box client
         """
 
-        self._access_token, self._refresh_token = self.oauth.refresh(access_token)
-        self.client = Client(self.oauth)
-        self.refresh_time = time.time() + 60*60
-
-        self._update_config()
+        self.tokens.refresh(access_token)
 
         return self.client
 
-    def download_file(self, file_id, path='.', overwrite=True):
+    def download_file(self, file_id, path='.', overwrite=True, resume=False, callback=None):
         """
-        Download the file at the given file_id to the given path.
+        Download the file at the given file_id to the given path.  The file is streamed to disk
+        so the memory used does not depend on the size of the file.
 
         Args:
             file_id (str): The file identification to be downloaded
             path (str): The path where the file should be saved
             overwrite (bool): Should the data on your machine be overwritten.  True by default.
+            resume (bool): Continue a download that was interrupted instead of starting over.
+             The partially downloaded file is kept at ``<path>.part`` until the download
+             finishes.  False by default.
+            callback (function): Called with the ``Transfer`` each time a chunk is written.  If
+             None (default), ``transfer_callback`` is used.
 
         Returns:
             True if successful and False otherwise
@@ -316,10 +400,32 @@ class Box(base.Storage):
         if file_path.exists() and not overwrite:
             raise FileExistsError
 
-        contents = file.content()
-        with open(file_path, 'wb') as f:
-            f.write(contents)
-            f.close()
+        part_path = file_path.with_name(file_path.name + '.part')
+
+        if not resume and part_path.exists():
+            part_path.unlink()
+
+        transfer = self.transfer(file_info.name, 'download', total=file_info.size)
+        if callback:
+            transfer.callback = callback
+
+        def download():
+            # Start from the end of the partial file so retries resume the download
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            if offset > file_info.size:
+                offset = 0
+            if offset > 0:
+                _log.info('Resuming download of "%s" at byte %d' % (file_info.name, offset))
+            transfer.transferred = offset
+
+            with open(part_path, 'ab' if offset > 0 else 'wb') as f:
+                if offset < file_info.size:
+                    byte_range = (offset, file_info.size - 1) if offset > 0 else None
+                    file.download_to(_Transfer_stream(f, transfer), byte_range=byte_range)
+
+        transfer.run(download)
+        os.replace(part_path, file_path)
+        transfer.done()
 
         return True
     
@@ -373,7 +479,12 @@ class Box(base.Storage):
             True if successful and False otherwise
         """
 
-        return self.client.file(file_id).delete()
+        self._check_tokens()
+
+        deleted = self.client.file(file_id).delete()
+        self._uncache_item(file_id)
+
+        return deleted
 
     def delete_folder(self, folder_id):
         """
@@ -386,7 +497,12 @@ class Box(base.Storage):
             True if successful and False otherwise
         """
 
-        return self.client.folder(folder_id).delete()
+        self._check_tokens()
+
+        deleted = self.client.folder(folder_id).delete()
+        self._uncache_item(folder_id)
+
+        return deleted
 
     def rename_file(self, file_id, name):
         """
@@ -400,7 +516,10 @@ class Box(base.Storage):
             True if the file or folder was renamed, False otherwise.
         """
 
+        self._check_tokens()
+
         renamed_file = self.client.file(file_id).rename(name)
+        self._rename_cached_item(file_id, name)
 
         if renamed_file.id == file_id and renamed_file.name == name:
             return True
@@ -419,16 +538,20 @@ class Box(base.Storage):
             True if the file or folder was renamed, False otherwise.
         """
         
+        self._check_tokens()
+
         renamed_folder = self.client.folder(folder_id).rename(name)
+        self._rename_cached_item(folder_id, name)
 
         if renamed_folder.id == folder_id and renamed_folder.name == name:
             return True
         else:
             return False
 
-    def upload_file(self, folder_id, path, name=None, overwrite=True):
+    def upload_file(self, folder_id, path, name=None, overwrite=True, folder=None):
         """
-        Upload a file to the given folder.
+        Upload a file to the given folder.  This accepts the ``Storage.upload_file()`` form,
+        ``upload_file(folder_id, name, folder=folder)``, as well as a path.
 
         Args:
             folder_id (str): The folder identification to be downloaded
@@ -436,6 +559,7 @@ class Box(base.Storage):
             name (str): The name the file or folder should be saved with.  If None then the
              leaf of the path is used as the name.
             overwrite (bool): Should the data on your machine be overwritten.  True by default.
+            folder (str): The directory ``path`` is relative to.  None by default.
 
         Returns:
             True if the upload was successful and False otherwise.
@@ -445,25 +569,34 @@ class Box(base.Storage):
         
         parent_folder = self.client.folder(folder_id)
 
+        if folder is not None:
+            path = str(Path(folder) / path)
         if name is None:
             name = Path(path).name
 
         # Check if the a file with `name` exists in the folder being uploaded to
-        filter_function = lambda x : (x.name == name and x.type == 'file')
-        exists = list(filter(filter_function, parent_folder.get_items()))
+        existing_id = self._cached_item(folder_id, name, 'file')
 
         # Remove the file, if it exists and the user has set overwrite to True
-        if len(exists) == 1:
+        if existing_id is not None:
             if overwrite:
-                self.delete_file(exists[0].id)
+                self._delete_existing(existing_id, 'file')
             else:
                 raise FileExistsError
-        elif len(exists) > 1:
-            # This is just a sanity check
-            raise Exception('More than one file with the upload name were found.  \
-                             Not sure what to do so crashing.')
 
-        new_file = parent_folder.upload(path, name)
+        try:
+            new_file = self._upload(parent_folder, path, name)
+        except exception.BoxAPIException as e:
+            # The cache didn't know about the file, so another program must have made it
+            conflict_id = _conflict_id(e)
+            if conflict_id is None:
+                raise
+            if not overwrite:
+                raise FileExistsError
+            self._delete_existing(conflict_id, 'file')
+            new_file = self._upload(parent_folder, path, name)
+
+        self._cache_item(folder_id, name, 'file', new_file.id)
 
         # Did the file get uploaded correctly
         if isinstance(new_file, file.File):
@@ -494,23 +627,31 @@ class Box(base.Storage):
             name = Path(path).name
 
         # Check if the a folder with `name` exists in the folder being uploaded to
-        filter_function = lambda x : (x.name == name and x.type == 'folder')
-        exists = list(filter(filter_function, parent_folder.get_items()))
+        existing_id = self._cached_item(folder_id, name, 'folder')
 
         # Remove the folder, if it exists and the user has set overwrite to True
-        if len(exists) == 1:
+        if existing_id is not None:
             if overwrite:
-                self.delete_folder(exists[0].id)
+                self._delete_existing(existing_id, 'folder')
             else:
                 raise Exception('A folder with the upload name, %s, already exists.  Use ' \
                     '`overwrite=True` to force an overwrite of this folder.' % str(name))
-        elif len(exists) > 1:
-            # This is just a sanity check
-            raise Exception('More than one folder with the upload name were found. ' \
-                'Not sure what to do so crashing.')
 
         # Create the new parent folder
-        parent_folder = parent_folder.create_subfolder(name)
+        try:
+            new_folder = parent_folder.create_subfolder(name)
+        except exception.BoxAPIException as e:
+            conflict_id = _conflict_id(e)
+            if conflict_id is None or not overwrite:
+                raise
+            self._delete_existing(conflict_id, 'folder')
+            new_folder = parent_folder.create_subfolder(name)
+
+        # The new folder is empty so there is no need to list it later
+        self._cache_item(folder_id, name, 'folder', new_folder.id)
+        with self._cache_lock:
+            self._folder_items[new_folder.id] = {}
+        parent_folder = new_folder
 
         # Iterate over the contents of path.  Add files and recursively add folders.
         path = Path(path)
@@ -520,4 +661,458 @@ class Box(base.Storage):
             elif f.is_file():
                 self.upload_file(parent_folder.id, f)
 
+    def clear_cache(self, folder_id=None):
+        """
+        Remove the cached contents of a folder so it will be listed again the next time it is
+        needed.
+
+        Args:
+            folder_id (str): The folder to remove from the cache.  If None (default), the whole
+             cache is cleared.
+        """
+
+        with self._cache_lock:
+            if folder_id is None:
+                self._folder_items = {}
+                self._item_parents = {}
+            else:
+                items = self._folder_items.pop(folder_id, {})
+                for item_id in items.values():
+                    self._item_parents.pop(item_id, None)
+
+    def _cached_item(self, folder_id, name, item_type):
+        """
+        Get the id of the item with the given name and type in a folder.  The folder is listed
+        the first time it is used and the cache is used after that.
+
+        Args:
+            folder_id (str): The folder to look in
+            name (str): The name of the item
+            item_type (str): The Box type of the item (``file`` or ``folder``)
+
+        Returns:
+            The id of the item or None if it does not exist.
+        """
+
+        with self._cache_lock:
+            if folder_id not in self._folder_items:
+                items = self.client.folder(folder_id).get_items(fields=['id', 'name', 'type'])
+                self._folder_items[folder_id] = {}
+                for item in items:
+                    self._cache_item(folder_id, item.name, item.type, item.id)
+                _log.debug('Cached %d items in folder %s' %
+                           (len(self._folder_items[folder_id]), folder_id))
+
+            return self._folder_items[folder_id].get((name, item_type))
+
+    def _cache_item(self, folder_id, name, item_type, item_id):
+        """
+        Add an item to the cache of a folder that has been listed.
+
+        Args:
+            folder_id (str): The folder the item is in
+            name (str): The name of the item
+            item_type (str): The Box type of the item (``file`` or ``folder``)
+            item_id (str): The id of the item
+        """
+
+        with self._cache_lock:
+            if folder_id in self._folder_items:
+                self._folder_items[folder_id][(name, item_type)] = item_id
+                self._item_parents[item_id] = (folder_id, (name, item_type))
+
+    def _uncache_item(self, item_id):
+        """
+        Remove an item from the cache.
+
+        Args:
+            item_id (str): The id of the item
+        """
+
+        with self._cache_lock:
+            if item_id in self._item_parents:
+                folder_id, key = self._item_parents.pop(item_id)
+                self._folder_items.get(folder_id, {}).pop(key, None)
+            # A deleted folder's contents are gone too
+            self.clear_cache(item_id)
+
+    def _rename_cached_item(self, item_id, name):
+        """
+        Change the name of an item in the cache.
+
+        Args:
+            item_id (str): The id of the item
+            name (str): The new name of the item
+        """
+
+        with self._cache_lock:
+            if item_id in self._item_parents:
+                folder_id, (_, item_type) = self._item_parents[item_id]
+                self._uncache_item(item_id)
+                self._cache_item(folder_id, name, item_type, item_id)
+
+    def _retryable(self, error):
+        """
+        Check if a Box request that raised the given error should be retried.  Network errors,
+        rate limits, and server errors are retried.  This includes the ``requests`` and
+        ``urllib3`` errors raised while a download is streamed, such as a dropped connection,
+        which boxsdk does not wrap.
+
+        Args:
+            error (Exception): The error raised by the request
+
+        Returns:
+            True if the request should be retried and False otherwise.
+        """
+
+        if isinstance(error, (exception.BoxNetworkException,) + _NETWORK_ERRORS):
+            return True
+        if isinstance(error, exception.BoxAPIException):
+            return error.status == 429 or error.status >= 500
+        return super()._retryable(error)
+
+    def _delete_existing(self, item_id, item_type):
+        """
+        Delete an item that is being overwritten.  Items that were already removed are ignored
+        because the cache might be out of date.
+
+        Args:
+            item_id (str): The id of the item
+            item_type (str): The Box type of the item (``file`` or ``folder``)
+        """
+
+        try:
+            if item_type == 'folder':
+                self.delete_folder(item_id)
+            else:
+                self.delete_file(item_id)
+        except exception.BoxAPIException as e:
+            if e.status != 404:
+                raise
+            self._uncache_item(item_id)
+
+    def _upload(self, parent_folder, path, name):
+        """
+        Upload a file, using an upload session if the file is large.
+
+        Args:
+            parent_folder (Folder): the Box folder the file is being uploaded to
+            path (str): The path to the file to be uploaded
+            name (str): The name the file should be saved with
+
+        Returns:
+            The Box ``File`` that was created
+        """
+
+        file_size = os.path.getsize(path)
+        transfer = self.transfer(name, 'upload', total=file_size)
+
+        if file_size > self.chunked_upload_threshold:
+            new_file = self._chunked_upload(parent_folder, path, name, transfer)
+        else:
+            new_file = transfer.run(parent_folder.upload, path, name)
+            transfer.progress(file_size)
+
+        transfer.done()
+
+        return new_file
+
+    def _chunked_upload(self, parent_folder, path, name, transfer):
+        """
+        Upload a large file to the given folder using a Box upload session.  The parts are
+        uploaded concurrently using ``upload_workers`` threads.  The session id is saved next to
+        the file so an interrupted upload can be resumed by uploading the same file again.
+
+        Args:
+            parent_folder (Folder): the Box folder the file is being uploaded to
+            path (str): The path to the file to be uploaded
+            name (str): The name the file should be saved with
+            transfer (Transfer): the transfer used to run and measure the requests
+
+        Returns:
+            The Box ``File`` that was created
+        """
+
+        path = Path(path)
+        stat = path.stat()
+        file_size = stat.st_size
+        state_path = path.parent / ('.%s.box-upload' % path.name)
+
+        session, part_size, parts = self._resume_upload_session(state_path, stat, name)
+
+        if session is None:
+            session = transfer.run(parent_folder.create_upload_session, file_size, name)
+            part_size = session.part_size
+            parts = {}
+
+            with open(state_path, 'w') as f:
+                json.dump({'session-id':session.object_id, 'part-size':part_size,
+                           'file-size':file_size, 'mtime':stat.st_mtime, 'name':name}, f)
+            _log.debug('Created upload session %s for "%s"' % (session.object_id, path))
+
+        offsets = [o for o in range(0, file_size, part_size) if o not in parts]
+        transfer.transferred = sum(p.get('size', 0) for p in parts.values())
+        lock = threading.Lock()
+
+        _log.info('Uploading %d of %d parts of "%s"' % (len(offsets),
+                  (file_size + part_size - 1) // part_size, path))
+
+        def upload_part(offset):
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                part_bytes = f.read(part_size)
+
+            transfer.check_cancelled()
+            part = transfer.run(session.upload_part_bytes, part_bytes, offset, file_size)
+
+            with lock:
+                parts[offset] = part
+            transfer.progress(len(part_bytes))
+
+        with ThreadPoolExecutor(max_workers=self.upload_workers) as executor:
+            # Consume the results so exceptions from the workers are raised here
+            list(executor.map(upload_part, offsets))
+
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024*1024), b''):
+                sha1.update(block)
+
+        new_file = transfer.run(session.commit, sha1.digest(),
+                                parts=[parts[o] for o in sorted(parts)])
+
+        state_path.unlink()
+        _log.info('Finished chunked upload of "%s"' % path)
+
+        return new_file
+
+    def _resume_upload_session(self, state_path, stat, name):
+        """
+        Load a saved upload session, if there is one, and get the parts Box already has.  The
+        session is ignored if the file has changed since the session was started or Box no
+        longer knows about it.
+
+        Args:
+            state_path (Path): the path to the saved upload session
+            stat (os.stat_result): the current stats of the file being uploaded
+            name (str): The name the file should be saved with
+
+        Returns:
+            A tuple containing the upload session, part size and a dictionary of the uploaded
+            parts keyed by their offset.  The session is None if it cannot be resumed.
+        """
+
+        if not state_path.exists():
+            return None, None, None
+
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except ValueError:
+            return None, None, None
+
+        if (state.get('file-size') != stat.st_size or state.get('mtime') != stat.st_mtime or
+            state.get('name') != name):
+            _log.info('Discarding upload session %s because the file changed' %
+                      state.get('session-id'))
+            return None, None, None
+
+        try:
+            session = self.client.upload_session(state['session-id'])
+            parts = {p['offset']:p for p in session.get_parts()}
+        except exception.BoxAPIException as e:
+            _log.info('Cannot resume upload session %s: %s' % (state['session-id'], str(e)))
+            return None, None, None
+
+        _log.info('Resuming upload session %s with %d parts already uploaded' %
+                  (state['session-id'], len(parts)))
+
+        return session, state['part-size'], parts
+
+
+class Token_manager:
+    """
+    Keeps the Box access and refresh tokens valid.  A background timer refreshes the tokens
+    ``margin`` seconds before they expire.  The manager can be shared by threads that are
+    transferring files at the same time; only one of them will refresh the tokens and the others
+    will wait for the new tokens.  If a background refresh fails, it is tried again every
+    ``retry_delay`` seconds until it succeeds.
+
+    Args:
+        box (Box): the Box object whose tokens are managed
+        lifetime (float): how many seconds a new access token is valid for
+        margin (float): how many seconds before the tokens expire they should be refreshed
+        retry_delay (float): how many seconds to wait before retrying a failed refresh
+    """
+
+    def __init__(self, box, lifetime=TOKEN_LIFETIME, margin=TOKEN_REFRESH_MARGIN,
+                 retry_delay=TOKEN_RETRY_DELAY):
+        self.box = box
+        self.lifetime = lifetime
+        self.margin = margin
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._persist_lock = threading.Lock()
+        self._timer = None
+
+    def start(self):
+        """
+        Start the background timer that refreshes the tokens before they expire.  Calling this
+        again reschedules the timer using the current ``refresh_time`` of the Box object.
+        """
+
+        if self.box.refresh_time is None:
+            self.stop()
+            return
+
+        self._schedule(max(self.box.refresh_time - self.margin - time.time(), 0))
+
+    def stop(self):
+        """
+        Stop the background timer.
+        """
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def expiring(self):
+        """
+        Check if the tokens are about to expire.
+
+        Returns:
+            True if the tokens expire within ``margin`` seconds and False otherwise.
+        """
+
+        return (self.box.refresh_time is not None and
+                self.box.refresh_time < time.time() + self.margin)
+
+    def ensure_valid(self):
+        """
+        Refresh the tokens if they are about to expire.  This is safe to call from many threads.
+
+        Returns:
+            True if the tokens were refreshed and False otherwise.
+        """
+
+        if not self.expiring():
+            return False
+
+        with self._lock:
+            # Another thread may have refreshed the tokens while we waited for the lock
+            if not self.expiring():
+                return False
+            self._refresh(self.box._access_token)
+
+        return True
+
+    def refresh(self, access_token=None):
+        """
+        Refresh the tokens now.
+
+        Args:
+            access_token (str): the access token to refresh.  The current access token is used
+             if None is given.
+        """
+
+        with self._lock:
+            self._refresh(access_token or self.box._access_token)
+
+    def _refresh(self, access_token):
+        """
+        Refresh the tokens, reschedule the timer and save the new tokens in the background.  The
+        lock must be held when this is called.
+
+        Args:
+            access_token (str): the access token to refresh
+        """
+
+        box = self.box
+        box._access_token, box._refresh_token = box.oauth.refresh(access_token)
+        if box.client is None:
+            box.client = Client(box.oauth)
+        box.refresh_time = time.time() + self.lifetime
+        _log.info('Refreshed the Box tokens')
+
+        self.start()
+
+        persist = threading.Thread(target=self._persist, daemon=True)
+        persist.start()
+
+    def _schedule(self, delay):
+        """
+        Replace the background timer with one that refreshes the tokens in ``delay`` seconds.
+        """
+
+        self.stop()
+        self._timer = threading.Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+        _log.debug('Box tokens will be refreshed in %d seconds' % delay)
+
+    def _refresh_in_background(self):
+        """
+        Timer callback that refreshes the tokens.
+        """
+
+        try:
+            self.ensure_valid()
+        except Exception as e:
+            # Transfers such as chunked uploads don't check the tokens, so keep trying
+            _log.warning('Could not refresh the Box tokens in the background, trying again in ' \
+                         '%d seconds: %s' % (self.retry_delay, str(e)))
+            self._schedule(self.retry_delay)
+
+    def _persist(self):
+        """
+        Save the current tokens to the Config.
+        """
+
+        with self._persist_lock:
+            try:
+                self.box._update_config()
+            except Exception as e:
+                _log.warning('Could not save the Box tokens to the config: %s' % str(e))
+
+
+def _conflict_id(error):
+    """
+    Get the id of the item that caused an upload to fail because the name is in use.
+
+    Args:
+        error (BoxAPIException): the error raised by Box
+
+    Returns:
+        The id of the conflicting item or None if the error was not a name conflict.
+    """
+
+    if error.status != 409 or not error.context_info:
+        return None
+
+    conflicts = error.context_info.get('conflicts')
+    if isinstance(conflicts, list):
+        conflicts = conflicts[0] if conflicts else None
+    if not conflicts:
+        return None
+
+    return conflicts.get('id')
+
+
+class _Transfer_stream:
+    """
+    A writable stream that passes chunks to a file and reports them to a ``Transfer``.
+
+    Args:
+        stream (file): the file that the chunks are written to
+        transfer (Transfer): the transfer to report progress to
+    """
+
+    def __init__(self, stream, transfer):
+        self.stream = stream
+        self.transfer = transfer
+
+    def write(self, chunk):
+        self.stream.write(chunk)
+        self.transfer.progress(len(chunk))
 
+        return len(chunk)
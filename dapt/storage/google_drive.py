@@ -27,6 +27,7 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from apiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.errors import HttpError
 
 from . import base
 
@@ -40,6 +41,8 @@ class Google_Drive(base.Storage):
         creds_path (str): the path to the file containing the Google API credentials. 
          Default is ``credentials.json``.
         config (Config): a Config object with the associated config file to be used
+        service (Resource): an already authorized Drive v3 service to use instead of signing
+         in.  This allows the fakes in :ref:`testing` to be used.
     """
 
     def __init__(self, **kwargs):
@@ -52,6 +55,7 @@ class Google_Drive(base.Storage):
         if 'config' in kwargs:
             self.config = kwargs['config']
             if self.config.has_value('google-drive'):
+                self._configure_transfers(self.config['google-drive'])
                 if self.config.has_value(['google-drive', 'creds-path']):
                     self.creds_path = self.config['google-drive']['creds-path']
                 if self.config.has_value(['google-drive', 'creds']):
@@ -61,6 +65,8 @@ class Google_Drive(base.Storage):
                         _log.info('Loaded credentials from Config.')
         if 'creds_path' in kwargs:
             self.creds_path = kwargs['creds_path']
+        if 'service' in kwargs:
+            self.service = kwargs['service']
 
     def connect(self):
         """
@@ -71,6 +77,10 @@ class Google_Drive(base.Storage):
             True if the connection was successful and False otherwise.
         """
 
+        # A service was given so there is nothing to sign in to
+        if self.service is not None and self._creds is None:
+            return True
+
         # Check the current creds and try to update them
         if self._creds and not self._creds.valid and self._creds.refresh_token:
             _log.debug('Attempting to update the internal creds')
@@ -113,6 +123,22 @@ class Google_Drive(base.Storage):
             return self._creds.valid
         return False
 
+    def _retryable(self, error):
+        """
+        Check if a Google Drive request that raised the given error should be retried.  Rate
+        limits, server errors, and network errors are retried.
+
+        Args:
+            error (Exception): The error raised by the request
+
+        Returns:
+            True if the request should be retried and False otherwise.
+        """
+
+        if isinstance(error, HttpError):
+            return error.resp.status == 429 or error.resp.status >= 500
+        return super()._retryable(error)
+
     def _get_metadata(self, file_id):
         """
         Get the Google Drive metadata for the given file ID.
@@ -159,12 +185,18 @@ class Google_Drive(base.Storage):
             _log.warn('Error downloading %s(%s): Only binary files can be downloaded from Google Drive.  Files such as Google Docs cannot.' % (name, file_id))
             return False
 
-        fh = io.FileIO(path, mode='wb')
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-            _log.info("Downloading \"%s\": %d%%." % (metadata["name"], int(status.progress() * 100)))
+        size = int(metadata["size"]) if "size" in metadata else None
+        transfer = self.transfer(metadata["name"], 'download', total=size)
+
+        with io.FileIO(path, mode='wb') as fh:
+            downloader = MediaIoBaseDownload(fh, request)
+            done = False
+            while done is False:
+                status, done = transfer.run(downloader.next_chunk)
+                transfer.progress(status.resumable_progress - transfer.transferred)
+                _log.debug("Downloading \"%s\": %d%%." % (metadata["name"], int(status.progress() * 100)))
+
+        transfer.done()
 
         return done
 
@@ -309,7 +341,16 @@ class Google_Drive(base.Storage):
         mimetype = base.get_mime_type(name)
 
         media = MediaFileUpload(path, mimetype=mimetype, resumable=True)
-        file = self.service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+        request = self.service.files().create(body=file_metadata, media_body=media, fields='id')
+        transfer = self.transfer(name, 'upload', total=media.size())
+
+        response = None
+        while response is None:
+            status, response = transfer.run(request.next_chunk)
+            uploaded = status.resumable_progress if status else media.size()
+            transfer.progress(uploaded - transfer.transferred)
+
+        transfer.done()
 
         return True
 
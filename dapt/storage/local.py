@@ -0,0 +1,492 @@
+"""
+.. _local-storage:
+
+Local
+=====
+
+Class that uses a directory on the computer as storage.  The directory can be on the local disk
+or on a shared filesystem such as NFS or Lustre, which makes it useful on clusters where results
+should be kept on the cluster.  Because no network service is needed, it can also be used when
+testing pipelines offline or to measure how much time a pipeline spends on storage.
+
+The ``file_id`` of a file or folder is its path relative to the ``root`` directory.  For example,
+if ``root`` is ``/scratch/results`` then the file ``/scratch/results/run1/output.zip`` has the
+``file_id`` ``run1/output.zip``.  The root directory is used when the ``file_id`` is ``.`` or
+empty.  Paths outside of ``root`` cannot be used.
+
+Files are copied with ``os.copy_file_range()`` when it is available so the data is copied by the
+kernel (or the filesystem) instead of being read into Python.  When ``hardlink`` is ``True``,
+files are hard linked instead of copied if the source and destination are on the same
+filesystem.  Hard links don't copy any data, but the two paths are the same file so changing one
+changes the other.  Only use hard links if files are replaced instead of edited in place.
+
+.. _local-storage-config:
+
+Config
+------
+
+The ``Local`` class can be instantiated using a :ref:`config` class.  The values should be placed
+inside a JSON object named ``local``.
+
++---------------------------+----------------------------------------------------------------+
+| Fields                    | Description                                                    |
++===========================+================================================================+
+| ``root`` (str)            | The directory files are stored in.                             |
++---------------------------+----------------------------------------------------------------+
+| ``hardlink`` (bool)       | Hard link files instead of copying them when possible.  False  |
+|                           | by default.                                                    |
++---------------------------+----------------------------------------------------------------+
+
+.. code-block:: JSON
+    :caption: Sample JSON configuration for ``Local``
+    :name: example-local-storage-config
+
+    {
+        "local" : {
+            "root" : "/scratch/results",
+            "hardlink" : false
+        }
+    }
+
+"""
+
+import errno
+import logging
+import os
+from pathlib import Path
+import shutil
+
+from . import base
+
+_log = logging.getLogger(__name__)
+
+# Number of bytes copied by each call to ``os.copy_file_range()``
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+# Number of bytes read from a stream at a time by ``upload_stream()``
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+class Local(base.Storage):
+    """
+    Store files in a directory on this computer or a shared filesystem.  You must either provide
+    a Config object or the root directory.
+
+    Keyword args:
+        config (Config): a Config object with the ``local`` settings
+        root (str): the directory files are stored in
+        hardlink (bool): hard link files instead of copying them when possible.  False by
+         default.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.config = None
+        self.root = None
+        self.hardlink = False
+
+        if 'config' in kwargs:
+            self.config = kwargs['config']
+            if self.config.has_value('local'):
+                local_conf = self.config['local']
+                if local_conf.get('root') is not None:
+                    self.root = local_conf['root']
+                if local_conf.get('hardlink') is not None:
+                    self.hardlink = bool(local_conf['hardlink'])
+                self._configure_transfers(local_conf)
+
+        if len(args) > 0:
+            self.root = args[0]
+        if 'root' in kwargs:
+            self.root = kwargs['root']
+        if 'hardlink' in kwargs:
+            self.hardlink = kwargs['hardlink']
+
+        if self.root is None:
+            raise ValueError('The root directory must be provided.  It can be provided ' \
+                             'directly or using a Config.')
+
+        self.root = Path(self.root).resolve()
+
+    def connect(self):
+        """
+        Create the root directory if it does not exist.
+
+        Returns:
+            True if the root directory can be used and False otherwise.
+        """
+
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        return self.connected()
+
+    def connected(self):
+        """
+        Check that the root directory exists and can be written to.
+
+        Returns:
+            True if the root directory can be used and False otherwise.
+        """
+
+        if not self.root.is_dir():
+            _log.warning('The root directory "%s" does not exist.' % self.root)
+            return False
+        if not os.access(self.root, os.W_OK):
+            _log.warning('Cannot write to the root directory "%s".' % self.root)
+            return False
+
+        return True
+
+    def path(self, file_id):
+        """
+        Get the path of a file or folder in the storage.
+
+        Args:
+            file_id (str): The file identification (the path relative to ``root``)
+
+        Returns:
+            The absolute ``Path`` of the file or folder
+        """
+
+        path = (self.root / str(file_id or '.')).resolve()
+
+        if path != self.root and self.root not in path.parents:
+            raise ValueError('"%s" is outside of the root directory "%s"' % (file_id, self.root))
+
+        return path
+
+    def download_file(self, file_id, folder='.', name=None, overwrite=True):
+        """
+        Copy the file at the given file_id to the given folder.
+
+        Args:
+            file_id (str): The file identification to be downloaded
+            folder (str): The directory where the file should be saved
+            name (str): The name that the file should be saved as.  If None is given (default),
+             then the name of the file in the storage will be used.
+            overwrite (bool): Should the data on your machine be overwritten.  True by default.
+
+        Returns:
+            True if successful and False otherwise
+        """
+
+        source = self.path(file_id)
+
+        if name is None:
+            name = source.name
+
+        if not base.check_overwrite_file(folder, name, overwrite, True):
+            _log.warning('Could not download the file %s because a file with that name exists.' \
+                         '  Mark "overwrite" as true to overwrite the existing file.' % name)
+            return False
+
+        Path(folder).mkdir(parents=True, exist_ok=True)
+        self._copy_file(source, Path(folder) / name, 'download')
+
+        return True
+
+    def download_folder(self, file_id, folder='.', name=None, overwrite=True):
+        """
+        Copy the folder at the given file_id to the given folder.
+
+        Args:
+            file_id (str): The folder identification to be downloaded
+            folder (str): The directory where the folder should be saved
+            name (str): The name that the folder should be saved as.  If None is given
+             (default), then the name of the folder in the storage will be used.
+            overwrite (bool): Should the data on your machine be overwritten.  True by default.
+
+        Returns:
+            True if successful and False otherwise
+        """
+
+        source = self.path(file_id)
+
+        if name is None:
+            name = source.name
+
+        if not base.check_overwrite_folder(folder, name, overwrite, True):
+            _log.warning('Could not download the folder %s because a folder with that name ' \
+                         'exists.  Mark "overwrite" as true to overwrite the existing folder.' %
+                         name)
+            return False
+
+        self._copy_folder(source, Path(folder) / name, 'download')
+
+        return True
+
+    def delete_file(self, file_id):
+        """
+        Delete the the given file.
+
+        Args:
+            file_id (str): The file identification to be deleted
+
+        Returns:
+            True if successful and False otherwise
+        """
+
+        path = self.path(file_id)
+
+        if not path.is_file():
+            return False
+
+        path.unlink()
+        _log.info('Deleted file "%s".' % path)
+
+        return True
+
+    def delete_folder(self, file_id):
+        """
+        Delete the given folder.
+
+        Args:
+            file_id (str): The folder identification to be deleted
+
+        Returns:
+            True if successful and False otherwise
+        """
+
+        path = self.path(file_id)
+
+        if not path.is_dir() or path == self.root:
+            return False
+
+        shutil.rmtree(path)
+        _log.info('Deleted folder "%s".' % path)
+
+        return True
+
+    def rename_file(self, file_id, name):
+        """
+        Rename the given file.
+
+        Args:
+            file_id (str): The file identification to be renamed
+            name (str): The new name of the file
+
+        Returns:
+            True if the file was renamed, False otherwise.
+        """
+
+        return self._rename(file_id, name)
+
+    def rename_folder(self, file_id, name):
+        """
+        Rename the given folder.
+
+        Args:
+            file_id (str): The folder identification to be renamed
+            name (str): The new name of the folder
+
+        Returns:
+            True if the folder was renamed, False otherwise.
+        """
+
+        return self._rename(file_id, name)
+
+    def upload_file(self, file_id, name, folder='.', overwrite=True):
+        """
+        Copy a file into the given folder of the storage.
+
+        Args:
+            file_id (str): The folder where the file should be saved.
+            name (str): The name of the file to upload.
+            folder (str): The directory where the file is stored.
+            overwrite (bool): Should the data in the storage be overwritten.  True by default.
+
+        Returns:
+            True if the upload was successful and False otherwise.
+        """
+
+        destination = self.path(file_id)
+
+        if not base.check_overwrite_file(destination, name, overwrite, True):
+            _log.warning('Could not upload the file %s because a file with that name exists.' \
+                         '  Mark "overwrite" as true to overwrite the existing file.' % name)
+            return False
+
+        destination.mkdir(parents=True, exist_ok=True)
+        self._copy_file(Path(folder) / name, destination / name, 'upload')
+
+        return True
+
+    def upload_folder(self, file_id, name, folder='.', overwrite=True):
+        """
+        Copy a folder into the given folder of the storage.
+
+        Args:
+            file_id (str): The folder where the folder should be saved.
+            name (str): The name of the folder to upload.
+            folder (str): The directory where the folder is stored.
+            overwrite (bool): Should the data in the storage be overwritten.  True by default.
+
+        Returns:
+            True if the upload was successful and False otherwise.
+        """
+
+        destination = self.path(file_id)
+
+        if not base.check_overwrite_folder(destination, name, overwrite, True):
+            _log.warning('Could not upload the folder %s because a folder with that name ' \
+                         'exists.  Mark "overwrite" as true to overwrite the existing folder.' %
+                         name)
+            return False
+
+        self._copy_folder(Path(folder) / name, destination / name, 'upload')
+
+        return True
+
+    def upload_stream(self, file_id, stream, name, overwrite=True):
+        """
+        Save the data read from a stream as a file in the given folder of the storage.  The
+        data is written to a temporary file next to the destination and moved into place once
+        the stream ends, so a failed upload never leaves a partial file.
+
+        Args:
+            file_id (str): The folder where the file should be saved.
+            stream (file): A binary file-like object with a ``read()`` method.
+            name (str): The name that the file should be saved as.
+            overwrite (bool): Should the data in the storage be overwritten.  True by default.
+
+        Returns:
+            True if the upload was successful and False otherwise.
+        """
+
+        destination = self.path(file_id)
+
+        if not overwrite and (destination / name).exists():
+            _log.warning('Could not upload the file %s because a file with that name exists.' \
+                         '  Mark "overwrite" as true to overwrite the existing file.' % name)
+            return False
+
+        destination.mkdir(parents=True, exist_ok=True)
+        part = destination / ('.%s.part' % name)
+        transfer = self.transfer(name, 'upload')
+
+        try:
+            with open(part, 'wb') as f:
+                while True:
+                    transfer.check_cancelled()
+                    data = stream.read(STREAM_CHUNK_SIZE)
+                    if not data:
+                        break
+                    f.write(data)
+                    transfer.progress(len(data))
+
+            os.replace(part, destination / name)
+        finally:
+            if part.exists():
+                part.unlink()
+
+        transfer.done()
+
+        return True
+
+    def _rename(self, file_id, name):
+        """
+        Rename a file or folder, keeping it in the same directory.
+
+        Args:
+            file_id (str): The file or folder identification to be renamed
+            name (str): The new name of the file or folder
+
+        Returns:
+            True if the file or folder was renamed, False otherwise.
+        """
+
+        path = self.path(file_id)
+        new_path = path.with_name(name)
+
+        if not path.exists() or new_path.exists():
+            return False
+
+        path.rename(new_path)
+        _log.info('Renamed "%s" to "%s"' % (path, name))
+
+        return True
+
+    def _copy_folder(self, source, destination, direction):
+        """
+        Copy the contents of a folder into ``destination``, which may already exist.
+
+        Args:
+            source (Path): the folder to copy
+            destination (Path): where the folder should be copied to
+            direction (str): ``upload`` or ``download``
+        """
+
+        destination.mkdir(parents=True, exist_ok=True)
+
+        for folder, subfolders, files in os.walk(source):
+            relative = Path(folder).relative_to(source)
+            for subfolder in subfolders:
+                (destination / relative / subfolder).mkdir(exist_ok=True)
+            for f in files:
+                self._copy_file(Path(folder) / f, destination / relative / f, direction)
+
+    def _copy_file(self, source, destination, direction):
+        """
+        Copy a file using a ``Transfer``.  The file is hard linked if ``hardlink`` is set and
+        the file is on the same filesystem, otherwise it is copied using
+        ``os.copy_file_range()`` if possible.
+
+        Args:
+            source (Path): the file to copy
+            destination (Path): where the file should be copied to
+            direction (str): ``upload`` or ``download``
+        """
+
+        size = source.stat().st_size
+        transfer = self.transfer(source.name, direction, total=size)
+
+        if destination.exists():
+            destination.unlink()
+
+        if not (self.hardlink and self._link(source, destination)):
+            transfer.run(copy_file, source, destination)
+
+        transfer.progress(size)
+        transfer.done()
+
+    def _link(self, source, destination):
+        """
+        Try to hard link a file.
+
+        Args:
+            source (Path): the file to link
+            destination (Path): the path of the new link
+
+        Returns:
+            True if the link was made and False if the file must be copied instead.
+        """
+
+        try:
+            os.link(source, destination)
+            return True
+        except OSError as e:
+            _log.debug('Cannot hard link "%s": %s' % (source, str(e)))
+            return False
+
+def copy_file(source, destination):
+    """
+    Copy a file using ``os.copy_file_range()`` so the data does not pass through Python.  If
+    ``copy_file_range`` is not supported by the system or filesystem, ``shutil.copyfile()`` is
+    used instead.
+
+    Args:
+        source (str): the file to copy
+        destination (str): where the file should be copied to
+    """
+
+    if hasattr(os, 'copy_file_range'):
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            try:
+                while os.copy_file_range(src.fileno(), dst.fileno(), COPY_CHUNK_SIZE) > 0:
+                    pass
+                shutil.copymode(source, destination)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+                _log.debug('copy_file_range is not supported, using shutil: %s' % str(e))
+
+    shutil.copyfile(source, destination)
+    shutil.copymode(source, destination)
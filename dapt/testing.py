@@ -0,0 +1,913 @@
+"""
+.. _testing:
+
+Testing
+=======
+
+Tools for testing and load testing DAPT without using Google's servers.  Testing with the real
+Google Sheets API requires credentials and uses the API quota, so it is hard to see how DAPT
+behaves when many workers share one spreadsheet.  This module provides in-memory stand-ins for
+the parts of the Google Sheets and Google Drive APIs that DAPT uses.  They can simulate the
+latency of each request and the per-minute request quota, raising the same ``429`` errors that
+Google returns when the quota is used up.
+
+The :ref:`google-sheets` class accepts a ``client`` and the :ref:`google-drive` class accepts a
+``service``, so the fakes can be passed to them directly.  There is also a fake Box client that
+can be set as the ``client`` of a connected :ref:`box` object.
+
+    >>> client = dapt.testing.Fake_sheets_client(latency=0.05, quota=60)
+    >>> client.create('sheet-id', [['id', 'status', 'a'], ['t1', '', '1'], ['t2', '', '2']])
+    >>> db = dapt.db.Sheet(spreedsheet_id='sheet-id', client=client)
+    >>> db.connect()
+    >>> dapt.Param(db).next_parameters()
+    {'id': 't1', 'status': 'in progress', 'a': 1}
+    >>> client.calls
+    6
+
+.. _testing-load-test:
+
+Load testing
+------------
+
+The ``load_test()`` function runs many workers against one fake spreadsheet.  Each worker uses
+its own ``Param`` object to claim parameter sets and mark them successful, just like a real
+worker would.  Requests that are rate limited are retried after a short wait.  The results
+show how many parameter sets were claimed per second, how many API requests were needed per
+parameter set, how many requests were rate limited, and how many parameter sets were claimed by
+more than one worker.  The harness can also be ran from the command line.
+
+::
+
+    python -m dapt.testing --workers 100 --tasks 1000 --latency 0.05 --quota 300
+
+"""
+
+import argparse
+import collections
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+
+from boxsdk.exception import BoxAPIException
+from boxsdk.object.file import File
+from boxsdk.object.folder import Folder
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread import utils
+from googleapiclient.errors import HttpError
+import httplib2
+import requests
+import urllib3
+
+_log = logging.getLogger(__name__)
+
+class Quota:
+    """
+    A sliding window request quota.  Google Sheets allows a fixed number of requests per minute
+    and returns a ``429`` error when the quota has been used up.
+
+    Args:
+        requests (int): the number of requests allowed in each period.  ``None`` means there is
+         no limit.
+        period (float): the length of the period in seconds.  60 by default.
+    """
+
+    def __init__(self, requests=None, period=60):
+        self.requests = requests
+        self.period = period
+        self._times = collections.deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Use one request from the quota.
+
+        Returns:
+            True if the request is allowed and False if the quota has been used up.
+        """
+
+        if self.requests is None:
+            return True
+
+        now = time.time()
+
+        with self._lock:
+            while self._times and self._times[0] <= now - self.period:
+                self._times.popleft()
+
+            if len(self._times) >= self.requests:
+                return False
+
+            self._times.append(now)
+            return True
+
+class _Fake_response:
+    """
+    The parts of a ``requests.Response`` used by ``gspread.exceptions.APIError``.
+    """
+
+    def __init__(self, code, message, status):
+        self.status_code = code
+        self.text = json.dumps({'error':{'code':code, 'message':message, 'status':status}})
+
+    def json(self):
+        return json.loads(self.text)
+
+class _Fake_service:
+    """
+    Shared behavior of the fake APIs: count requests, add latency, and enforce the quota.
+
+    Args:
+        latency (float): seconds each request takes.  0 by default.
+        quota (int): the number of requests allowed per ``period``.  No limit by default.
+        period (float): the length of the quota period in seconds.  60 by default.
+    """
+
+    def __init__(self, latency=0, quota=None, period=60):
+        self.latency = latency
+        self.quota = Quota(quota, period)
+        self.calls = 0
+        self.rate_limited = 0
+        self.call_counts = collections.Counter()
+        self._count_lock = threading.Lock()
+
+    def _request(self, name):
+        """
+        Simulate a request to the API.
+
+        Args:
+            name (str): the name of the request, used for counting
+
+        Raises:
+            An error with the status code 429 if the quota has been used up.
+        """
+
+        with self._count_lock:
+            self.calls += 1
+            self.call_counts[name] += 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if not self.quota.acquire():
+            with self._count_lock:
+                self.rate_limited += 1
+            raise self._rate_limit_error()
+
+    def _rate_limit_error(self):
+        return APIError(_Fake_response(429, 'Quota exceeded for quota metric requests per ' \
+                                       'minute.', 'RESOURCE_EXHAUSTED'))
+
+    def reset_counts(self):
+        """
+        Reset the request counters.
+        """
+
+        with self._count_lock:
+            self.calls = 0
+            self.rate_limited = 0
+            self.call_counts = collections.Counter()
+
+class Fake_sheets_client(_Fake_service):
+    """
+    An in-memory replacement for a ``gspread.Client``.  Spreadsheets are created with
+    ``create()`` and opened with ``open_by_key()``.
+
+    Args:
+        latency (float): seconds each request takes.  0 by default.
+        quota (int): the number of requests allowed per ``period``.  No limit by default.
+        period (float): the length of the quota period in seconds.  60 by default.
+    """
+
+    def __init__(self, latency=0, quota=None, period=60):
+        super().__init__(latency, quota, period)
+        self.spreadsheets = {}
+
+    def create(self, key, values=None, title='Sheet1'):
+        """
+        Create a spreadsheet with one worksheet.  This does not count as a request.
+
+        Args:
+            key (str): the spreadsheet id
+            values (list): a list of rows, each a list of cell values.  The first row is the
+             header.
+            title (str): the title of the first worksheet
+
+        Returns:
+            The new ``Fake_spreadsheet``
+        """
+
+        spreadsheet = Fake_spreadsheet(self, key)
+        spreadsheet.add_worksheet(title, values)
+        self.spreadsheets[key] = spreadsheet
+
+        return spreadsheet
+
+    def open_by_key(self, key):
+        self._request('open_by_key')
+
+        if key not in self.spreadsheets:
+            raise APIError(_Fake_response(404, 'Requested entity was not found.', 'NOT_FOUND'))
+
+        return self.spreadsheets[key]
+
+class Fake_spreadsheet:
+    """
+    An in-memory replacement for a ``gspread.Spreadsheet``.
+
+    Args:
+        client (Fake_sheets_client): the client that owns the spreadsheet
+        key (str): the spreadsheet id
+    """
+
+    def __init__(self, client, key):
+        self.client = client
+        self.id = key
+        self.worksheets = []
+
+    def add_worksheet(self, title, values=None):
+        """
+        Add a worksheet to the spreadsheet.  This does not count as a request.
+
+        Args:
+            title (str): the title of the worksheet
+            values (list): a list of rows, each a list of cell values
+
+        Returns:
+            The new ``Fake_worksheet``
+        """
+
+        worksheet = Fake_worksheet(self, title, values)
+        self.worksheets.append(worksheet)
+
+        return worksheet
+
+    @property
+    def sheet1(self):
+        self.client._request('sheet1')
+        return self.worksheets[0]
+
+    def worksheet(self, title):
+        self.client._request('worksheet')
+
+        for worksheet in self.worksheets:
+            if worksheet.title == title:
+                return worksheet
+
+        raise WorksheetNotFound(title)
+
+    def get_worksheet(self, index):
+        self.client._request('get_worksheet')
+
+        if 0 <= index < len(self.worksheets):
+            return self.worksheets[index]
+        return None
+
+    def _worksheet_range(self, range_label):
+        """
+        Split a range label such as ``Sheet1!A2:G2`` into the worksheet and the start and end
+        cells.
+        """
+
+        title, cells = range_label.split('!')
+        start, _, end = cells.partition(':')
+
+        for worksheet in self.worksheets:
+            if worksheet.title == title.strip("'"):
+                return worksheet, utils.a1_to_rowcol(start), utils.a1_to_rowcol(end or start)
+
+        raise WorksheetNotFound(title)
+
+    def values_update(self, range_label, params=None, body=None):
+        self.client._request('values_update')
+
+        worksheet, start, end = self._worksheet_range(range_label)
+        worksheet._write(start[0], start[1], body['values'])
+
+        return {'updatedRange':range_label, 'updatedRows':len(body['values'])}
+
+    def values_append(self, range_label, params=None, body=None):
+        self.client._request('values_append')
+
+        worksheet, start, end = self._worksheet_range(range_label)
+        with worksheet._lock:
+            row = len(worksheet._values) + 1
+            worksheet._write(row, start[1], body['values'])
+
+        return {'updates':{'updatedRows':len(body['values'])}}
+
+class Fake_worksheet:
+    """
+    An in-memory replacement for a ``gspread.Worksheet``.  Values are stored as strings and
+    numbers are converted when they are read, similar to Google Sheets.
+
+    Args:
+        spreadsheet (Fake_spreadsheet): the spreadsheet that owns the worksheet
+        title (str): the title of the worksheet
+        values (list): a list of rows, each a list of cell values
+    """
+
+    def __init__(self, spreadsheet, title, values=None):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self._values = [[str(v) for v in row] for row in (values or [])]
+        self._lock = threading.RLock()
+
+    def _request(self, name):
+        self.spreadsheet.client._request(name)
+
+    def _write(self, row, col, values):
+        """
+        Write a block of values with the top left cell at ``row`` and ``col`` (starting from 1).
+        """
+
+        with self._lock:
+            for i, new_row in enumerate(values):
+                while len(self._values) < row + i:
+                    self._values.append([])
+                current = self._values[row + i - 1]
+                while len(current) < col - 1 + len(new_row):
+                    current.append('')
+                for j, value in enumerate(new_row):
+                    current[col - 1 + j] = '' if value is None else str(value)
+
+    def get_all_records(self):
+        self._request('get_all_records')
+
+        with self._lock:
+            if not self._values:
+                return []
+            header = self._values[0]
+            rows = [list(r) for r in self._values[1:]]
+
+        records = []
+        for row in rows:
+            row = row + [''] * (len(header) - len(row))
+            records.append({k:utils.numericise(v) for k, v in zip(header, row)})
+
+        return records
+
+    def get_all_values(self):
+        self._request('get_all_values')
+
+        with self._lock:
+            return [list(r) for r in self._values]
+
+    def row_values(self, row):
+        self._request('row_values')
+
+        with self._lock:
+            if row > len(self._values):
+                return []
+            values = list(self._values[row - 1])
+
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def col_values(self, col):
+        self._request('col_values')
+
+        with self._lock:
+            values = [r[col - 1] if len(r) >= col else '' for r in self._values]
+
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def update_cell(self, row, col, value):
+        self._request('update_cell')
+
+        self._write(row, col, [[value]])
+
+    def get(self, range_name):
+        self._request('get')
+
+        row, col = utils.a1_to_rowcol(range_name)
+        with self._lock:
+            if row > len(self._values) or col > len(self._values[row - 1]):
+                return [[]]
+            return [[self._values[row - 1][col - 1]]]
+
+class Fake_drive_service(_Fake_service):
+    """
+    An in-memory replacement for the Google Drive v3 service returned by
+    ``googleapiclient.discovery.build('drive', 'v3')``.  Only the requests used by
+    :ref:`google-drive` are supported.  Files are created with ``create()`` or by uploading
+    them.
+
+    Args:
+        latency (float): seconds each request takes.  0 by default.
+        quota (int): the number of requests allowed per ``period``.  No limit by default.
+        period (float): the length of the quota period in seconds.  60 by default.
+    """
+
+    FOLDER = 'application/vnd.google-apps.folder'
+
+    def __init__(self, latency=0, quota=None, period=60):
+        super().__init__(latency, quota, period)
+        self.items = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _rate_limit_error(self):
+        return HttpError(httplib2.Response({'status':429}), b'Rate Limit Exceeded')
+
+    def create(self, name, parent=None, content=None, mime_type=None):
+        """
+        Add a file or folder.  Folders are made when ``content`` is None and ``mime_type`` is
+        not given.  This does not count as a request.
+
+        Args:
+            name (str): the name of the item
+            parent (str): the id of the folder the item is in
+            content (bytes): the contents of a file
+            mime_type (str): the MIME type of the item
+
+        Returns:
+            The id of the new item
+        """
+
+        with self._lock:
+            file_id = 'fake-%d' % next(self._ids)
+
+        if mime_type is None:
+            mime_type = self.FOLDER if content is None else 'application/octet-stream'
+
+        self.items[file_id] = {'id':file_id, 'name':name, 'mimeType':mime_type,
+                               'parents':[parent] if parent else [], 'content':content}
+
+        return file_id
+
+    def files(self):
+        return _Fake_files(self)
+
+class _Fake_request:
+    """
+    A request that runs ``function`` when it is executed.
+    """
+
+    def __init__(self, service, name, function):
+        self.service = service
+        self.name = name
+        self.function = function
+
+    def execute(self):
+        self.service._request(self.name)
+        return self.function()
+
+class _Fake_upload_request(_Fake_request):
+    """
+    A resumable upload that finishes in one chunk.
+    """
+
+    def __init__(self, service, media_body, function):
+        super().__init__(service, 'create', function)
+        self.media_body = media_body
+
+    def next_chunk(self):
+        return None, self.execute()
+
+class _Fake_http:
+    """
+    The ``http`` object used by ``MediaIoBaseDownload`` to download chunks of a file.
+    """
+
+    def __init__(self, service, file_id):
+        self.service = service
+        self.file_id = file_id
+
+    def request(self, uri, method='GET', headers=None, **kwargs):
+        self.service._request('get_media')
+
+        content = self.service.items[self.file_id]['content'] or b''
+        start, end = 0, len(content) - 1
+        if headers and 'range' in headers:
+            start, end = [int(x) for x in headers['range'].split('=')[1].split('-')]
+        end = min(end, len(content) - 1)
+
+        chunk = content[start:end + 1]
+        response = httplib2.Response({'status':206, 'content-range':'bytes %d-%d/%d' %
+                                      (start, end, len(content))})
+
+        return response, chunk
+
+class _Fake_media_request:
+    """
+    The request returned by ``files().get_media()``.
+    """
+
+    def __init__(self, service, file_id):
+        self.http = _Fake_http(service, file_id)
+        self.uri = 'fake://drive/%s' % file_id
+        self.headers = {}
+
+class _Fake_files:
+    """
+    The ``files()`` resource of the fake Drive service.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    def _item(self, file_id):
+        if file_id not in self.service.items:
+            raise HttpError(httplib2.Response({'status':404}), b'File not found')
+        return self.service.items[file_id]
+
+    def _metadata(self, item, fields=None):
+        metadata = {k:v for k, v in item.items() if k != 'content'}
+        if item['content'] is not None:
+            metadata['size'] = str(len(item['content']))
+        return metadata
+
+    def get(self, fileId, fields=None):
+        return _Fake_request(self.service, 'get', lambda: self._metadata(self._item(fileId)))
+
+    def get_media(self, fileId):
+        self._item(fileId)
+        return _Fake_media_request(self.service, fileId)
+
+    def list(self, q='', pageSize=100, fields=None, pageToken=None):
+        def run():
+            parent = q.split("'")[1] if "'" in q else None
+            items = [self._metadata(i) for i in self.service.items.values()
+                     if parent is None or parent in i['parents']]
+            start = int(pageToken or 0)
+            response = {'files':items[start:start + pageSize]}
+            if start + pageSize < len(items):
+                response['nextPageToken'] = str(start + pageSize)
+            return response
+
+        return _Fake_request(self.service, 'list', run)
+
+    def create(self, body=None, media_body=None, fields=None):
+        body = body or {}
+        parent = body.get('parents', [None])[0]
+
+        def run():
+            content = None
+            if media_body is not None:
+                content = media_body.getbytes(0, media_body.size())
+            file_id = self.service.create(body['name'], parent, content, body.get('mimeType'))
+            return {'id':file_id}
+
+        if media_body is not None:
+            return _Fake_upload_request(self.service, media_body, run)
+        return _Fake_request(self.service, 'create', run)
+
+    def update(self, fileId, body=None, fields=None):
+        def run():
+            item = self._item(fileId)
+            item.update(body or {})
+            return {k:item[k] for k in (body or {})}
+
+        return _Fake_request(self.service, 'update', run)
+
+    def delete(self, fileId):
+        def run():
+            self._item(fileId)
+            removed = [fileId]
+            # Remove the contents of folders too
+            while removed:
+                parent = removed.pop()
+                self.service.items.pop(parent, None)
+                removed += [i['id'] for i in list(self.service.items.values())
+                            if parent in i['parents']]
+            return ''
+
+        return _Fake_request(self.service, 'delete', run)
+
+class Fake_box_client(_Fake_service):
+    """
+    An in-memory replacement for the ``boxsdk.Client`` used by :ref:`box`.  Only the requests
+    used by the ``Box`` class are supported.  Items are kept in ``items`` and the root folder
+    has the id ``0``.  Upload sessions split files into ``part_size`` byte parts.
+
+        >>> box.client = dapt.testing.Fake_box_client()
+        >>> box.upload_file('0', 'runs/test.txt')
+
+    Args:
+        latency (float): seconds each request takes.  0 by default.
+        quota (int): the number of requests allowed per ``period``.  No limit by default.
+        period (float): the length of the quota period in seconds.  60 by default.
+        part_size (int): the part size of upload sessions.  8 MB by default.
+    """
+
+    def __init__(self, latency=0, quota=None, period=60, part_size=8*1024*1024):
+        super().__init__(latency, quota, period)
+        self.part_size = part_size
+        self.items = {'0':{'id':'0', 'type':'folder', 'name':'All Files', 'parent':None,
+                           'content':None}}
+        self.sessions = {}
+        #: Offsets of parts that raise an error the next time they are uploaded
+        self.fail_parts = set()
+        #: The number of downloads that drop the connection after sending half of the file
+        self.interrupt_downloads = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _rate_limit_error(self):
+        return BoxAPIException(429, code='rate_limit_exceeded', message='Request rate limit ' \
+                               'exceeded')
+
+    def create(self, name, parent='0', content=None):
+        """
+        Add a file, or a folder if ``content`` is None.  This does not count as a request and
+        doesn't check for items with the same name, like another program changing Box.
+
+        Args:
+            name (str): the name of the item
+            parent (str): the id of the folder the item is in
+            content (bytes): the contents of a file
+
+        Returns:
+            The id of the new item
+        """
+
+        with self._lock:
+            item_id = str(next(self._ids))
+            self.items[item_id] = {'id':item_id, 'name':name, 'parent':parent,
+                                   'type':'folder' if content is None else 'file',
+                                   'content':content}
+
+        return item_id
+
+    def folder(self, folder_id):
+        return _Fake_box_folder(self, folder_id)
+
+    def file(self, file_id):
+        return _Fake_box_file(self, file_id)
+
+    def upload_session(self, session_id):
+        self._request('upload_session')
+        if session_id not in self.sessions:
+            raise BoxAPIException(404, code='not_found', message='Upload session not found')
+        return self.sessions[session_id]
+
+    def _item(self, item_id, item_type):
+        item = self.items.get(item_id)
+        if item is None or item['type'] != item_type:
+            raise BoxAPIException(404, code='not_found', message='Not Found')
+        return item
+
+    def _object(self, item):
+        info = {'id':item['id'], 'type':item['type'], 'name':item['name']}
+        if item['type'] == 'file':
+            info['size'] = len(item['content'])
+            return File(None, item['id'], info)
+        return Folder(None, item['id'], info)
+
+    def _add(self, parent, name, item_type, content=None):
+        """
+        Add an item, raising a 409 error like Box if the name is in use.
+        """
+
+        with self._lock:
+            for item in self.items.values():
+                if item['parent'] == parent and item['name'] == name:
+                    raise BoxAPIException(409, code='item_name_in_use',
+                                          message='Item with the same name already exists',
+                                          context_info={'conflicts':{'id':item['id'],
+                                                                     'type':item['type']}})
+            item_id = str(next(self._ids))
+            self.items[item_id] = {'id':item_id, 'name':name, 'parent':parent,
+                                   'type':item_type, 'content':content}
+
+        return self._object(self.items[item_id])
+
+class _Fake_box_item:
+    """
+    The requests shared by Box files and folders.
+    """
+
+    TYPE = None
+
+    def __init__(self, client, item_id):
+        self.client = client
+        self.object_id = item_id
+
+    def get(self):
+        self.client._request('get')
+        return self.client._object(self.client._item(self.object_id, self.TYPE))
+
+    def delete(self):
+        self.client._request('delete')
+        self.client._item(self.object_id, self.TYPE)
+
+        with self.client._lock:
+            removed = [self.object_id]
+            while removed:
+                parent = removed.pop()
+                self.client.items.pop(parent, None)
+                removed += [i['id'] for i in self.client.items.values()
+                            if i['parent'] == parent]
+
+        return True
+
+    def rename(self, name):
+        self.client._request('rename')
+        item = self.client._item(self.object_id, self.TYPE)
+        item['name'] = name
+        return self.client._object(item)
+
+class _Fake_box_folder(_Fake_box_item):
+    TYPE = 'folder'
+
+    def get_items(self, fields=None):
+        self.client._request('get_items')
+        self.client._item(self.object_id, 'folder')
+        return [self.client._object(i) for i in list(self.client.items.values())
+                if i['parent'] == self.object_id]
+
+    def upload(self, file_path, file_name):
+        self.client._request('upload')
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        return self.client._add(self.object_id, file_name, 'file', content)
+
+    def create_subfolder(self, name):
+        self.client._request('create_subfolder')
+        return self.client._add(self.object_id, name, 'folder')
+
+    def create_upload_session(self, file_size, file_name):
+        self.client._request('create_upload_session')
+        with self.client._lock:
+            session_id = 'session-%d' % next(self.client._ids)
+        session = _Fake_box_upload_session(self.client, session_id, self.object_id, file_name,
+                                           file_size)
+        self.client.sessions[session_id] = session
+        return session
+
+class _Fake_box_file(_Fake_box_item):
+    TYPE = 'file'
+
+    def download_to(self, writeable_stream, byte_range=None):
+        self.client._request('download_to')
+        content = self.client._item(self.object_id, 'file')['content']
+        if byte_range is not None:
+            content = content[byte_range[0]:byte_range[1] + 1]
+        with self.client._lock:
+            interrupt = self.client.interrupt_downloads > 0
+            if interrupt:
+                self.client.interrupt_downloads -= 1
+        if interrupt:
+            writeable_stream.write(content[:len(content) // 2])
+            raise requests.exceptions.ChunkedEncodingError(
+                urllib3.exceptions.ProtocolError('Connection broken'))
+        writeable_stream.write(content)
+
+class _Fake_box_upload_session:
+    """
+    A chunked upload session.  ``uploaded`` lists the offset of every part that was sent.
+    """
+
+    def __init__(self, client, session_id, parent, name, file_size):
+        self.client = client
+        self.object_id = session_id
+        self.parent = parent
+        self.name = name
+        self.file_size = file_size
+        self.part_size = client.part_size
+        self.parts = {}
+        self.uploaded = []
+
+    def upload_part_bytes(self, part_bytes, offset, total_size):
+        self.client._request('upload_part_bytes')
+        with self.client._lock:
+            if offset in self.client.fail_parts:
+                self.client.fail_parts.discard(offset)
+                raise BoxAPIException(400, code='bad_request', message='Part failed')
+            self.uploaded.append(offset)
+            part = {'part_id':'%08x' % offset, 'offset':offset, 'size':len(part_bytes)}
+            self.parts[offset] = (part, part_bytes)
+        return part
+
+    def get_parts(self):
+        self.client._request('get_parts')
+        return [part for part, _ in self.parts.values()]
+
+    def commit(self, content_sha1, parts=None):
+        self.client._request('commit')
+        content = b''.join(self.parts[p['offset']][1] for p in parts)
+        if len(content) != self.file_size or hashlib.sha1(content).digest() != content_sha1:
+            raise BoxAPIException(412, code='precondition_failed', message='The file digest ' \
+                                  'does not match')
+        del self.client.sessions[self.object_id]
+        return self.client._add(self.parent, self.name, 'file', content)
+
+def load_test(workers=10, tasks=100, latency=0, quota=None, period=60, task_time=0,
+              backoff=0.1, fields=None):
+    """
+    Run many workers against one fake spreadsheet and measure how quickly they finish the
+    parameter sets.  Each worker claims parameter sets with ``Param.next_parameters()``, waits
+    ``task_time`` seconds, and then marks them as successful.
+
+    Args:
+        workers (int): the number of workers running at the same time
+        tasks (int): the number of parameter sets in the spreadsheet
+        latency (float): seconds each API request takes
+        quota (int): the number of API requests allowed per ``period``.  No limit by default.
+        period (float): the length of the quota period in seconds
+        task_time (float): seconds each parameter set takes to run
+        backoff (float): seconds a worker waits before retrying a rate limited request
+        fields (list): extra fields in the table.  ``start-time``, ``end-time`` and
+         ``performed-by`` by default.
+
+    Returns:
+        A ``dict`` with the number of ``claims``, ``completed`` parameter sets, ``seconds``,
+        ``claims-per-second``, ``api-calls``, ``api-calls-per-task``, ``rate-limited`` requests,
+        ``duplicate-claims``, and ``call-counts`` for each request type.
+    """
+
+    # Imported here so the fakes can be used without importing the rest of DAPT
+    from .db.sheets import Sheet
+    from .param import Param
+
+    if fields is None:
+        fields = ['start-time', 'end-time', 'performed-by']
+
+    header = ['id', 'status'] + fields + ['a']
+    rows = [header] + [['t%d' % i, ''] + [''] * len(fields) + [str(i)] for i in range(tasks)]
+
+    client = Fake_sheets_client(latency=0, quota=None)
+    client.create('load-test', rows)
+    client.latency = latency
+    client.quota = Quota(quota, period)
+
+    claims = collections.Counter()
+    claims_lock = threading.Lock()
+
+    def retry(function, *args):
+        while True:
+            try:
+                return function(*args)
+            except APIError as e:
+                if e.code != 429:
+                    raise
+                time.sleep(backoff)
+
+    def worker():
+        db = Sheet(spreedsheet_id='load-test', client=client)
+        retry(db.connect)
+        param = Param(db)
+
+        while True:
+            parameters = retry(param.next_parameters)
+            if parameters is None:
+                return
+
+            with claims_lock:
+                claims[parameters['id']] += 1
+
+            if task_time:
+                time.sleep(task_time)
+
+            retry(param.successful, parameters['id'])
+
+    start = time.time()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.time() - start
+
+    completed = len(claims)
+    total_claims = sum(claims.values())
+
+    results = {'workers':workers, 'tasks':tasks, 'claims':total_claims, 'completed':completed,
+               'seconds':seconds,
+               'claims-per-second':total_claims / seconds if seconds > 0 else 0.0,
+               'api-calls':client.calls,
+               'api-calls-per-task':client.calls / completed if completed else 0.0,
+               'rate-limited':client.rate_limited,
+               'duplicate-claims':total_claims - completed,
+               'call-counts':dict(client.call_counts)}
+
+    _log.info('Load test finished: %s' % results)
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test DAPT against a fake Google Sheet.')
+    parser.add_argument('--workers', type=int, default=10, help='number of workers')
+    parser.add_argument('--tasks', type=int, default=100, help='number of parameter sets')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds each API request takes')
+    parser.add_argument('--quota', type=int, default=None,
+                        help='API requests allowed per period')
+    parser.add_argument('--period', type=float, default=60.0,
+                        help='length of the quota period in seconds')
+    parser.add_argument('--task-time', type=float, default=0.0,
+                        help='seconds each parameter set takes to run')
+    args = parser.parse_args()
+
+    results = load_test(workers=args.workers, tasks=args.tasks, latency=args.latency,
+                        quota=args.quota, period=args.period, task_time=args.task_time)
+    print(json.dumps(results, indent=4))
+
+if __name__ == '__main__':
+    main()
@@ -9,21 +9,194 @@ A collection of tools that make DAPT easy to use, especially with
 methods are helpful with anyone using DAPT.  The rest of the methods are used specifically
 for PhysiCell pipelines.
 
+.. _tools-settings-formats:
+
+Settings file formats
+---------------------
+
+``create_settings_file()`` saves a parameter set so it can be kept with the results.  The
+``format`` chooses how it is written, and ``read_settings_file()`` reads every format back into
+``dict`` objects.
+
++---------------------------+----------------------------------------------------------------+
+| Format                    | Description                                                    |
++===========================+================================================================+
+| ``txt``                   | A ``key:value`` line for each parameter (default).             |
++---------------------------+----------------------------------------------------------------+
+| ``json``                  | A JSON object.                                                 |
++---------------------------+----------------------------------------------------------------+
+| ``msgpack``               | A MessagePack map.  Requires ``msgpack``.                      |
++---------------------------+----------------------------------------------------------------+
+| ``binary``                | A record starting with ``DAPT`` and the number of parameters   |
+|                           | (little-endian ``uint32``).  Each parameter is the length of   |
+|                           | the key (``uint16``) and value (``uint32``) followed by the    |
+|                           | UTF-8 key and value.  Values are saved as strings.             |
++---------------------------+----------------------------------------------------------------+
+
+Writing a small file for every parameter set puts load on the metadata servers of shared file
+systems.  Given a ``manifest`` path, the parameter sets are instead appended to one file, e.g.
+one for each computer.  ``txt`` and ``json`` manifests have a line of JSON for each parameter
+set, and ``msgpack`` and ``binary`` manifests are the records one after another.  Each record is
+added with a single write to a file opened in append mode.
+
+    >>> dapt.tools.create_settings_file(parameters, format='binary', manifest='node1.bin')
+    >>> list(dapt.tools.read_settings_file('node1.bin'))
+    [{'id': 't1', 'a': '2'}]
+
+.. _tools-archive:
+
+Archives
+--------
+
+``create_zip()`` chooses the files to archive using an :class:`Archive_spec`, which can be set
+with the ``archive`` field of the :ref:`config`.  Patterns are globs where ``*`` matches part of
+a file or folder name and ``**`` matches any number of folders.  Patterns without a ``/`` match
+the name of the file in any folder (e.g. ``*.png``), and other patterns match the path from the
+current directory (e.g. ``output/*.xml``).  Start a pattern with ``./`` to only match files in
+the current directory (e.g. ``./Makefile``).  ``{id}`` in a pattern is replaced by the parameter
+id.  The files are found with one walk of the directory tree that skips folders that can't contain a
+match.
+
++---------------------------+----------------------------------------------------------------+
+| Fields                    | Description                                                    |
++===========================+================================================================+
+| ``include`` (list)        | Patterns of the files to archive.                              |
++---------------------------+----------------------------------------------------------------+
+| ``exclude`` (list)        | Patterns of files and folders that are not archived.           |
++---------------------------+----------------------------------------------------------------+
+| ``compression`` (dict)    | The compression method of files matching each pattern.  The    |
+|                           | first matching pattern is used.                                |
++---------------------------+----------------------------------------------------------------+
+| ``method`` (str)          | The compression method of other files.  ``deflate`` by default.|
++---------------------------+----------------------------------------------------------------+
+| ``level`` (int)           | The compression level.                                         |
++---------------------------+----------------------------------------------------------------+
+| ``max-file-size`` (int)   | Files larger than this many bytes are not archived.            |
++---------------------------+----------------------------------------------------------------+
+| ``max-size`` (int)        | Stop adding files when the next file would make the archive    |
+|                           | larger than this many bytes (before compression).  Files are   |
+|                           | added in order of their paths.                                 |
++---------------------------+----------------------------------------------------------------+
+
+.. code-block:: JSON
+
+    {
+        "archive" : {
+            "include" : ["{id}_dapt_param_settings.txt", "output/**", "config/*.xml"],
+            "exclude" : ["*.png", "output/snapshots"],
+            "compression" : {"*.mat" : "store", "*.svg" : "lzma"},
+            "max-file-size" : 100000000
+        }
+    }
+
+.. _tools-cleanup:
+
+Cleanup
+-------
+
+``data_cleanup()`` removes the files PhysiCell makes between runs.  By default, it removes
+``.mat``, ``.xml``, ``.svg``, ``.txt``, ``.pov`` and ``.png`` files from the current directory and
+the same files, except ``.pov``, from ``output/``.  The folders and the endings of the files
+removed from each can be changed with the ``cleanup`` field of the :ref:`config`.  Setting
+``remove-zip`` or ``remove-movie`` to ``True`` also removes ``.zip`` or ``.mp4`` files from every
+folder.  With many output files, removing them with several threads (``workers``) is faster,
+especially on network file systems.
+
+.. code-block:: JSON
+
+    {
+        "remove-zip" : true,
+        "cleanup" : {
+            "folders" : {
+                "." : [".mat", ".xml", ".svg", ".txt", ".pov", ".png"],
+                "output" : [".mat", ".xml", ".svg", ".txt", ".png"],
+                "logs" : [".log"]
+            },
+            "workers" : 8
+        }
+    }
+
+.. _tools-post-processing:
+
+Post-processing
+---------------
+
+``convert_frames()`` converts PhysiCell's SVG snapshots to PNGs with one process for each frame,
+running as many at once as there are CPUs, and skips frames that were already converted.
+``create_movie()`` makes a movie from the frames with ``ffmpeg`` in its own temporary directory,
+so the current directory is never changed.  ``post_processing_stage()`` makes a
+:ref:`pipeline` stage that does both in the parameter set's directory.  It runs in the
+background, so it overlaps with the next simulation.
+
+    >>> stages = [dapt.pipeline.Stage('sim', run_simulation),
+    ...           dapt.tools.post_processing_stage(requires=['sim'], framerate=24)]
+
 """
 
 import argparse
+import collections
+import concurrent.futures
 import csv
 import datetime
+import fnmatch
+import io
+import json
 import logging
 import os
 import platform
+import shutil
+import struct
+import subprocess
 import sys
+import tempfile
+import threading
 import time 
 import zipfile
 import xml.etree.ElementTree as ET
 
+from . import pipeline
 from .db.delimited_file import Delimited_file
 
+_log = logging.getLogger(__name__)
+
+# Parsed XML templates used by ``create_XML()``, keyed by path
+_templates = {}
+_templates_lock = threading.Lock()
+
+#: The compression methods that can be used by ``create_zip()``
+COMPRESSION_METHODS = {'store':zipfile.ZIP_STORED, 'deflate':zipfile.ZIP_DEFLATED,
+                       'bzip2':zipfile.ZIP_BZIP2, 'lzma':zipfile.ZIP_LZMA}
+if hasattr(zipfile, 'ZIP_ZSTANDARD'):
+    COMPRESSION_METHODS['zstd'] = zipfile.ZIP_ZSTANDARD
+
+# Compressed members smaller than this are kept in memory by ``write_zip()``
+ZIP_SPOOL_SIZE = 16 * 1024 * 1024
+
+#: The file endings used by ``create_settings_file()`` for each format
+SETTINGS_FORMATS = {'txt':'.txt', 'json':'.json', 'msgpack':'.msgpack', 'binary':'.bin'}
+
+# The start of each ``binary`` settings record
+_SETTINGS_MAGIC = b'DAPT'
+
+#: The command ``convert_frames()`` runs for each frame
+FRAME_COMMAND = ['mogrify', '-format', '{format}', '{source}']
+
+#: The command ``create_movie()`` runs
+MOVIE_COMMAND = ['ffmpeg', '-y', '-loglevel', 'error', '-framerate', '{framerate}', '-i',
+                 '{input}', '-pix_fmt', 'yuv420p', '-vf',
+                 'pad=width=ceil(iw/2)*2:height=ceil(ih/2)*2', '{output}']
+
+#: The endings of the files ``data_cleanup()`` removes from each folder by default
+DEFAULT_CLEANUP = {'.':('.mat', '.xml', '.svg', '.txt', '.pov', '.png'),
+                   'output':('.mat', '.xml', '.svg', '.txt', '.png')}
+
+#: The files archived by ``create_zip()`` when no ``archive`` spec is given
+DEFAULT_ARCHIVE = {'include':['./{id}_dapt_param_settings.*', 'output/**',
+                              'config/PhysiCell_settings.xml', './main*.cpp', './Makefile',
+                              'custom_modules/*'],
+                   'exclude':['*.png'], 'compression':{}, 'method':'deflate', 'level':None,
+                   'max-size':None, 'max-file-size':None}
+
 # Start General tools
 
 def sample_db(file_name='sample_db.csv', delimiter=','):
@@ -69,30 +242,337 @@ def sample_db(file_name='sample_db.csv', delimiter=','):
     
     return Delimited_file(file_name, delimiter=delimiter)
 
-def create_settings_file(parameters, pid=None):
+def create_settings_file(parameters, pid=None, folder='.', format='txt', manifest=None):
     """
     Creates a file where each line contains a key from the parameters and its associated key,
-    separated by a semicolon.
+    separated by a semicolon.  Other formats can be chosen with ``format`` (see
+    :ref:`tools-settings-formats`).
 
     Args:
         parameters (dict): the paramaters to be saved in the file
         pid (str): the parameter id of the current parameter run.  If you don't give an id then
          the id in ``parameters`` will be used.
+        folder (str): the folder to save the file in.  The current directory by default.
+        format (str): ``txt`` (default), ``json``, ``msgpack`` or ``binary``.
+        manifest (str): the path of a file to append the parameter set to instead of saving
+         it in its own file.  None by default.
+
+    Returns:
+        The path of the file written
     """
 
-    data = ""
+    if format not in SETTINGS_FORMATS:
+        raise ValueError('Unknown settings format "%s".  Use one of: %s' %
+                         (format, ', '.join(SETTINGS_FORMATS)))
 
     if not pid:
         pid = parameters["id"]
 
-    for key in parameters:
-        data += str(key) + ":" + str(parameters[key]) + "\n"
+    if manifest is not None:
+        if format in ('txt', 'json'):
+            data = (json.dumps(parameters, default=str) + '\n').encode()
+        else:
+            data = _encode_settings(parameters, format)
 
-    with open(str(parameters["id"]) + "_dapt_param_settings.txt", 'w') as file:
-        file.writelines(data)
+        # One write per record, so records from other processes are not mixed in
+        with open(manifest, 'ab') as file:
+            file.write(data)
+
+        return manifest
+
+    path = os.path.join(folder, str(pid) + "_dapt_param_settings" + SETTINGS_FORMATS[format])
+
+    with open(path, 'wb') as file:
+        file.write(_encode_settings(parameters, format))
+
+    return path
+
+def read_settings_file(path, format=None):
+    """
+    Read the parameter sets in a file made by ``create_settings_file()``.  Values are read as
+    they were saved, which is as strings for the ``txt`` and ``binary`` formats.
+
+    Args:
+        path (str): the path of the settings file or manifest
+        format (str): the format of the file.  Found from the file ending if None, where
+         ``.jsonl`` is a ``json`` manifest.
+
+    Returns:
+        A generator of the parameter sets as ``dict`` objects
+    """
+
+    if format is None:
+        ending = os.path.splitext(path)[1]
+        formats = {e:f for f, e in SETTINGS_FORMATS.items()}
+        formats['.jsonl'] = 'json'
+        if ending not in formats:
+            raise ValueError('Unknown settings file ending "%s".  Give the format.' % ending)
+        format = formats[ending]
+
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    if format == 'msgpack':
+        yield from _msgpack().Unpacker(io.BytesIO(data), raw=False)
+    elif format == 'binary':
+        offset = 0
+        while offset < len(data):
+            parameters, offset = _decode_binary_settings(data, offset)
+            yield parameters
+    else:
+        text = data.decode()
+        if format == 'txt' and not text.startswith('{'):
+            yield dict(line.split(':', 1) for line in text.splitlines() if line)
+            return
+        decoder = json.JSONDecoder()
+        offset = 0
+        while True:
+            while offset < len(text) and text[offset].isspace():
+                offset += 1
+            if offset == len(text):
+                return
+            parameters, offset = decoder.raw_decode(text, offset)
+            yield parameters
+
+def _encode_settings(parameters, format):
+    """
+    Encode a parameter set in one of the ``SETTINGS_FORMATS``.
+    """
+
+    if format == 'txt':
+        return ''.join('%s:%s\n' % (key, value) for key, value in parameters.items()).encode()
+    if format == 'json':
+        return json.dumps(parameters, default=str).encode()
+    if format == 'msgpack':
+        return _msgpack().packb(dict(parameters), default=str, use_bin_type=True)
+
+    pairs = [(str(key).encode(), str(value).encode()) for key, value in parameters.items()]
+    parts = [_SETTINGS_MAGIC, struct.pack('<I', len(pairs))]
+    for key, value in pairs:
+        parts.append(struct.pack('<HI', len(key), len(value)))
+        parts.append(key)
+        parts.append(value)
+
+    return b''.join(parts)
+
+def _decode_binary_settings(data, offset=0):
+    """
+    Decode the ``binary`` settings record starting at ``offset``.
+
+    Returns:
+        The parameter set and the offset of the next record
+    """
+
+    if data[offset:offset + 4] != _SETTINGS_MAGIC:
+        raise ValueError('The data at byte %d is not a DAPT settings record.' % offset)
+    count, = struct.unpack_from('<I', data, offset + 4)
+    offset += 8
+
+    parameters = {}
+    for _ in range(count):
+        key_length, value_length = struct.unpack_from('<HI', data, offset)
+        offset += 6
+        key = data[offset:offset + key_length].decode()
+        offset += key_length
+        parameters[key] = data[offset:offset + value_length].decode()
+        offset += value_length
+
+    return parameters, offset
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise ImportError('msgpack is required to use the msgpack settings format.  Install it ' \
+                          'with `pip install msgpack`.')
+
+    return msgpack
 
 # Start PhysiCell tools
 
+class XML_template:
+    """
+    A parsed XML settings file that can be rendered with many parameter sets.  The file is
+    parsed once and the path of every element is indexed, so finding the element for a key is
+    a dictionary lookup.  Keys that use other ElementPath syntax (e.g. ``.//`` or ``[@name]``)
+    are found with ``find()`` the first time they are used and then cached.  Rendering copies
+    only the elements that change and their ancestors; the rest of the tree is shared with the
+    template, so the template is never modified and can be used by many threads.
+
+        >>> template = dapt.tools.XML_template('PhysiCell_settings_default.xml')
+        >>> for p in parameter_sets:
+        ...     template.write(p, '%s_settings.xml' % p['id'])
+
+    Args:
+        default_settings (str): the path to the default XML file
+    """
+
+    def __init__(self, default_settings="PhysiCell_settings_default.xml"):
+        self.path = default_settings
+        self.tree = ET.parse(default_settings)
+        self.root = self.tree.getroot()
+
+        # Path -> element, and element -> (parent, index)
+        self._index = {}
+        self._parents = {}
+        self._lock = threading.Lock()
+        self._build_index(self.root, '')
+
+        # The serialized XML of unchanged elements.  Only used without namespaces, because
+        # ElementTree chooses namespace prefixes for the whole document.
+        self._serialized = {}
+        self._plain = all(isinstance(e.tag, str) and '{' not in e.tag for e in self.root.iter())
+
+    def _build_index(self, element, path):
+        for i, child in enumerate(element):
+            child_path = child.tag if not path else path + '/' + child.tag
+            self._parents[child] = (element, i)
+            # find() returns the first match in document order
+            self._index.setdefault(child_path, child)
+            self._build_index(child, child_path)
+
+    def find(self, key):
+        """
+        Get the element for a key.
+
+        Args:
+            key (str): the path to the element, relative to the root element
+
+        Returns:
+            The element, or None if it does not exist
+        """
+
+        # Every plain path of tag names is in the index, so a missing one does not exist
+        path = key[2:] if key.startswith('./') else key
+        if all(part not in ('', '.', '..', '*') and '[' not in part
+               for part in path.split('/')):
+            return self._index.get(path)
+
+        # Other ElementPath keys (e.g. .//cell or a[@name="b"]) are given to find() unchanged
+        with self._lock:
+            if key not in self._index:
+                self._index[key] = self.root.find(key)
+
+        return self._index[key]
+
+    def render(self, parameters, off_limits=[]):
+        """
+        Create the XML tree for a parameter set.  Keys that are not in the XML file or are in
+        ``off_limits`` are ignored.
+
+        Args:
+            parameters (dict): A dictionary of paramaters where the key is the path to the xml
+             variable and the value is the desired value in the XML file.
+            off_limits (list): a list of keys that should not be inserted into the XML file.
+
+        Returns:
+            An ``ElementTree`` with the values of the parameter set
+        """
+
+        copies = {}
+
+        for key in parameters:
+            if key in off_limits:
+                continue
+
+            node = self.find(key)
+
+            if node is not None:
+                self._copy(node, copies).text = str(parameters[key])
+
+        return ET.ElementTree(copies.get(self.root, self.root))
+
+    def write(self, parameters, save_settings="PhysiCell_settings.xml", off_limits=[]):
+        """
+        Create the XML settings file for a parameter set.
+
+        Args:
+            parameters (dict): A dictionary of paramaters where the key is the path to the xml
+             variable and the value is the desired value in the XML file.
+            save_settings (str): the path to the output xml file
+            off_limits (list): a list of keys that should not be inserted into the XML file.
+        """
+
+        tree = self.render(parameters, off_limits)
+
+        if not self._plain:
+            tree.write(save_settings)
+            return
+
+        # Same output as ElementTree.write(), but unchanged elements are only serialized once
+        with open(save_settings, 'w', encoding='us-ascii', errors='xmlcharrefreplace') as f:
+            self._serialize(tree.getroot(), f.write)
+
+    def _serialize(self, element, write):
+        """
+        Write an element.  Elements shared with the template are written from a cache.
+        """
+
+        if element is self.root or element in self._parents:
+            if element not in self._serialized:
+                self._serialized[element] = ET.tostring(element, encoding='unicode')
+            write(self._serialized[element])
+            return
+
+        tail = element.tail
+        shallow = ET.Element(element.tag, element.attrib)
+        shallow.text = element.text
+
+        if len(element) == 0:
+            shallow.tail = tail
+            write(ET.tostring(shallow, encoding='unicode'))
+            return
+
+        start = ET.tostring(shallow, encoding='unicode')
+        end = '</%s>' % element.tag
+        start = start[:-3] + '>' if start.endswith(' />') else start[:-len(end)]
+
+        write(start)
+        for child in element:
+            self._serialize(child, write)
+        write(end)
+
+        if tail:
+            shallow = ET.Element('tail')
+            shallow.text = tail
+            write(ET.tostring(shallow, encoding='unicode')[len('<tail>'):-len('</tail>')])
+
+    def _copy(self, element, copies):
+        """
+        Copy an element and its ancestors.  The copy shares its children with the original.
+        """
+
+        if element in copies:
+            return copies[element]
+
+        copy = ET.Element(element.tag, dict(element.attrib))
+        copy.text = element.text
+        copy.tail = element.tail
+        copy[:] = list(element)
+        copies[element] = copy
+
+        if element in self._parents:
+            parent, i = self._parents[element]
+            self._copy(parent, copies)[i] = copy
+
+        return copy
+
+def _template(default_settings):
+    """
+    Get the cached template for an XML file, parsing it if it is new or has changed.
+    """
+
+    mtime = os.path.getmtime(default_settings)
+    path = os.path.abspath(default_settings)
+
+    with _templates_lock:
+        template, template_mtime = _templates.get(path, (None, None))
+        if template is None or template_mtime != mtime:
+            template = XML_template(default_settings)
+            _templates[path] = (template, mtime)
+
+    return template
+
 def create_XML(parameters, 
                default_settings="PhysiCell_settings_default.xml",
                save_settings="PhysiCell_settings.xml", off_limits=[]):
@@ -104,6 +584,9 @@ def create_XML(parameters,
     key.  If a key in ``parameters`` does not exist in the ``default_settings`` XML file then it
     is ignored.  If a key in ``parameters`` also exists in ``off_limits`` then it is ignored.
 
+    The ``default_settings`` file is only parsed the first time it is used (or when it
+    changes).  See :class:`XML_template`.
+
     Args:
         paramaters (dict): A dictionary of paramaters where the key is the path to the xml
          variable and the value is the desired value in the XML file.
@@ -112,86 +595,609 @@ def create_XML(parameters,
         off_limits (list): a list of keys that should not be inserted into the XML file.
     """
 
-    parameters = dict(parameters)
-    tree = ET.parse(default_settings)
-    root = tree.getroot()
+    _template(default_settings).write(dict(parameters), save_settings, off_limits)
+
+def create_XML_batch(parameter_sets,
+                     default_settings="PhysiCell_settings_default.xml",
+                     save_settings="{id}_PhysiCell_settings.xml", off_limits=[], workers=None,
+                     chunksize=64):
+    """
+    Create the PhysiCell XML settings files for many parameter sets.  The files are written by
+    a pool of processes which each parse ``default_settings`` once (see :class:`XML_template`).
+    The path of each file is made by formatting ``save_settings`` with the parameter set, so
+    ``{id}`` is replaced by the id of the parameter set.  Folders in the path are created if
+    they don't exist.
+
+        >>> dapt.tools.create_XML_batch(db.get_table(), save_settings='inputs/{id}/settings.xml')
+
+    Args:
+        parameter_sets (iterable): the parameter sets (dictionaries) to create files for
+        default_settings (str): the path to the default xml file
+        save_settings (str): the path of each output xml file, formatted with the parameter set
+        off_limits (list): a list of keys that should not be inserted into the XML files.
+        workers (int): the number of processes to use.  The number of CPUs is used by default.
+         If 1, the files are written in this process.
+        chunksize (int): the number of parameter sets given to a process at a time
+
+    Returns:
+        A list of the paths of the files that were written, in the order of ``parameter_sets``
+    """
+
+    jobs = [(dict(p), save_settings.format(**p)) for p in parameter_sets]
+
+    if workers == 1 or len(jobs) <= 1:
+        _template(default_settings)
+        return [_write_XML(default_settings, p, path, off_limits) for p, path in jobs]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_write_XML, [default_settings] * len(jobs),
+                                 [p for p, path in jobs], [path for p, path in jobs],
+                                 [off_limits] * len(jobs), chunksize=chunksize))
 
-    for key in parameters:
-        if key in off_limits:
-            next
+def _write_XML(default_settings, parameters, path, off_limits):
+    """
+    Write one XML settings file using the cached template.  Used by ``create_XML_batch()``.
+    """
 
-        node = root.find(key)
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
 
-        if node != None:
-            node.text = str(parameters[key])
+    _template(default_settings).write(parameters, path, off_limits)
 
-    tree.write(save_settings)
+    return path
 
-def data_cleanup(config=None):
+def data_cleanup(config=None, rules=None, workers=None, folder='.'):
     """
     Emulating make data-cleanup-light: remove .mat, .xml, .svg, .txt, .pov.  You can optionally
     remove zipped files by setting ``remove-zip`` equal to ``True`` or remove ``*.mp4`` by
-    setting ``remove-movie`` to ``True`` in the config file.
+    setting ``remove-movie`` to ``True`` in the config file.  The folders and files removed can
+    be changed with the ``cleanup`` field of the config (see :ref:`tools-cleanup`).  Folders
+    that don't exist are skipped.
 
     Args:
         config (Config): A config object, optionally given.
+        rules (dict): the endings of the files to remove from each folder.  Made from
+         ``config`` if None.
+        workers (int): the number of threads used to remove files.  The ``workers`` value in
+         the ``cleanup`` field, or 1, is used if None.
+        folder (str): the folder the rules are relative to, such as a
+         :ref:`workspace <workspace>`.  The current directory by default.
+
+    Returns:
+        The number of files removed
     """
 
-    for file in os.listdir("."):
-        if (file.endswith(".mat") or file.endswith(".xml") or file.endswith(".svg") or
-            file.endswith(".txt") or file.endswith(".pov") or file.endswith(".png")):
-            os.remove(file)
-        elif config:
-            if ((config.get_value('remove-zip', recursive=True) and file.endswith('.zip')) or
-                (config.get_value('remove-movie', recursive=True) and file.endswith('.mp4'))):
-                os.remove(file)
+    if rules is None:
+        rules = cleanup_rules(config)
+    if workers is None:
+        conf = config.get_value('cleanup') if config else None
+        workers = (conf or {}).get('workers', 1)
 
-    for file in os.listdir("output/"):
-        if (file.endswith(".mat") or file.endswith(".xml") or file.endswith(".svg") or
-            file.endswith(".txt") or file.endswith(".png")):
-            os.remove("output/" + file)
-        elif config:
-            if ((config.get_value('remove-zip', recursive=True) and file.endswith('.zip')) or
-                (config.get_value('remove-movie', recursive=True) and file.endswith('.mp4'))):
-                os.remove("output/" + file)
+    paths = []
+    for name, suffixes in rules.items():
+        try:
+            with os.scandir(os.path.join(folder, name)) as entries:
+                for entry in entries:
+                    if entry.name.endswith(suffixes) and entry.is_file(follow_symlinks=False):
+                        paths.append(entry.path)
+        except FileNotFoundError:
+            _log.debug('Cleanup folder "%s" does not exist' % name)
 
-def create_zip(pid):
+    if workers > 1 and len(paths) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            removed = sum(executor.map(_remove, paths, chunksize=256))
+    else:
+        removed = sum(map(_remove, paths))
+
+    return removed
+
+def cleanup_rules(config=None):
     """
-    Zip all of the important PhysiCell items.
+    Get the endings of the files ``data_cleanup()`` removes from each folder.  The config is
+    only read here, so the files can be checked without looking up values for each one.
+
+    Args:
+        config (Config): A config object, optionally given.
+
+    Returns:
+        A ``dict`` of folder names to tuples of file endings
+    """
+
+    folders = dict(DEFAULT_CLEANUP)
+    extra = ()
+
+    if config:
+        conf = config.get_value('cleanup') or {}
+        if 'folders' in conf:
+            folders = conf['folders']
+        if config.get_value('remove-zip', recursive=True):
+            extra += ('.zip',)
+        if config.get_value('remove-movie', recursive=True):
+            extra += ('.mp4',)
+
+    return {folder:tuple(suffixes) + extra for folder, suffixes in folders.items()}
+
+def _remove(path):
+    """
+    Remove a file, ignoring files that were already removed.
+
+    Returns:
+        1 if the file was removed and 0 otherwise
+    """
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+
+    return 1
+
+class Archive_spec:
+    """
+    Which files ``create_zip()`` archives and how they are compressed.  The settings are read
+    from the ``archive`` field of the config and then from the keyword arguments.  Settings
+    that are not given use ``DEFAULT_ARCHIVE``.  See :ref:`tools-archive`.
+
+    Keyword args:
+        config (Config): a Config object with the ``archive`` settings
+        include (list): patterns of the files to archive
+        exclude (list): patterns of files and folders that are not archived
+        compression (dict): the compression method of files matching each pattern
+        method (str): the compression method of other files
+        level (int): the compression level
+        max_size (int): stop adding files when the next file would make the archive larger
+         than this many bytes
+        max_file_size (int): files larger than this many bytes are not archived
+    """
+
+    def __init__(self, config=None, **kwargs):
+        spec = dict(DEFAULT_ARCHIVE)
+
+        if config is not None and config.has_value('archive'):
+            spec.update(config['archive'])
+        for key, value in kwargs.items():
+            spec[key.replace('_', '-')] = value
+
+        self.include = list(spec['include'])
+        self.exclude = list(spec['exclude'] or [])
+        self.compression = dict(spec['compression'] or {})
+        self.method = spec['method']
+        self.level = spec['level']
+        self.max_size = spec['max-size']
+        self.max_file_size = spec['max-file-size']
+
+        for method in [self.method] + list(self.compression.values()):
+            if method not in COMPRESSION_METHODS:
+                raise ValueError('Unknown compression method "%s".  Use one of: %s' %
+                                 (method, ', '.join(COMPRESSION_METHODS)))
+
+    def members(self, pid=None, root='.'):
+        """
+        Find the files to archive with a single walk of ``root``.
+
+        Args:
+            pid (str): the parameter id used for ``{id}`` in patterns
+            root (str): the directory the patterns are relative to
+
+        Returns:
+            A list of ``(path, arcname, compression)`` tuples for ``write_zip()``
+        """
+
+        include = [_split_pattern(p, pid) for p in self.include]
+        exclude = [_split_pattern(p, pid) for p in self.exclude]
+        compression = [(_split_pattern(p, pid), m) for p, m in self.compression.items()]
+
+        members = []
+        total = 0
+
+        for folder, subfolders, files in os.walk(root):
+            relative = os.path.relpath(folder, root)
+            parts = () if relative == '.' else tuple(relative.split(os.sep))
+
+            # Only walk folders that can contain a match
+            subfolders[:] = sorted(d for d in subfolders
+                                   if not _matches_any(parts + (d,), exclude) and
+                                   any(_could_contain(parts + (d,), p) for p in include))
+
+            for name in sorted(files):
+                path_parts = parts + (name,)
+                if (not _matches_any(path_parts, include) or
+                        _matches_any(path_parts, exclude)):
+                    continue
+
+                path = os.path.join(folder, name)
+                size = os.path.getsize(path)
+                if self.max_file_size is not None and size > self.max_file_size:
+                    _log.info('Not archiving "%s" because it is %d bytes' % (path, size))
+                    continue
+                if self.max_size is not None and total + size > self.max_size:
+                    _log.warning('Stopped archiving at "%s" because the archive reached %d bytes' %
+                                 (path, self.max_size))
+                    return members
+
+                method = next((m for p, m in compression if _match(path_parts, p)), self.method)
+                members.append((path, '/'.join(path_parts), method))
+                total += size
+
+        return members
+
+def _split_pattern(pattern, pid=None):
+    """
+    Split a pattern into its path segments.  Patterns without a ``/`` match the file name in
+    any folder, unless they start with ``./`` or ``/``.
+    """
+
+    if pid is not None:
+        pattern = pattern.replace('{id}', str(pid))
+
+    anchored = pattern.startswith(('./', '/'))
+    if pattern.startswith('./'):
+        pattern = pattern[2:]
+    pattern = pattern.strip('/')
+    if '/' not in pattern and not anchored:
+        return ('**', pattern)
+
+    return tuple(pattern.split('/'))
+
+def _match(parts, pattern):
+    """
+    Check if the path segments match the pattern segments.  ``**`` matches any number of
+    segments.
+    """
+
+    if not pattern:
+        return not parts
+    if pattern[0] == '**':
+        return any(_match(parts[i:], pattern[1:]) for i in range(len(parts) + 1))
+
+    return (len(parts) > 0 and fnmatch.fnmatchcase(parts[0], pattern[0]) and
+            _match(parts[1:], pattern[1:]))
+
+def _matches_any(parts, patterns):
+    return any(_match(parts, pattern) for pattern in patterns)
+
+def _could_contain(parts, pattern):
+    """
+    Check if a folder could contain a file matching the pattern.
+    """
+
+    for i, part in enumerate(parts):
+        if pattern[i] == '**':
+            return True
+        if i >= len(pattern) - 1 or not fnmatch.fnmatchcase(part, pattern[i]):
+            return False
+
+    return len(pattern) > len(parts)
+
+def create_zip(pid, compression=None, level=None, workers=None, storage=None,
+               file_id='.', config=None, spec=None, folder='.'):
+    """
+    Zip all of the important PhysiCell items.  The files are chosen by an
+    :class:`Archive_spec` (see :ref:`tools-archive`), which by default archives the parameter
+    settings, ``output/`` without images, the PhysiCell settings, the ``main*.cpp`` and
+    ``Makefile`` in the current directory, and ``custom_modules/``.  The files are compressed in parallel (see
+    ``write_zip()``).  If ``storage`` is given, the zip is uploaded while it is being created
+    using ``Storage.upload_stream()`` instead of being saved in the current directory.
 
     Args:
         pid (str): the id of the current parameter run
+        compression (str): the compression method used for files without a per-pattern method:
+         ``store``, ``deflate`` (default), ``bzip2``, ``lzma``, or ``zstd`` (Python 3.14 and
+         newer).  Overrides the spec.
+        level (int): the compression level.  Overrides the spec.
+        workers (int): the number of threads used to compress files.  The number of CPUs is
+         used by default.
+        storage (Storage): the storage to upload the zip to.  None by default.
+        file_id (str): the folder in ``storage`` to upload the zip to.
+        config (Config): a Config object with an ``archive`` field.
+        spec (Archive_spec): the files to archive.  Made from ``config`` if None.
+        folder (str): the folder to archive and save the zip in, such as a
+         :ref:`workspace <workspace>`.  The current directory by default.
 
     Returns:
-        The name of the zipped file
+        The name of the zipped file, or False if it could not be uploaded
     """
 
     fileName = (str(pid) + '_test_' + datetime.datetime.utcnow().strftime('%Y-%m-%d_%H-%M-%S') +
                 '.zip')
-    # Create the zip
-    zip = zipfile.ZipFile(fileName, 'w')
 
-    # Add individual files
-    zip.write(str(pid) + "_dapt_param_settings.txt", compress_type=zipfile.ZIP_DEFLATED)
+    if spec is None:
+        spec = Archive_spec(config=config)
+    if compression is None:
+        compression = spec.method
+    if level is None:
+        level = spec.level
 
-    # Add files in output
-    for folder, subfolders, files in os.walk('output/'):
-        for file in files:
-            if ".png" not in file:
-                zip.write(os.path.join(folder, file),
-                          'output/'+file,
-                          compress_type = zipfile.ZIP_DEFLATED)
+    members = spec.members(pid=pid, root=folder)
 
-    # Add programming files
-    zip.write('config/PhysiCell_settings.xml', compress_type = zipfile.ZIP_DEFLATED)
-    zip.write('main*.cpp', compress_type = zipfile.ZIP_DEFLATED)
-    zip.write('Makefile', compress_type = zipfile.ZIP_DEFLATED)
-    zip.write('custom_modules/*', compress_type = zipfile.ZIP_DEFLATED)
+    if storage is not None:
+        if not _upload_zip(storage, file_id, fileName, members, compression, level, workers):
+            return False
+        return fileName
 
-    zip.close()
+    with open(os.path.join(folder, fileName), 'wb') as f:
+        write_zip(f, members, compression, level, workers)
 
     return fileName
 
+def write_zip(stream, members, compression='deflate', level=None, workers=None):
+    """
+    Write a zip file containing the given files.  The files are compressed by a pool of
+    threads, each into its own temporary single file zip, and then copied into the final
+    zip in order.  The compression libraries release the GIL, so this uses every core.  The
+    stream does not need to be seekable, so the zip can be written to a pipe.
+
+    Args:
+        stream (file): a binary file-like object to write the zip to
+        members (list): ``(path, arcname)`` tuples of the files to add and their names in the
+         zip.  A third element can give the compression method of that file.
+        compression (str): the compression method.  See ``COMPRESSION_METHODS``.
+        level (int): the compression level.  The default level of the method is used if None.
+         Needs Python 3.7 or newer.
+        workers (int): the number of threads.  The number of CPUs is used by default.  If 1,
+         the files are compressed directly into the zip.
+    """
+
+    for member in [(None, None, compression)] + list(members):
+        if len(member) > 2 and member[2] not in COMPRESSION_METHODS:
+            raise ValueError('Unknown compression method "%s".  Use one of: %s' %
+                             (member[2], ', '.join(COMPRESSION_METHODS)))
+    method = COMPRESSION_METHODS[compression]
+    workers = workers or os.cpu_count() or 1
+    if level is not None and sys.version_info < (3, 7):
+        _log.warning('The compression level needs Python 3.7 or newer and is ignored')
+        level = None
+
+    def member_method(member):
+        return COMPRESSION_METHODS[member[2]] if len(member) > 2 else method
+
+    with zipfile.ZipFile(stream, 'w', compression=method, **_level_args(level)) as zf:
+        if workers == 1:
+            for member in members:
+                zf.write(member[0], member[1], compress_type=member_method(member))
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = collections.deque()
+            for member in members:
+                pending.append(executor.submit(_compress_member, member[0], member[1],
+                                               member_method(member), level))
+                # Limit how many compressed files are waiting to be written
+                if len(pending) > 2 * workers:
+                    _append_member(zf, *pending.popleft().result())
+            while pending:
+                _append_member(zf, *pending.popleft().result())
+
+def _level_args(level):
+    """
+    The keyword arguments that set the compression level of a ``ZipFile``.  ``compresslevel``
+    was added in Python 3.7, so it is only given when a level is set.
+    """
+
+    return {} if level is None else {'compresslevel': level}
+
+def _compress_member(path, arcname, method, level):
+    """
+    Compress a file into a temporary zip that only contains that file.
+
+    Returns:
+        The ``ZipInfo`` of the file and the temporary zip
+    """
+
+    spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_SIZE)
+
+    with zipfile.ZipFile(spool, 'w', compression=method, **_level_args(level)) as single:
+        single.write(path, arcname)
+
+    return single.infolist()[0], spool
+
+def _append_member(zf, zinfo, spool):
+    """
+    Copy the compressed file from a single file zip into ``zf``.  ``ZipFile`` has no public
+    method for adding compressed data, so the entry is added to its file list directly and it
+    writes the central directory when it is closed.
+    """
+
+    # This uses the private attributes fp, filelist, NameToInfo, start_dir and _didModify, the
+    # same way ZipFile.write() does.  Checked against the zipfile module of Python 3.6 to 3.11.
+    # Local file header: 30 bytes followed by the name and extra field
+    spool.seek(26)
+    name_length, extra_length = struct.unpack('<HH', spool.read(4))
+    remaining = 30 + name_length + extra_length + zinfo.compress_size
+
+    spool.seek(0)
+    zinfo.header_offset = zf.fp.tell()
+    while remaining > 0:
+        data = spool.read(min(remaining, 1024 * 1024))
+        zf.fp.write(data)
+        remaining -= len(data)
+    spool.close()
+
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+    zf.start_dir = zf.fp.tell()
+    zf._didModify = True
+
+class _Pipe_reader:
+    """
+    The read end of a pipe that raises an error at the end of the data if the writer failed,
+    so a partial zip is never uploaded as if it were complete.
+    """
+
+    def __init__(self, fd):
+        self._file = os.fdopen(fd, 'rb')
+        self.error = None
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        if not data and self.error is not None:
+            raise IOError('The zip could not be created: %s' % str(self.error))
+        return data
+
+    def close(self):
+        self._file.close()
+
+def _upload_zip(storage, file_id, name, members, compression, level, workers):
+    """
+    Write a zip into a pipe that is read by ``storage.upload_stream()`` in another thread.
+
+    Returns:
+        True if the zip was uploaded and False otherwise
+    """
+
+    read_fd, write_fd = os.pipe()
+    reader = _Pipe_reader(read_fd)
+    result = {}
+
+    def upload():
+        try:
+            result['uploaded'] = storage.upload_stream(file_id, reader, name)
+        except Exception as e:
+            result['error'] = e
+        finally:
+            reader.close()
+
+    thread = threading.Thread(target=upload, daemon=True)
+    thread.start()
+
+    try:
+        with os.fdopen(write_fd, 'wb') as writer:
+            try:
+                write_zip(writer, members, compression, level, workers)
+            except BaseException as e:
+                reader.error = e
+                raise
+    except BrokenPipeError:
+        # The upload stopped reading; its result or error is reported below
+        pass
+    finally:
+        thread.join()
+
+    if 'error' in result:
+        raise result['error']
+
+    return bool(result.get('uploaded'))
+
+def convert_frames(folder='output', source='.svg', target='.png', command=None, workers=None,
+                   overwrite=False):
+    """
+    Convert the frames in a folder, such as PhysiCell's SVG snapshots, to another image format.
+    Each frame is converted by its own process and ``workers`` frames are converted at once,
+    so every core is used.  Frames that were already converted, and haven't changed since, are
+    skipped.
+
+    Args:
+        folder (str): the folder with the frames.  ``output`` by default.
+        source (str): the ending of the frames to convert.  ``.svg`` by default.
+        target (str): the ending of the converted frames.  ``.png`` by default.
+        command (list): the command that converts a frame.  ``{source}``, ``{target}`` and
+         ``{format}`` are replaced by the paths of the frame and converted frame and the target
+         format.  ``FRAME_COMMAND`` (ImageMagick's ``mogrify``) by default.
+        workers (int): the number of frames converted at once.  The number of CPUs by default.
+        overwrite (bool): convert frames that were already converted.  False by default.
+
+    Returns:
+        The number of frames converted
+    """
+
+    command = command or FRAME_COMMAND
+    workers = workers or os.cpu_count() or 1
+
+    jobs = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.name.endswith(source) or not entry.is_file():
+                continue
+
+            path = os.path.join(folder, entry.name[:-len(source)] + target)
+            if not overwrite:
+                try:
+                    if os.stat(path).st_mtime >= entry.stat().st_mtime:
+                        continue
+                except FileNotFoundError:
+                    pass
+
+            values = {'source':entry.path, 'target':path, 'format':target.lstrip('.')}
+            jobs.append([part.format(**values) for part in command])
+
+    jobs.sort()
+    _log.debug('Converting %d frames in %s' % (len(jobs), folder))
+
+    # The work is done by the processes, so threads are enough to keep them running
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(lambda args: subprocess.run(args, check=True,
+                                                          stdout=subprocess.DEVNULL), jobs):
+            pass
+
+    return len(jobs)
+
+def create_movie(pid, folder='output', frames='snapshot%08d.png', framerate=24, save='.',
+                 command=None):
+    """
+    Make a movie from the frames in a folder with ``ffmpeg``.  The movie is made in its own
+    temporary directory and moved to ``save`` when it is finished, so it doesn't use or change
+    the current directory and can run while other tasks do.
+
+    Args:
+        pid (str): the id of the current parameter run
+        folder (str): the folder with the frames.  ``output`` by default.
+        frames (str): the ffmpeg pattern of the frame names.  ``snapshot%08d.png`` by default.
+        framerate (int): the frames per second.  24 by default.
+        save (str): the folder to save the movie in.  The current directory by default.
+        command (list): the command that makes the movie.  ``{input}``, ``{output}`` and
+         ``{framerate}`` are replaced.  ``MOVIE_COMMAND`` by default.
+
+    Returns:
+        The path of the movie
+    """
+
+    command = command or MOVIE_COMMAND
+    name = (str(pid) + '_test_' + datetime.datetime.utcnow().strftime('%Y-%m-%d_%H-%M-%S') +
+            '.mp4')
+    work = tempfile.mkdtemp(prefix='dapt-movie-')
+
+    try:
+        values = {'input':os.path.abspath(os.path.join(folder, frames)),
+                  'output':os.path.join(work, name), 'framerate':framerate}
+        subprocess.run([part.format(**values) for part in command], cwd=work, check=True,
+                       stdout=subprocess.DEVNULL)
+
+        path = os.path.join(save, name)
+        shutil.move(values['output'], path)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    return path
+
+def post_processing_stage(name='imgProc', requires=('sim',), movie=True, workers=None,
+                          io_bound=True, **kwargs):
+    """
+    Make a :ref:`pipeline` stage that converts the SVG snapshots in ``output/`` to PNGs with
+    ``convert_frames()`` and then makes a movie with ``create_movie()``.  The stage works in the
+    parameter set's directory and returns the path of the movie.  It runs in the background by
+    default, so it overlaps with the next simulation.
+
+    Args:
+        name (str): the name of the stage.  ``imgProc`` by default.
+        requires (list): the stages this stage requires.  ``['sim']`` by default.
+        movie (bool): make a movie after converting the frames.  True by default.
+        workers (int): the number of frames converted at once.  The number of CPUs by default.
+        io_bound (bool): run the stage in the background.  True by default.
+        kwargs: given to ``create_movie()``, e.g. ``framerate``
+
+    Returns:
+        The ``Stage``
+    """
+
+    def post_process(parameters, context):
+        folder = os.path.join(context['path'], 'output')
+        convert_frames(folder, workers=workers)
+        if movie:
+            return create_movie(parameters['id'], folder=folder, save=context['path'],
+                                **kwargs)
+
+    return pipeline.Stage(name, post_process, requires=requires, io_bound=io_bound)
 
 
 '''
@@ -0,0 +1,285 @@
+"""
+.. _workspace:
+
+Workspaces
+==========
+
+The :ref:`tools <tools>` functions for PhysiCell work in the current directory and ``output/`` by
+default, so only one simulation can run in a directory and the next run has to wait for
+``data_cleanup()`` to finish.  The workspace module gives each parameter set its own directory
+instead.  A ``Workspace_manager`` creates a directory for each parameter set inside ``root``,
+copies a ``template`` directory into it (e.g. the PhysiCell executable and its ``config/``
+folder), and removes it when the parameter set is finished.
+
+Removing a directory with many output files is slow, so it is done in the background.  The
+directory is first renamed, which is instant, and then deleted by a background thread.  The
+background thread also prepares a fresh copy of the template for the next parameter set, so
+getting a workspace is usually just a rename.
+
+The workspaces can be put on a tmpfs (``/dev/shm`` on Linux) by setting ``tmpfs`` to ``True``.
+Files on a tmpfs are kept in memory, so writing and removing the output is fast.  The files are
+lost when the workspace is released, so zip and upload the results (e.g. with
+``tools.create_zip(pid, storage=storage, folder=path)``) before the task returns.
+
+``run()`` runs several parameter sets at the same time.  Each worker thread gets the next
+parameter set from :ref:`param`, runs the task in its own workspace, and marks the parameter set
+as successful or failed.  The task is a function that takes the parameter set and the path of
+the workspace.  It should run programs with that directory as their working directory rather
+than calling ``os.chdir()``, which changes the directory of every thread.  If the task returns a
+``dict``, it is saved as the results of the parameter set.
+
+    >>> def task(parameters, path):
+    ...     dapt.tools.create_XML(parameters, default_settings=os.path.join(path,
+    ...         'config/PhysiCell_settings_default.xml'), save_settings=os.path.join(path,
+    ...         'config/PhysiCell_settings.xml'))
+    ...     subprocess.run(['./project'], cwd=path, check=True)
+    ...     dapt.tools.create_zip(parameters['id'], storage=storage, folder=path)
+    >>> manager = dapt.workspace.Workspace_manager(template='PhysiCell', tmpfs=True)
+    >>> manager.run(param, task, workers=4)
+    >>> manager.close()
+
+.. _workspace-config:
+
+Config
+------
+
+The manager can be set up with the ``workspace`` field of the :ref:`config`.
+
++---------------------------+----------------------------------------------------------------+
+| Fields                    | Description                                                    |
++===========================+================================================================+
+| ``root`` (str)            | The directory the workspaces are made in.  ``dapt_workspaces`` |
+|                           | by default, or ``/dev/shm/dapt_workspaces`` with ``tmpfs``.    |
++---------------------------+----------------------------------------------------------------+
+| ``template`` (str)        | The directory copied into each workspace.                      |
++---------------------------+----------------------------------------------------------------+
+| ``tmpfs`` (bool)          | Make the workspaces on a tmpfs.  False by default.             |
++---------------------------+----------------------------------------------------------------+
+| ``workers`` (int)         | The number of parameter sets ``run()`` runs at once.           |
++---------------------------+----------------------------------------------------------------+
+| ``keep`` (bool)           | Keep the workspaces instead of removing them.  Useful for      |
+|                           | debugging.  False by default.                                  |
++---------------------------+----------------------------------------------------------------+
+
+.. code-block:: JSON
+
+    {
+        "workspace" : {
+            "template" : "PhysiCell",
+            "tmpfs" : true,
+            "workers" : 4
+        }
+    }
+
+"""
+
+import concurrent.futures
+import logging
+import os
+import queue
+import shutil
+import threading
+import uuid
+
+_log = logging.getLogger(__name__)
+
+#: Where tmpfs workspaces are made
+TMPFS = '/dev/shm'
+
+class Workspace_manager:
+    """
+    Create, and remove in the background, a directory for each parameter set.  Values given as
+    arguments are used before the values in the ``workspace`` field of the config.
+
+    Keyword args:
+        root (str): the directory the workspaces are made in
+        template (str): the directory copied into each workspace.  Workspaces are empty if None.
+        tmpfs (bool): make the workspaces on a tmpfs.  Ignored if ``root`` is given.
+        keep (bool): keep workspaces instead of removing them
+        config (Config): a Config object with the ``workspace`` settings
+    """
+
+    def __init__(self, root=None, template=None, tmpfs=None, keep=None, config=None):
+        conf = (config.get_value('workspace') if config else None) or {}
+
+        self.template = template if template is not None else conf.get('template')
+        self.tmpfs = tmpfs if tmpfs is not None else conf.get('tmpfs', False)
+        self.keep = keep if keep is not None else conf.get('keep', False)
+        self.workers = conf.get('workers', 1)
+
+        root = root if root is not None else conf.get('root')
+        if root is None:
+            root = 'dapt_workspaces'
+            if self.tmpfs:
+                if os.path.isdir(TMPFS):
+                    root = os.path.join(TMPFS, root)
+                else:
+                    _log.warning('%s does not exist so the workspaces are not on a tmpfs' % TMPFS)
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._recycler = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def acquire(self, pid):
+        """
+        Get a new workspace for a parameter set.
+
+        Args:
+            pid (str): the id of the parameter set
+
+        Returns:
+            The path of the workspace
+        """
+
+        try:
+            ready = self._ready.get_nowait()
+        except queue.Empty:
+            ready = self._prepare()
+
+        with self._lock:
+            path = os.path.join(self.root, str(pid))
+            i = 1
+            while os.path.exists(path):
+                path = os.path.join(self.root, '%s-%d' % (pid, i))
+                i += 1
+            os.rename(ready, path)
+
+        _log.debug('Acquired workspace %s' % path)
+
+        return path
+
+    def release(self, path):
+        """
+        Remove a workspace in the background and prepare a new one to replace it.  Nothing is
+        done if ``keep`` is True.
+
+        Args:
+            path (str): the path of the workspace
+        """
+
+        if self.keep:
+            return
+
+        trash = os.path.join(self.root, '.trash-' + uuid.uuid4().hex)
+        os.rename(path, trash)
+        self._recycler.submit(self._recycle, trash)
+
+    def workspace(self, pid):
+        """
+        A context manager that acquires a workspace and releases it when the block finishes.
+
+            >>> with manager.workspace(parameters['id']) as path:
+            ...     subprocess.run(['./project'], cwd=path)
+
+        Args:
+            pid (str): the id of the parameter set
+
+        Returns:
+            The context manager, which gives the path of the workspace
+        """
+
+        return _Workspace(self, pid)
+
+    def run(self, param, task, workers=None):
+        """
+        Run parameter sets until there are none left, each in its own workspace.  Parameter
+        sets where the task raises an exception are marked as failed.
+
+        Args:
+            param (Param): the Param object used to get and update parameter sets
+            task (function): called with the parameter set and the path of its workspace.  If it
+             returns a ``dict``, it is given to ``Param.successful()`` as the results.
+            workers (int): the number of parameter sets run at once.  The ``workers`` value in
+             the config, or 1, is used if None.
+
+        Returns:
+            The number of parameter sets that were run
+        """
+
+        workers = workers or self.workers
+        param_lock = threading.Lock()
+
+        def worker():
+            count = 0
+
+            while True:
+                with param_lock:
+                    parameters = param.next_parameters()
+                if parameters is None:
+                    return count
+
+                pid = parameters['id']
+                count += 1
+
+                try:
+                    with self.workspace(pid) as path:
+                        results = task(parameters, path)
+                except Exception as e:
+                    _log.exception('Parameter set %s failed' % str(pid))
+                    with param_lock:
+                        param.failed(pid, str(e))
+                    continue
+
+                with param_lock:
+                    param.successful(pid, results if isinstance(results, dict) else None)
+
+        if workers == 1:
+            return worker()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(worker) for _ in range(workers)]
+
+        return sum(future.result() for future in futures)
+
+    def close(self, wait=True):
+        """
+        Stop the background thread and remove the prepared workspaces.
+
+        Args:
+            wait (bool): wait for the workspaces being removed.  True by default.
+        """
+
+        self._recycler.shutdown(wait=wait)
+
+        while True:
+            try:
+                shutil.rmtree(self._ready.get_nowait(), ignore_errors=True)
+            except queue.Empty:
+                break
+
+    def _prepare(self):
+        """
+        Make a fresh copy of the template with a temporary name.
+        """
+
+        path = os.path.join(self.root, '.ready-' + uuid.uuid4().hex)
+
+        if self.template:
+            shutil.copytree(self.template, path, symlinks=True)
+        else:
+            os.makedirs(path)
+
+        return path
+
+    def _recycle(self, trash):
+        shutil.rmtree(trash, ignore_errors=True)
+
+        try:
+            self._ready.put(self._prepare())
+        except OSError as e:
+            _log.warning('Could not prepare a workspace: %s' % str(e))
+
+class _Workspace:
+    def __init__(self, manager, pid):
+        self.manager = manager
+        self.pid = pid
+        self.path = None
+
+    def __enter__(self):
+        self.path = self.manager.acquire(self.pid)
+        return self.path
+
+    def __exit__(self, *args):
+        self.manager.release(self.path)
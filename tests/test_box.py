@@ -2,8 +2,20 @@
 Test the Box class in `dapt.storage.box`
 """
 
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+
 import pytest
 
+import dapt
+from dapt import testing
+
 from tests.base import Storage_test_base
 
 @pytest.mark.test_login
@@ -27,5 +39,214 @@ class TestBox(Storage_test_base):
 
         pass
 
+def create_offline_box(tmp, part_size=1024):
+    """
+    Create a Box object that uses a fake client instead of connecting to Box.
+    """
+
+    with open(os.path.join(tmp, 'config.json'), 'w') as f:
+        json.dump({'box':{'client-id':'id', 'client-secret':'secret'}}, f)
+
+    box = dapt.storage.Box(config=dapt.Config(os.path.join(tmp, 'config.json')))
+    box.client = testing.Fake_box_client(part_size=part_size)
+    box.transfer_backoff = 0
+
+    return box
+
+# Test that a resumed upload session only sends the parts Box doesn't have
+def test_box_resume_chunked_upload():
+    tmp = tempfile.mkdtemp()
+    box = create_offline_box(tmp)
+    box.upload_workers = 1
+    path = os.path.join(tmp, 'large.bin')
+    with open(path, 'wb') as f:
+        f.write(os.urandom(5000))
+
+    box.client.fail_parts.add(2048)
+    with pytest.raises(Exception):
+        box._chunked_upload(box.client.folder('0'), path, 'large.bin',
+                            box.transfer('large.bin', 'upload'))
+    state_exists = os.path.exists(os.path.join(tmp, '.large.bin.box-upload'))
+    session, = box.client.sessions.values()
+    before = list(session.uploaded)
+
+    box._chunked_upload(box.client.folder('0'), path, 'large.bin',
+                        box.transfer('large.bin', 'upload'))
+    resumed = session.uploaded[len(before):]
+    files = [i for i in box.client.items.values() if i['name'] == 'large.bin']
+    with open(path, 'rb') as f:
+        content = f.read()
+    state_left = os.path.exists(os.path.join(tmp, '.large.bin.box-upload'))
+    shutil.rmtree(tmp)
+
+    assert state_exists, "The upload session was not saved."
+    assert box.client.call_counts['create_upload_session'] == 1, "The session was not resumed."
+    assert 2048 in resumed and before, "The parts were not uploaded."
+    assert sorted(before + resumed) == [0, 1024, 2048, 3072, 4096], \
+        "Parts that Box had were uploaded again."
+    assert len(files) == 1 and files[0]['content'] == content, "The file was not uploaded."
+    assert not state_left, "The upload session file was not removed."
+
+# Test that a zip can be uploaded to Box with the upload_stream() of the Storage class
+def test_box_upload_stream():
+    tmp = tempfile.mkdtemp()
+    box = create_offline_box(tmp)
+    cwd = os.getcwd()
+    os.chdir(tmp)
+
+    try:
+        with open('Makefile', 'w') as f:
+            f.write('all:\n')
+        name = dapt.tools.create_zip('t1', storage=box, file_id='0', workers=2)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+    files = [i for i in box.client.items.values() if i['name'] == name]
+
+    assert len(files) == 1, "The zip was not uploaded."
+    with zipfile.ZipFile(io.BytesIO(files[0]['content'])) as zf:
+        assert zf.namelist() == ['Makefile'], "The uploaded zip is wrong."
+
+# Test that a download interrupted by a dropped connection is retried from where it stopped
+def test_box_resume_interrupted_download(monkeypatch):
+    tmp = tempfile.mkdtemp()
+    box = create_offline_box(tmp)
+    content = os.urandom(5000)
+    file_id = box.client.create('large.bin', content=content)
+    box.client.interrupt_downloads = 1
+    ranges = []
+    download_to = testing._Fake_box_file.download_to
+
+    def record(self, stream, byte_range=None):
+        ranges.append(byte_range)
+        return download_to(self, stream, byte_range=byte_range)
+
+    monkeypatch.setattr(testing._Fake_box_file, 'download_to', record)
+    box.download_file(file_id, os.path.join(tmp, 'large.bin'))
+    with open(os.path.join(tmp, 'large.bin'), 'rb') as f:
+        downloaded = f.read()
+    shutil.rmtree(tmp)
+
+    assert downloaded == content, "The downloaded file is wrong."
+    assert ranges == [None, (2500, 4999)], "The download was not resumed."
+
+# Test that an upload session is discarded when the file changes
+def test_box_discard_changed_upload():
+    tmp = tempfile.mkdtemp()
+    box = create_offline_box(tmp)
+    box.upload_workers = 1
+    path = os.path.join(tmp, 'large.bin')
+    with open(path, 'wb') as f:
+        f.write(os.urandom(5000))
+
+    box.client.fail_parts.add(0)
+    with pytest.raises(Exception):
+        box._chunked_upload(box.client.folder('0'), path, 'large.bin',
+                            box.transfer('large.bin', 'upload'))
+
+    with open(path, 'wb') as f:
+        f.write(os.urandom(5000))
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+    box._chunked_upload(box.client.folder('0'), path, 'large.bin',
+                        box.transfer('large.bin', 'upload'))
+    files = [i for i in box.client.items.values() if i['name'] == 'large.bin']
+    with open(path, 'rb') as f:
+        content = f.read()
+    shutil.rmtree(tmp)
+
+    assert box.client.call_counts['create_upload_session'] == 2, \
+        "The old upload session was used for a changed file."
+    assert files[0]['content'] == content, "The changed file was not uploaded."
+
+# Test that the folder cache is listed once and follows uploads, deletes and renames
+def test_box_folder_cache():
+    tmp = tempfile.mkdtemp()
+    box = create_offline_box(tmp)
+    for name in ['a.txt', 'b.txt', 'c.txt']:
+        with open(os.path.join(tmp, name), 'w') as f:
+            f.write(name)
+    client = box.client
+
+    box.upload_file('0', os.path.join(tmp, 'a.txt'))
+    box.upload_file('0', os.path.join(tmp, 'b.txt'))
+    a_id = box._cached_item('0', 'a.txt', 'file')
+    b_id = box._cached_item('0', 'b.txt', 'file')
+
+    box.delete_file(b_id)
+    after_delete = box._cached_item('0', 'b.txt', 'file')
+    box.rename_file(a_id, 'renamed.txt')
+    after_rename = (box._cached_item('0', 'a.txt', 'file'),
+                    box._cached_item('0', 'renamed.txt', 'file'))
+
+    # Another program adds c.txt, so the cache doesn't know about it
+    other_id = client.create('c.txt', '0', b'other')
+    box.upload_file('0', os.path.join(tmp, 'c.txt'))
+    c_items = [i for i in client.items.values() if i['name'] == 'c.txt']
+    shutil.rmtree(tmp)
+
+    assert client.call_counts['get_items'] == 1, "The folder was listed more than once."
+    assert after_delete is None, "The deleted file is still in the cache."
+    assert after_rename == (None, a_id), "The renamed file was not updated in the cache."
+    assert len(c_items) == 1 and c_items[0]['id'] != other_id, \
+        "The conflicting file was not replaced."
+    assert box._cached_item('0', 'c.txt', 'file') == c_items[0]['id'], \
+        "The cache was not updated after the conflict."
+
+# Test that threads checking the tokens at the same time only refresh them once
+def test_box_tokens_refresh_once():
+    tmp = tempfile.mkdtemp()
+    box = create_offline_box(tmp)
+    refreshes = []
+
+    def refresh(access_token):
+        refreshes.append(access_token)
+        time.sleep(0.05)
+        return 'access-%d' % len(refreshes), 'refresh-%d' % len(refreshes)
+
+    box.oauth.refresh = refresh
+    box._access_token = 'access-0'
+    box.refresh_time = time.time()
+
+    threads = [threading.Thread(target=box.tokens.ensure_valid) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    box.tokens.stop()
+    time.sleep(0.05)
+    shutil.rmtree(tmp)
+
+    assert refreshes == ['access-0'], "The tokens were refreshed more than once."
+    assert box._access_token == 'access-1', "The new tokens were not saved."
+    assert not box.tokens.expiring(), "The refresh time was not updated."
+
+# Test that a failed background refresh is tried again
+def test_box_tokens_retry_refresh():
+    tmp = tempfile.mkdtemp()
+    box = create_offline_box(tmp)
+    refreshes = []
+
+    def refresh(access_token):
+        refreshes.append(access_token)
+        if len(refreshes) == 1:
+            raise ConnectionError('Box is unavailable')
+        return 'access-1', 'refresh-1'
+
+    box.oauth.refresh = refresh
+    box._access_token = 'access-0'
+    box.refresh_time = time.time()
+    box.tokens.retry_delay = 0.01
+    box.tokens.start()
 
+    end = time.time() + 5
+    while box._access_token != 'access-1' and time.time() < end:
+        time.sleep(0.01)
+    box.tokens.stop()
+    time.sleep(0.05)
+    shutil.rmtree(tmp)
 
+    assert refreshes == ['access-0', 'access-0'], "The refresh was not tried again."
+    assert box._access_token == 'access-1', "The new tokens were not saved."
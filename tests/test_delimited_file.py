@@ -41,5 +41,31 @@ class TestDelimitedFile(Database_test_base):
 	def test_sup(self):
 		assert True == True
 
+	# Test that rows are appended on a new line when the file doesn't end with one
+	def test_append_rows_no_trailing_newline(self):
+		with open('test.csv', 'w') as f:
+			f.write('id,status,a\nt1,,1')
+		db = dapt.db.Delimited_file('test.csv', ',')
+
+		actual = db.append_rows([{'id':'t2', 'status':'', 'a':'2'}])
+		table = db.get_table()
+		self.postflight()
+
+		assert actual == 1, "The wrong number of rows was added."
+		assert table == [{'id':'t1', 'status':'', 'a':'1'}, {'id':'t2', 'status':'', 'a':'2'}], \
+			"The row was joined onto the last row."
+
+
+
+	def test_append_rows(self):
+		db = self.preflight()
+
+		actual = db.append_rows(iter([{'id':'t4', 'status':'', 'a':'1'}, {'id':'t5', 'b':'2', 'd':'3'}]))
+		expected = Database_test_base.INITIAL_DICT + [
+				{'id':'t4', 'start-time':'', 'end-time':'', 'status':'', 'a':'1', 'b':'', 'c':''},
+				{'id':'t5', 'start-time':'', 'end-time':'', 'status':'', 'a':'', 'b':'2', 'c':''}]
 
+		assert actual == 2, "The wrong number of rows was added."
+		assert db.get_table() == expected, "The rows were not appended."
 
+		self.postflight()
@@ -0,0 +1,67 @@
+"""
+    Test if instrument.py is working correctly
+"""
+
+import json
+import os
+
+import dapt
+from dapt import instrument
+
+class List_sink:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+# Test that Param and Database calls are recorded when instrumentation is enabled
+def test_instrument_param():
+    db = dapt.tools.sample_db(file_name='test.csv')
+    sink = List_sink()
+
+    instrument.enable(sink)
+    try:
+        param = dapt.Param(db)
+        param.next_parameters()
+    finally:
+        instrument.disable()
+
+    names = [e['name'] for e in sink.events]
+    os.remove('test.csv')
+
+    assert 'param.next_parameters' in names, "Param calls were not recorded."
+    assert 'db.Delimited_file.get_table' in names, "Database calls were not recorded."
+
+# Test that nothing is recorded when instrumentation is disabled
+def test_instrument_disabled():
+    db = dapt.tools.sample_db(file_name='test.csv')
+    sink = List_sink()
+
+    instrument.enable(sink)
+    instrument.disable()
+    dapt.Param(db).next_parameters()
+    os.remove('test.csv')
+
+    assert sink.events == [], "Events were recorded while disabled."
+
+# Test the JSON lines and Prometheus sinks
+def test_instrument_file_sinks():
+    instrument.enable(instrument.JSON_lines_sink('test_events.jsonl'),
+                      instrument.Prometheus_sink('test.prom', interval=60))
+    instrument.record('test.call', seconds=0.5)
+    instrument.record('test.call', seconds=0.25, error='ValueError')
+    instrument.disable()
+
+    with open('test_events.jsonl') as f:
+        events = [json.loads(line) for line in f]
+    with open('test.prom') as f:
+        prom = f.read()
+
+    os.remove('test_events.jsonl')
+    os.remove('test.prom')
+
+    assert len(events) == 2 and events[1]['error'] == 'ValueError'
+    assert 'dapt_calls_total{name="test.call",kind="call"} 2' in prom
+    assert 'dapt_seconds_total{name="test.call",kind="call"} 0.75' in prom
+    assert 'dapt_errors_total{name="test.call",kind="call"} 1' in prom
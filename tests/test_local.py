@@ -0,0 +1,136 @@
+"""
+Test the Local class in `dapt.storage.local`
+"""
+
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+import pytest
+
+import dapt
+
+from tests.base import Storage_test_base
+
+class TestLocal(Storage_test_base):
+
+    def preflight(self):
+        """
+        Testing items that should be ran before tests are ran.  This method returns a new
+        class method for the test.
+
+        Returns:
+            The class instance which will be used for the unit test.
+        """
+
+        self.tmp = Path(tempfile.mkdtemp())
+        self.work = self.tmp / 'work'
+        (self.work / 'results' / 'sub').mkdir(parents=True)
+        (self.work / 'test.txt').write_text('Local storage works')
+        (self.work / 'results' / 'a.txt').write_text('a')
+        (self.work / 'results' / 'sub' / 'b.txt').write_text('b')
+
+        storage = dapt.storage.Local(root=self.tmp / 'storage')
+        storage.connect()
+
+        return storage
+
+    def postflight(self):
+        """
+        Clean up after tests are ran.
+        """
+
+        shutil.rmtree(self.tmp)
+
+    def test_upload_download_file(self):
+        """
+        Test if a file can be uploaded and downloaded
+        """
+
+        storage = self.preflight()
+
+        assert storage.upload_file('runs', 'test.txt', folder=self.work)
+        assert (storage.root / 'runs' / 'test.txt').read_text() == 'Local storage works'
+
+        assert storage.download_file('runs/test.txt', folder=self.tmp / 'down', name='copy.txt')
+        assert (self.tmp / 'down' / 'copy.txt').read_text() == 'Local storage works'
+
+        assert not storage.upload_file('runs', 'test.txt', folder=self.work, overwrite=False), \
+            "The file was overwritten."
+        assert storage.last_transfer.metrics()['bytes'] == len('Local storage works')
+
+        self.postflight()
+
+    def test_upload_download_folder(self):
+        """
+        Test if a folder can be uploaded and downloaded
+        """
+
+        storage = self.preflight()
+
+        assert storage.upload_folder('.', 'results', folder=self.work)
+        assert storage.download_folder('results', folder=self.tmp / 'down')
+
+        assert (self.tmp / 'down' / 'results' / 'a.txt').read_text() == 'a'
+        assert (self.tmp / 'down' / 'results' / 'sub' / 'b.txt').read_text() == 'b'
+
+        self.postflight()
+
+    def test_rename_delete(self):
+        """
+        Test if files and folders can be renamed and deleted
+        """
+
+        storage = self.preflight()
+
+        storage.upload_folder('.', 'results', folder=self.work)
+
+        assert storage.rename_file('results/a.txt', 'c.txt')
+        assert storage.delete_file('results/c.txt')
+        assert storage.rename_folder('results', 'old')
+        assert storage.delete_folder('old')
+        assert os.listdir(storage.root) == [], "The files were not removed."
+
+        self.postflight()
+
+    def test_hardlink(self):
+        """
+        Test that files are hard linked when ``hardlink`` is set
+        """
+
+        storage = self.preflight()
+        storage.hardlink = True
+
+        storage.upload_file('.', 'test.txt', folder=self.work)
+
+        assert os.path.samefile(storage.root / 'test.txt', self.work / 'test.txt')
+
+        self.postflight()
+
+    def test_outside_root(self):
+        """
+        Test that paths outside of the root cannot be used
+        """
+
+        storage = self.preflight()
+
+        with pytest.raises(ValueError):
+            storage.delete_file('../work/test.txt')
+
+        self.postflight()
+
+    def test_upload_stream(self):
+        """
+        Test that a stream can be uploaded
+        """
+
+        storage = self.preflight()
+
+        with open(self.work / 'test.txt', 'rb') as f:
+            assert storage.upload_stream('runs', f, 'stream.txt')
+
+        assert (storage.root / 'runs' / 'stream.txt').read_text() == 'Local storage works'
+        assert os.listdir(storage.root / 'runs') == ['stream.txt'], "A temporary file was left."
+
+        self.postflight()
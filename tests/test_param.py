@@ -123,3 +123,37 @@ def test_Param_failed_fields():
         expected['end-time'] = actual['end-time']
     
     assert actual == expected, "Cannot update the status of the paramater set."
+
+# Test that the resource usage is written to the usage fields
+def test_Param_record_usage():
+    with open('test.csv', 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'status', 'wall-time', 'cpu-time', 'max-rss', 'a'])
+        writer.writeheader()
+        writer.writerow({'id':'t1', 'status':'', 'wall-time':'', 'cpu-time':'', 'max-rss':'', 'a':'2'})
+
+    db = dapt.Delimited_file('test.csv', ',')
+
+    param = dapt.Param(db, record_usage=True)
+    actual = param.next_parameters()
+    actual = param.successful(actual['id'])
+
+    assert float(actual['wall-time']) >= 0, "The wall time was not recorded."
+    assert float(actual['cpu-time']) >= 0, "The CPU time was not recorded."
+    assert param.usage('t1') is None, "The parameter set is still being measured."
+
+# Test that parameter sets with a larger priority are run first
+def test_Param_priority():
+    with open('test.csv', 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'status', 'priority', 'a'])
+        writer.writeheader()
+        writer.writerow({'id':'t1', 'status':'', 'priority':'', 'a':'1'})
+        writer.writerow({'id':'t2', 'status':'', 'priority':'2', 'a':'2'})
+        writer.writerow({'id':'t3', 'status':'', 'priority':'5', 'a':'3'})
+        writer.writerow({'id':'t4', 'status':'', 'priority':'2', 'a':'4'})
+
+    db = dapt.Delimited_file('test.csv', ',')
+    param = dapt.Param(db)
+
+    actual = [param.next_parameters()['id'] for i in range(4)]
+
+    assert actual == ['t3', 't2', 't4', 't1'], "The parameter sets were not run in priority order."
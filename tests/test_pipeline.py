@@ -0,0 +1,215 @@
+"""
+    Test if pipeline.py is working correctly
+"""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+import dapt
+from dapt import pipeline
+
+from tests.test_box import create_offline_box
+
+def create_pipeline_test_file():
+    with open('test.csv', 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'status', 'tasks', 'score'])
+        writer.writeheader()
+        writer.writerow({'id':'t1', 'status':'', 'tasks':'', 'score':''})
+        writer.writerow({'id':'t2', 'status':'', 'tasks':'sim, zip', 'score':''})
+        writer.writerow({'id':'t3', 'status':'', 'tasks':'', 'score':''})
+
+# Test that the stages run in order, use the tasks field, and overlap io bound stages
+def test_pipeline_run():
+    create_pipeline_test_file()
+    db = dapt.Delimited_file('test.csv', ',')
+    param = dapt.Param(db)
+    runs = []
+    lock = threading.Lock()
+
+    def stage(name):
+        def function(parameters, context):
+            with lock:
+                runs.append((parameters['id'], name, threading.current_thread().name))
+            if name == 'sim' and parameters['id'] == 't3':
+                raise ValueError('diverged')
+            if name == 'zip':
+                return {'score':context['sim']}
+            return parameters['id'] + name
+        return function
+
+    stages = [pipeline.Stage('zip', stage('zip'), requires=['sim'], io_bound=True),
+              pipeline.Stage('sim', stage('sim'), requires=['xml']),
+              pipeline.Stage('xml', stage('xml'))]
+    count = pipeline.Pipeline(param, stages, overlap=True, status_interval=0).run()
+    table = db.get_table()
+
+    main = threading.current_thread().name
+    assert count == 3, "Every parameter set was not run."
+    assert [(r[0], r[1]) for r in runs if r[0] == 't1'] == [('t1', 'xml'), ('t1', 'sim'),
+                                                            ('t1', 'zip')], \
+        "The stages did not run in order."
+    assert ('t2', 'xml') not in [(r[0], r[1]) for r in runs], "The tasks field was not used."
+    assert all((r[2] == main) == (r[1] != 'zip') for r in runs), \
+        "The io bound stage did not run in the background."
+    assert [r['status'] for r in table] == ['successful', 'successful', 'failed'], \
+        "The statuses are wrong."
+    assert table[1]['score'] == 't2sim', "The results were not saved."
+
+def create_pipeline_config(tmp):
+    path = os.path.join(tmp, 'config.json')
+    with open(path, 'w') as f:
+        json.dump({'last-test':None}, f)
+    return dapt.Config(path)
+
+# Test that last-test in the config does not run a parameter set again while it is running
+def test_pipeline_run_config():
+    create_pipeline_test_file()
+    tmp = tempfile.mkdtemp()
+    config = create_pipeline_config(tmp)
+    db = dapt.Delimited_file('test.csv', ',')
+    param = dapt.Param(db, config=config)
+    runs = []
+
+    def sim(parameters, context):
+        runs.append(parameters['id'])
+
+    stages = [pipeline.Stage('sim', sim),
+              pipeline.Stage('zip', lambda parameters, context: None, ['sim'], io_bound=True)]
+    pipeline.Pipeline(param, stages, overlap=True, status_interval=0).run()
+    last_test = config['last-test']
+    shutil.rmtree(tmp)
+
+    assert runs == ['t1', 't2', 't3'], "A parameter set was run more than once."
+    assert [r['status'] for r in db.get_table()] == ['successful'] * 3, "The statuses are wrong."
+    assert last_test is None, "last-test was not removed."
+
+# Test that missing and circular requirements are found
+def test_pipeline_requirements():
+    with pytest.raises(ValueError):
+        pipeline.Pipeline(None, [pipeline.Stage('a', None, requires=['b'])])
+    with pytest.raises(ValueError):
+        pipeline.Pipeline(None, [pipeline.Stage('a', None, requires=['b']),
+                                 pipeline.Stage('b', None, requires=['a'])])
+
+# Test that parameter sets are only successful after their upload finishes
+def test_pipeline_upload_queue():
+    create_pipeline_test_file()
+    tmp = tempfile.mkdtemp()
+    db = dapt.Delimited_file('test.csv', ',')
+    param = dapt.Param(db)
+    storage = dapt.storage.Local(root=os.path.join(tmp, 'storage'))
+    storage.connect()
+    os.makedirs(os.path.join(tmp, 'storage', 'zips'))
+    manager = dapt.workspace.Workspace_manager(root=os.path.join(tmp, 'workspaces'))
+    uploads = pipeline.Upload_queue(storage, capacity=1)
+    release = threading.Event()
+    statuses = []
+
+    def zip_output(parameters, context):
+        name = parameters['id'] + '.zip'
+        with open(os.path.join(context['path'], name), 'w') as f:
+            f.write(parameters['id'])
+        return name
+
+    def upload(parameters, context):
+        future = uploads.put('zips', context['zip'], folder=context['path'])
+        if parameters['id'] == 't1':
+            # The next parameter set starts before this upload is done
+            statuses.append(db.get_table()[0]['status'])
+            release.set()
+        return future
+
+    original = storage.upload_file
+    def slow_upload(file_id, name, folder='.', overwrite=True):
+        release.wait(10)
+        if name == 't3.zip':
+            return False
+        return original(file_id, name, folder=folder, overwrite=overwrite)
+    storage.upload_file = slow_upload
+
+    stages = [pipeline.Stage('zip', zip_output), pipeline.Stage('upload', upload, ['zip'])]
+    pipeline.Pipeline(param, stages, workspaces=manager).run()
+    uploads.close()
+    manager.close()
+    table = db.get_table()
+    uploaded = sorted(os.listdir(os.path.join(tmp, 'storage', 'zips')))
+    shutil.rmtree(tmp)
+
+    assert statuses == ['in progress'], "The parameter set was successful before its upload."
+    assert [r['status'] for r in table] == ['successful', 'successful', 'failed'], \
+        "The statuses are wrong."
+    # t2 only has the zip task
+    assert uploaded == ['t1.zip'], "The files were not uploaded."
+
+# Test that parameter sets waiting for their upload are not claimed again with a config
+def test_pipeline_upload_queue_config():
+    create_pipeline_test_file()
+    tmp = tempfile.mkdtemp()
+    config = create_pipeline_config(tmp)
+    db = dapt.Delimited_file('test.csv', ',')
+    param = dapt.Param(db, config=config)
+    storage = dapt.storage.Local(root=os.path.join(tmp, 'storage'))
+    storage.connect()
+    os.makedirs(os.path.join(tmp, 'storage', 'zips'))
+    uploads = pipeline.Upload_queue(storage, capacity=2)
+    release = threading.Event()
+    runs = []
+
+    def zip_output(parameters, context):
+        runs.append(parameters['id'])
+        name = parameters['id'] + '.zip'
+        with open(os.path.join(tmp, name), 'w') as f:
+            f.write(parameters['id'])
+        return name
+
+    def upload(parameters, context):
+        return uploads.put('zips', context['zip'], folder=tmp)
+
+    original = storage.upload_file
+    def slow_upload(file_id, name, folder='.', overwrite=True):
+        # Hold the first upload until every parameter set has been claimed
+        if name == 't1.zip':
+            release.wait(10)
+        return original(file_id, name, folder=folder, overwrite=overwrite)
+    storage.upload_file = slow_upload
+
+    def next_parameters():
+        parameters = claim()
+        if parameters is None:
+            release.set()
+        return parameters
+    claim = param.next_parameters
+    param.next_parameters = next_parameters
+
+    stages = [pipeline.Stage('zip', zip_output), pipeline.Stage('upload', upload, ['zip'])]
+    pipeline.Pipeline(param, stages).run()
+    uploads.close()
+    table = db.get_table()
+    uploaded = sorted(os.listdir(os.path.join(tmp, 'storage', 'zips')))
+    shutil.rmtree(tmp)
+
+    assert runs == ['t1', 't2', 't3'], "A parameter set was run more than once."
+    assert [r['status'] for r in table] == ['successful'] * 3, "The statuses are wrong."
+    assert uploaded == ['t1.zip', 't3.zip'], "The files were not uploaded."
+
+# Test that the upload queue works with Box, whose upload_file takes a path
+def test_upload_queue_box():
+    tmp = tempfile.mkdtemp()
+    box = create_offline_box(tmp)
+    with open(os.path.join(tmp, 't1.zip'), 'w') as f:
+        f.write('t1')
+
+    uploads = pipeline.Upload_queue(box)
+    result = uploads.put('0', 't1.zip', folder=tmp).result(10)
+    uploads.close()
+    files = [i for i in box.client.items.values() if i['name'] == 't1.zip']
+    shutil.rmtree(tmp)
+
+    assert result, "The upload failed."
+    assert len(files) == 1 and files[0]['content'] == b't1', "The file was not uploaded."
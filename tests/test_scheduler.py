@@ -0,0 +1,69 @@
+"""
+    Test if scheduler.py is working correctly
+"""
+
+import csv
+import os
+
+import dapt
+from dapt import scheduler
+
+def create_cost_test_file():
+    with open('test.csv', 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'status', 'computer-strength', 'cost'])
+        writer.writeheader()
+        writer.writerow({'id':'t1', 'status':'', 'computer-strength':'1', 'cost':'5'})
+        writer.writerow({'id':'t2', 'status':'', 'computer-strength':'1', 'cost':'500'})
+        writer.writerow({'id':'t3', 'status':'', 'computer-strength':'3', 'cost':'5000'})
+        writer.writerow({'id':'t4', 'status':'', 'computer-strength':'1', 'cost':''})
+
+# Test that the largest job the computer can run is chosen first
+def test_largest_job_first():
+    create_cost_test_file()
+    db = dapt.Delimited_file('test.csv', ',')
+
+    param = dapt.Param(db, policy=scheduler.Largest_job_first())
+    param.computer_strength = 2
+
+    assert param.next_parameters()['id'] == 't2', "The largest job was not chosen."
+    assert param.next_parameters()['id'] == 't1', "The next largest job was not chosen."
+    assert param.next_parameters()['id'] == 't4', "The job with a blank cost was not chosen."
+    assert param.next_parameters() is None, "A job that is too large was chosen."
+
+# Test that cost buckets prefer the computer's bucket and then cheaper buckets
+def test_cost_bucket():
+    create_cost_test_file()
+    records = dapt.Delimited_file('test.csv', ',').get_table()
+
+    policy = scheduler.Cost_bucket([60, 3600])
+
+    assert policy.select(records, 3) == 2, "The job in the computer's bucket was not chosen."
+    assert policy.select(records, 1) == 1, "The job in the computer's bucket was not chosen."
+    assert scheduler.Cost_bucket([60, 3600], bucket=2).select(records, 2) == 1, \
+           "The closest bucket was not chosen."
+
+# Test that the policy can be set with a Config
+def test_scheduler_config():
+    dapt.Config.create('config.json')
+    config = dapt.Config('config.json')
+    config.config['scheduler'] = {'policy':'cost-bucket', 'boundaries':[60, 3600]}
+
+    policy = scheduler.from_config(config)
+    os.remove('config.json')
+
+    assert isinstance(policy, scheduler.Cost_bucket), "The wrong policy was created."
+    assert policy.boundaries == [60, 3600], "The boundaries were not set."
+
+# Test that the priority field can be set with a Config
+def test_scheduler_config_priority():
+    dapt.Config.create('config.json')
+    config = dapt.Config('config.json')
+    config.config['scheduler'] = {'policy':'largest-job-first', 'priority':'urgency'}
+
+    policy = scheduler.from_config(config)
+    os.remove('config.json')
+    records = [{'id':'t1', 'status':'', 'cost':'10', 'urgency':''},
+               {'id':'t2', 'status':'', 'cost':'1', 'urgency':'1'}]
+
+    assert policy.priority == 'urgency', "The priority field was not set."
+    assert policy.select(records) == 1, "The parameter set with a priority was not chosen."
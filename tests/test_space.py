@@ -0,0 +1,112 @@
+"""
+    Test if space.py is working correctly
+"""
+
+import os
+
+import dapt
+from dapt import space
+
+# Test that a grid has every combination of values
+def test_space_grid():
+    actual = list(space.grid({'a':[1, 2], 'b':space.linspace(0, 1, 3)}))
+
+    assert len(actual) == 6, "The grid has the wrong number of points."
+    assert actual[0] == {'a':1, 'b':0} and actual[-1] == {'a':2, 'b':1}, "The grid is wrong."
+
+# Test that every stratum of a Latin hypercube is used once
+def test_space_latin_hypercube():
+    actual = list(space.latin_hypercube({'a':(0, 10), 'b':(0, 1)}, 10, seed=1))
+
+    assert sorted(int(p['a']) for p in actual) == list(range(10)), \
+           "Each stratum of a was not used once."
+    assert sorted(int(p['b'] * 10) for p in actual) == list(range(10)), \
+           "Each stratum of b was not used once."
+
+# Test that the strata of different parameters are not correlated
+def test_space_latin_hypercube_correlation():
+    def correlation(x, y):
+        mean_x, mean_y = sum(x) / len(x), sum(y) / len(y)
+        cov = sum((a - mean_x) * (b - mean_y) for a, b in zip(x, y))
+        var_x = sum((a - mean_x) ** 2 for a in x)
+        var_y = sum((b - mean_y) ** 2 for b in y)
+        return cov / (var_x * var_y) ** 0.5
+
+    correlations = []
+    for seed in range(50):
+        points = list(space.latin_hypercube({'a':(0, 1), 'b':(0, 1)}, 20, seed=seed))
+        correlations.append(abs(correlation([int(p['a'] * 20) for p in points],
+                                            [int(p['b'] * 20) for p in points])))
+
+    assert max(correlations) < 0.8, "The strata of a and b are strongly correlated."
+    assert sum(correlations) / len(correlations) < 0.3, "The strata of a and b are correlated."
+
+# Test that random points are inside the ranges and choices
+def test_space_random():
+    actual = list(space.random({'a':(-1, 1), 'b':['x', 'y']}, 50, seed=2))
+
+    assert len(actual) == 50, "The wrong number of points was made."
+    assert all(-1 <= p['a'] < 1 and p['b'] in ('x', 'y') for p in actual), \
+           "A point is outside the range."
+
+# Test that points are written to a new and an existing delimited file
+def test_space_write_delimited_file():
+    if os.path.exists('test.csv'):
+        os.remove('test.csv')
+
+    db = dapt.Delimited_file('test.csv', ',')
+
+    assert space.write(db, space.grid({'a':[1, 2]})) == 2, "The wrong number of rows was written."
+    assert space.write(db, space.grid({'a':[3]})) == 1, "The wrong number of rows was written."
+
+    expected = [{'id':'t1', 'status':'', 'a':'1'}, {'id':'t2', 'status':'', 'a':'2'},
+                {'id':'t3', 'status':'', 'a':'3'}]
+
+    assert db.get_table() == expected, "The rows were not written correctly."
+
+    param = dapt.Param(db)
+    assert param.next_parameters()['id'] == 't1', "The written rows cannot be run."
+
+# Test that the adaptive sampler adds parameter sets near the best results
+def test_space_adaptive_sampler():
+    if os.path.exists('test.csv'):
+        os.remove('test.csv')
+
+    db = dapt.Delimited_file('test.csv', ',')
+    with open('test.csv', 'w') as f:
+        f.write('id,status,a,score\n')
+
+    strategy = space.Refine_best({'a':(0, 10)}, objective='score', n=2, top=2, seed=3)
+    sampler = space.Adaptive_sampler(db, strategy, min_pending=1, max_points=6)
+    param = dapt.Param(db)
+
+    while True:
+        sampler.step()
+        p = param.next_parameters()
+        if p is None:
+            break
+        param.successful(p['id'], results={'score':abs(float(p['a']) - 7)})
+
+    table = db.get_table()
+
+    assert len(table) == 6, "The wrong number of parameter sets was added."
+    assert all(r['status'] == 'successful' and r['score'] != '' for r in table), \
+           "The results were not saved."
+
+# Test that new ids continue from the largest id instead of the number of rows
+def test_space_adaptive_sampler_ids():
+    if os.path.exists('test.csv'):
+        os.remove('test.csv')
+
+    db = dapt.Delimited_file('test.csv', ',')
+    space.write(db, space.grid({'a':[1, 2]}), start=5)
+    strategy = space.Refine_best({'a':(0, 10)}, objective='a', n=2, seed=3)
+    sampler = space.Adaptive_sampler(db, strategy, min_pending=3)
+    param = dapt.Param(db)
+    param.successful(param.next_parameters()['id'])
+
+    sampler.step()
+    space.write(db, space.grid({'a':[3]}))
+    ids = [r['id'] for r in db.get_table()]
+
+    assert ids == ['t5', 't6', 't7', 't8', 't9'], "The ids were reused."
@@ -0,0 +1,98 @@
+"""
+Test the fake Google APIs in `dapt.testing`
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+import dapt
+from dapt import testing
+
+from tests.base import Database_test_base
+
+class TestFakeGoogleSheets(Database_test_base):
+
+    def preflight(self):
+        """
+        Testing items that should be ran before tests are ran.  This method returns a new
+        class method for the test.
+
+        Returns:
+            The class instance which will be used for the unit test.
+        """
+
+        self.client = testing.Fake_sheets_client()
+        self.client.create('test-sheet', Database_test_base.INITIAL_TABLE)
+
+        db = dapt.db.Sheet(spreedsheet_id='test-sheet', client=self.client)
+        db.connect()
+
+        return db
+
+    def test_Sheet_get_key_index(self):
+        """
+        Test if the key index function for Sheets works
+        """
+
+        db = self.preflight()
+
+        assert db.get_key_index('a') == 4, "Cannot get the key index."
+
+    def test_Sheet_append_rows(self):
+        """
+        Test that rows are appended to a Sheet in a single request
+        """
+
+        db = self.preflight()
+
+        actual = db.append_rows([{'id':'t4', 'status':'', 'a':'1'}, {'id':'t5', 'b':'2'}])
+
+        assert actual == 2, "The wrong number of rows was added."
+        assert self.client.call_counts['values_append'] == 1, "The rows were not appended at once."
+        assert [str(r['id']) for r in db.get_table()] == ['t1', 't2', 't3', 't4', 't5'], \
+               "The rows were not appended."
+
+# Test that requests over the quota are rate limited
+def test_fake_sheets_quota():
+    client = testing.Fake_sheets_client(quota=3, period=60)
+    client.create('test-sheet', Database_test_base.INITIAL_TABLE)
+
+    db = dapt.db.Sheet(spreedsheet_id='test-sheet', client=client)
+    db.connect()
+    db.fields()
+
+    with pytest.raises(dapt.db.sheets.gspread.exceptions.APIError) as e:
+        db.get_table()
+
+    assert e.value.code == 429 and client.rate_limited == 1, "The quota was not enforced."
+
+# Test that the load test harness finishes every parameter set
+def test_load_test():
+    results = testing.load_test(workers=4, tasks=20)
+
+    assert results['completed'] == 20, "Not all of the parameter sets were ran."
+    assert results['api-calls-per-task'] > 0, "API calls were not counted."
+
+# Test that Google_Drive can upload and download files from the fake service
+def test_fake_drive():
+    tmp = tempfile.mkdtemp()
+    with open(os.path.join(tmp, 'test.txt'), 'w') as f:
+        f.write('Google Drive works')
+
+    service = testing.Fake_drive_service()
+    folder_id = service.create('folder')
+    drive = dapt.storage.Google_Drive(service=service)
+
+    assert drive.connect(), "Could not connect to the fake service."
+    assert drive.upload_file(folder_id, 'test.txt', folder=tmp)
+
+    file_id = [i for i, item in service.items.items() if item['name'] == 'test.txt'][0]
+    assert drive.download_file(file_id, folder=tmp, name='copy.txt')
+
+    with open(os.path.join(tmp, 'copy.txt')) as f:
+        assert f.read() == 'Google Drive works', "The downloaded file is different."
+
+    shutil.rmtree(tmp)
@@ -0,0 +1,306 @@
+"""
+    Test if tools.py is working correctly
+"""
+
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+
+import dapt
+
+DEFAULT_SETTINGS = """<PhysiCell_settings>
+    <overall><max_time units="min">100</max_time><dt_diffusion>0.01</dt_diffusion></overall>
+    <user_parameters>
+        <speed type="double">1</speed>
+        <cells name="a"><number>5</number></cells>
+        <cells name="b"><number>6</number></cells>
+    </user_parameters>
+</PhysiCell_settings>"""
+
+def create_default_settings():
+    with open('test_default.xml', 'w') as f:
+        f.write(DEFAULT_SETTINGS)
+
+# Test that the template changes the values and leaves the template unchanged
+def test_XML_template_render():
+    create_default_settings()
+    template = dapt.tools.XML_template('test_default.xml')
+
+    tree = template.render({'id':'t1', 'overall/max_time':200, './user_parameters/speed':2,
+                            "user_parameters/cells[@name='b']/number":7})
+    root = tree.getroot()
+
+    os.remove('test_default.xml')
+
+    assert root.find('overall/max_time').text == '200', "The value was not changed."
+    assert root.find('overall/max_time').get('units') == 'min', "The attributes were lost."
+    assert root.find('user_parameters/speed').text == '2', "The ./ path was not changed."
+    assert root.find("user_parameters/cells[@name='b']/number").text == '7', \
+           "The ElementPath key was not changed."
+    assert root.find('overall/dt_diffusion').text == '0.01', "An unchanged value is wrong."
+    assert template.root.find('overall/max_time').text == '100', "The template was changed."
+
+# Test that create_XML writes the file and ignores off limits keys
+def test_create_XML():
+    create_default_settings()
+
+    dapt.tools.create_XML({'overall/max_time':300, 'user_parameters/speed':3},
+                          default_settings='test_default.xml', save_settings='test_out.xml',
+                          off_limits=['user_parameters/speed'])
+    root = ET.parse('test_out.xml').getroot()
+
+    os.remove('test_default.xml')
+    os.remove('test_out.xml')
+
+    assert root.find('overall/max_time').text == '300', "The value was not written."
+    assert root.find('user_parameters/speed').text == '1', "An off limits key was written."
+
+# Test that ElementPath keys starting with .// or using predicates are written
+def test_create_XML_element_path():
+    create_default_settings()
+    parameters = {'.//cells[@name="b"]/number':8, './/dt_diffusion':0.02,
+                  "./user_parameters/cells[@name='a']/number":9}
+
+    dapt.tools.create_XML(parameters, default_settings='test_default.xml',
+                          save_settings='test_out.xml')
+    root = ET.parse('test_out.xml').getroot()
+    batch = dapt.tools.create_XML_batch([dict(parameters, id='t1')],
+                                        default_settings='test_default.xml',
+                                        save_settings='test_batch_{id}.xml', workers=1)
+    batch_root = ET.parse(batch[0]).getroot()
+
+    os.remove('test_default.xml')
+    os.remove('test_out.xml')
+    os.remove('test_batch_t1.xml')
+
+    for tree in (root, batch_root):
+        assert tree.find("user_parameters/cells[@name='b']/number").text == '8', \
+               "The .// key with a predicate was not written."
+        assert tree.find('overall/dt_diffusion').text == '0.02', "The .// key was not written."
+        assert tree.find("user_parameters/cells[@name='a']/number").text == '9', \
+               "The predicate key was not written."
+
+# Test that a batch of XML files are written using the id in the path
+def test_create_XML_batch():
+    create_default_settings()
+    parameter_sets = [{'id':'t%d' % i, 'overall/max_time':i} for i in range(5)]
+
+    actual = dapt.tools.create_XML_batch(parameter_sets, default_settings='test_default.xml',
+                                         save_settings='test_batch/{id}/settings.xml',
+                                         workers=2, chunksize=2)
+    values = [ET.parse(path).getroot().find('overall/max_time').text for path in actual]
+
+    os.remove('test_default.xml')
+    shutil.rmtree('test_batch')
+
+    assert actual == ['test_batch/t%d/settings.xml' % i for i in range(5)], "The paths are wrong."
+    assert values == [str(i) for i in range(5)], "The values were not written."
+
+# Test that files compressed in parallel make a valid zip, even when the stream can't seek
+def test_write_zip():
+    tmp = tempfile.mkdtemp()
+    members = []
+    for i in range(6):
+        path = os.path.join(tmp, 'file%d.txt' % i)
+        with open(path, 'w') as f:
+            f.write('line %d\n' % i * 1000)
+        members.append((path, 'output/file%d.txt' % i))
+
+    def write(fd):
+        with os.fdopen(fd, 'wb') as writer:
+            dapt.tools.write_zip(writer, members, 'lzma', workers=3)
+
+    read_fd, write_fd = os.pipe()
+    thread = threading.Thread(target=write, args=(write_fd,))
+    thread.start()
+    with os.fdopen(read_fd, 'rb') as reader:
+        data = reader.read()
+    thread.join()
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        names = zf.namelist()
+        bad = zf.testzip()
+        text = zf.read('output/file3.txt').decode()
+
+    shutil.rmtree(tmp)
+
+    assert names == [arcname for path, arcname in members], "The files are missing or out of order."
+    assert bad is None, "The zip is corrupt."
+    assert text == 'line 3\n' * 1000, "A file was not compressed correctly."
+
+# Test that a zip with a different method for each file can be read after it is written
+# through a pipe by several threads
+def test_write_zip_methods():
+    tmp = tempfile.mkdtemp()
+    methods = ['deflate', 'store', 'bzip2', 'deflate', 'store']
+    members = []
+    for i, method in enumerate(methods):
+        path = os.path.join(tmp, 'file%d.txt' % i)
+        with open(path, 'wb') as f:
+            f.write(os.urandom(100) + b'line %d\n' % i * 1000)
+        members.append((path, 'output/file%d.txt' % i, method))
+
+    def write(fd):
+        with os.fdopen(fd, 'wb') as writer:
+            dapt.tools.write_zip(writer, members, 'deflate', level=1, workers=3)
+
+    read_fd, write_fd = os.pipe()
+    thread = threading.Thread(target=write, args=(write_fd,))
+    thread.start()
+    with os.fdopen(read_fd, 'rb') as reader:
+        data = reader.read()
+    thread.join()
+
+    expected = []
+    for path, arcname, method in members:
+        with open(path, 'rb') as f:
+            expected.append(f.read())
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        bad = zf.testzip()
+        types = [info.compress_type for info in zf.infolist()]
+        contents = [zf.read(arcname) for path, arcname, method in members]
+
+    shutil.rmtree(tmp)
+
+    assert bad is None, "The zip is corrupt."
+    assert types == [dapt.tools.COMPRESSION_METHODS[m] for m in methods], \
+        "The compression methods were not used."
+    assert contents == expected, "A file was not compressed correctly."
+
+# Test that the archive spec finds the right files and compression methods
+def test_create_zip():
+    tmp = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(tmp)
+
+    try:
+        for path in ['t1_dapt_param_settings.txt', 'main.cpp', 'main-extra.cpp', 'Makefile',
+                     'output/out.xml', 'output/snapshot.png', 'output/data/cells.mat',
+                     'custom_modules/custom.cpp', 'custom_modules/old/custom.cpp',
+                     'config/PhysiCell_settings.xml', 'other/notes.txt',
+                     'sample_projects/x/Makefile', 'sample_projects/x/main.cpp']:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(path * 10)
+
+        spec = dapt.tools.Archive_spec(compression={'*.mat':'store'})
+        members = spec.members(pid='t1')
+        name = dapt.tools.create_zip('t1', spec=spec, workers=1)
+
+        with zipfile.ZipFile(name) as zf:
+            names = sorted(zf.namelist())
+            mat = zf.getinfo('output/data/cells.mat').compress_type
+
+        limited = dapt.tools.Archive_spec(include=['**'], exclude=['output'],
+                                          max_file_size=85).members()
+        stopped = dapt.tools.Archive_spec(include=['*.cpp', '*.txt'], max_size=450).members()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+    assert names == sorted(['t1_dapt_param_settings.txt', 'main.cpp', 'main-extra.cpp',
+                            'Makefile', 'output/out.xml', 'output/data/cells.mat',
+                            'custom_modules/custom.cpp', 'config/PhysiCell_settings.xml']), \
+        "The wrong files were archived."
+    assert sorted(arcname for path, arcname, method in members) == names, \
+        "The members don't match the archive."
+    assert mat == zipfile.ZIP_STORED, "The per-pattern compression was not used."
+    assert [arcname for path, arcname, method in limited] == ['Makefile', 'main.cpp'], \
+        "The exclude or size limit was not used."
+    assert [arcname for path, arcname, method in stopped] == ['main-extra.cpp', 'main.cpp'], \
+        "Files were added after the archive reached its size limit."
+
+# Test that the cleanup removes the files given by the config
+def test_data_cleanup():
+    tmp = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(tmp)
+
+    try:
+        os.makedirs('output/keep')
+        for path in ['a.mat', 'b.pov', 'c.zip', 'main.cpp', 'output/d.xml', 'output/e.zip',
+                     'output/f.pov', 'output/g.txt', 'output/keep/h.xml']:
+            with open(path, 'w') as f:
+                f.write(path)
+        with open('config.json', 'w') as f:
+            json.dump({'remove-zip':True, 'cleanup':{'workers':4}}, f)
+
+        rules = dapt.tools.cleanup_rules(dapt.Config('config.json'))
+        removed = dapt.tools.data_cleanup(dapt.Config('config.json'))
+        left = sorted(os.path.join(folder, file) for folder, subfolders, files in os.walk('.')
+                      for file in files)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(tmp)
+
+    assert rules['output'][-1] == '.zip', "remove-zip was not added to the rules."
+    assert removed == 6, "The wrong number of files were removed."
+    assert left == ['./config.json', './main.cpp', './output/f.pov', './output/keep/h.xml'], \
+        "The wrong files were removed."
+
+# Test that each settings format can be read back, alone and in a manifest
+def test_create_settings_file():
+    tmp = tempfile.mkdtemp()
+    parameter_sets = [{'id':'t1', 'status':'', 'a':'2'}, {'id':'t2', 'status':'', 'a':'3:4'}]
+    formats = ['txt', 'json', 'binary']
+
+    try:
+        paths = [dapt.tools.create_settings_file(parameter_sets[1], folder=tmp, format=f)
+                 for f in formats]
+        single = [list(dapt.tools.read_settings_file(path)) for path in paths]
+        with open(paths[0]) as f:
+            text = f.read()
+
+        manifests = []
+        for f in formats:
+            manifest = os.path.join(tmp, 'node.' + f)
+            for parameters in parameter_sets:
+                dapt.tools.create_settings_file(parameters, format=f, manifest=manifest)
+            manifests.append(list(dapt.tools.read_settings_file(manifest, format=f)))
+    finally:
+        shutil.rmtree(tmp)
+
+    assert text == 'id:t2\nstatus:\na:3:4\n', "The txt format changed."
+    assert os.path.basename(paths[2]) == 't2_dapt_param_settings.bin', "The file name is wrong."
+    for actual in single:
+        assert actual == [parameter_sets[1]], "The settings file was not read correctly."
+    for actual in manifests:
+        assert actual == parameter_sets, "The manifest was not read correctly."
+
+# Test that frames are converted in parallel, skipping converted frames, and made into a movie
+def test_convert_frames():
+    tmp = tempfile.mkdtemp()
+    for i in range(5):
+        with open(os.path.join(tmp, 'snapshot%08d.svg' % i), 'w') as f:
+            f.write('frame %d' % i)
+    with open(os.path.join(tmp, 'snapshot00000000.png'), 'w') as f:
+        f.write('converted')
+
+    copy = [sys.executable, '-c', 'import shutil, sys; shutil.copy(sys.argv[1], sys.argv[2])']
+    join = [sys.executable, '-c', 'import glob, sys; open(sys.argv[2], "w").write(' \
+            '"".join(open(p).read() for p in sorted(glob.glob(sys.argv[1].replace(' \
+            '"%08d", "*")))))']
+
+    try:
+        converted = dapt.tools.convert_frames(tmp, command=copy + ['{source}', '{target}'],
+                                              workers=3)
+        again = dapt.tools.convert_frames(tmp, command=copy + ['{source}', '{target}'])
+        movie = dapt.tools.create_movie('t1', folder=tmp, save=tmp,
+                                        command=join + ['{input}', '{output}'])
+        with open(movie) as f:
+            text = f.read()
+    finally:
+        shutil.rmtree(tmp)
+
+    assert converted == 4, "Converted frames were not skipped."
+    assert again == 0, "Frames were converted twice."
+    assert os.path.basename(movie).startswith('t1_test_'), "The movie name is wrong."
+    assert text == 'converted' + ''.join('frame %d' % i for i in range(1, 5)), \
+        "The movie was not made from the frames."
@@ -0,0 +1,49 @@
+"""
+    Test if the Transfer class in dapt.storage.base is working correctly
+"""
+
+import pytest
+
+from dapt.storage.base import Transfer, Transfer_cancelled
+
+# Test that requests which fail with a connection error are retried
+def test_transfer_retry():
+    transfer = Transfer('test.txt', 'upload', total=10, backoff=0)
+    failures = [ConnectionError('lost connection'), TimeoutError('timed out')]
+
+    def request():
+        if failures:
+            raise failures.pop(0)
+        return 'done'
+
+    assert transfer.run(request) == 'done', "The request was not retried."
+    assert transfer.attempts == 3 and transfer.requests == 1, "The attempts were not counted."
+
+# Test that errors which are not retryable are raised right away
+def test_transfer_not_retryable():
+    transfer = Transfer('test.txt', 'upload', backoff=0)
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        transfer.run(request)
+
+    assert len(attempts) == 1, "A request that cannot be retried was retried."
+
+# Test that progress is reported and the transfer can be cancelled
+def test_transfer_progress_cancel():
+    seen = []
+    transfer = Transfer('test.txt', 'download', total=10, callback=lambda t: seen.append(t.transferred))
+
+    transfer.progress(4)
+    transfer.progress(6)
+    transfer.cancel()
+
+    with pytest.raises(Transfer_cancelled):
+        transfer.progress(1)
+
+    assert seen == [4, 10, 11], "The progress callback was not called correctly."
+    assert transfer.done()['bytes'] == 11, "The metrics did not count the bytes transferred."
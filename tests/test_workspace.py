@@ -0,0 +1,84 @@
+"""
+    Test if workspace.py is working correctly
+"""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import dapt
+
+def create_workspace_test_file():
+    with open('test.csv', 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'status', 'score'])
+        writer.writeheader()
+        for i in range(1, 5):
+            writer.writerow({'id':'t%d' % i, 'status':'', 'score':''})
+
+# Test that each parameter set runs in its own copy of the template
+def test_workspace_run():
+    create_workspace_test_file()
+    tmp = tempfile.mkdtemp()
+    template = os.path.join(tmp, 'template')
+    os.makedirs(os.path.join(template, 'output'))
+    with open(os.path.join(template, 'model.txt'), 'w') as f:
+        f.write('model')
+
+    db = dapt.Delimited_file('test.csv', ',')
+    param = dapt.Param(db)
+    manager = dapt.workspace.Workspace_manager(root=os.path.join(tmp, 'workspaces'),
+                                               template=template)
+    paths = []
+
+    def task(parameters, path):
+        paths.append(path)
+        assert os.path.isfile(os.path.join(path, 'model.txt')), "The template was not copied."
+        assert os.listdir(os.path.join(path, 'output')) == [], "The workspace was reused."
+        dapt.tools.create_settings_file(parameters, folder=path)
+        with open(os.path.join(path, 'output', 'out.txt'), 'w') as f:
+            f.write(parameters['id'])
+        if parameters['id'] == 't3':
+            raise ValueError('bad parameters')
+        return {'score':parameters['id'][1:]}
+
+    count = manager.run(param, task, workers=2)
+    manager.close()
+    left = os.listdir(os.path.join(tmp, 'workspaces'))
+    table = db.get_table()
+    shutil.rmtree(tmp)
+
+    assert count == 4, "Every parameter set was not run."
+    assert len(set(paths)) == 4, "Parameter sets shared a workspace."
+    assert left == [], "The workspaces were not removed."
+    assert [r['status'] for r in table] == ['successful', 'successful', 'failed', 'successful'], \
+        "The statuses are wrong."
+    assert table[3]['score'] == '4', "The results were not saved."
+
+# Test that last-test in the config does not make workers run the same parameter set
+def test_workspace_run_config():
+    create_workspace_test_file()
+    tmp = tempfile.mkdtemp()
+    with open(os.path.join(tmp, 'config.json'), 'w') as f:
+        json.dump({'last-test':None}, f)
+
+    db = dapt.Delimited_file('test.csv', ',')
+    param = dapt.Param(db, config=dapt.Config(os.path.join(tmp, 'config.json')))
+    manager = dapt.workspace.Workspace_manager(root=os.path.join(tmp, 'workspaces'))
+    runs = []
+    lock = threading.Lock()
+
+    def task(parameters, path):
+        with lock:
+            runs.append(parameters['id'])
+
+    count = manager.run(param, task, workers=2)
+    manager.close()
+    table = db.get_table()
+    shutil.rmtree(tmp)
+
+    assert sorted(runs) == ['t1', 't2', 't3', 't4'], "A parameter set was run more than once."
+    assert count == 4, "The wrong number of parameter sets was run."
+    assert [r['status'] for r in table] == ['successful'] * 4, "The statuses are wrong."